@@ -0,0 +1,343 @@
+import time
+import logging
+import threading
+from collections import deque
+import config
+
+logger = logging.getLogger(__name__)
+
+TOLERANCE = 1e-6  # Treat absolute sizes below this as zero.
+
+
+def position_symbol(pos):
+    return pos.get('info', {}).get('product_symbol') or pos.get('symbol') or ''
+
+
+def position_size(pos):
+    size = pos.get('size') or pos.get('contracts') or 0
+    try:
+        size = float(size)
+    except Exception:
+        size = 0.0
+    if abs(size) < TOLERANCE:
+        size = 0.0
+    return size
+
+
+def order_symbol(order):
+    return order.get('info', {}).get('product_symbol') or order.get('symbol') or ''
+
+
+class AccountSnapshot:
+    """
+    In-process view of open positions and open orders, kept up to date by a single
+    background fetcher. Readers pass a freshness bound (max_age); only a stale
+    snapshot triggers a REST call, and concurrent stale readers share that one call.
+
+    Listeners registered with add_listener(callback) are called as
+    callback(kind, event, key, old, new) where kind is "position", "order" or "fill"
+    and event is "opened", "resized"/"changed", "closed" or "filled".
+
+    A streaming feed (see delta_ws) can push incremental updates and mark the
+    snapshot live; while live, reads never go to REST and the background fetcher
+    only reconciles every SNAPSHOT_RECONCILE_INTERVAL seconds.
+
+    Every change bumps a version counter. A REST list is applied only if nothing
+    changed while it was being fetched, so a reconcile can never undo a newer push
+    (e.g. bring back a position that was just closed).
+    """
+
+    def __init__(self, client, refresh_interval=None):
+        self.client = client
+        self.refresh_interval = refresh_interval or config.SNAPSHOT_REFRESH_INTERVAL
+        self._lock = threading.Lock()
+        self._positions_lock = threading.Lock()
+        self._orders_lock = threading.Lock()
+        self._positions = {}
+        self._orders = {}
+        self._positions_time = 0
+        self._orders_time = 0
+        self._positions_version = 0
+        self._orders_version = 0
+        self._stream_live = False
+        self.fills = deque(maxlen=500)
+        self._listeners = []
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def add_listener(self, callback):
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _emit(self, kind, event, key, old, new):
+        for callback in list(self._listeners):
+            try:
+                callback(kind, event, key, old, new)
+            except Exception as e:
+                logger.error("Snapshot listener error for %s %s %s: %s", kind, event, key, e)
+
+    def refresh_positions(self):
+        with self._positions_lock:
+            version = self._positions_version
+            positions = self.client.fetch_positions()
+            self.apply_positions(positions, version)
+            return self.positions()
+
+    def refresh_orders(self):
+        with self._orders_lock:
+            version = self._orders_version
+            orders = self.client.fetch_open_orders()
+            self.apply_orders(orders, version)
+            return self.open_orders()
+
+    def refresh(self):
+        self.refresh_positions()
+        self.refresh_orders()
+
+    def apply_positions(self, positions, version=None):
+        """
+        Replace the position snapshot with a full list of positions and emit change
+        events. With version (the positions version read before fetching the list),
+        the list is dropped if the snapshot changed in the meantime; returns whether
+        it was applied.
+        """
+        new = {}
+        for pos in positions or []:
+            if position_size(pos) == 0:
+                continue
+            new[position_symbol(pos)] = pos
+        with self._lock:
+            if version is not None and version != self._positions_version:
+                logger.debug("Dropping REST positions fetched before a newer update.")
+                return False
+            old = self._positions
+            self._positions = new
+            self._positions_time = time.time()
+            self._positions_version += 1
+        for key, pos in new.items():
+            prev = old.get(key)
+            if prev is None:
+                self._emit("position", "opened", key, None, pos)
+            elif position_size(prev) != position_size(pos):
+                self._emit("position", "resized", key, prev, pos)
+        for key, prev in old.items():
+            if key not in new:
+                self._emit("position", "closed", key, prev, None)
+        return True
+
+    def apply_orders(self, orders, version=None):
+        """
+        Replace the open-order snapshot with a full list of open orders and emit change
+        events. version works as in apply_positions.
+        """
+        new = {}
+        for order in orders or []:
+            if order.get('id') is None:
+                continue
+            new[order['id']] = order
+        with self._lock:
+            if version is not None and version != self._orders_version:
+                logger.debug("Dropping REST open orders fetched before a newer update.")
+                return False
+            old = self._orders
+            self._orders = new
+            self._orders_time = time.time()
+            self._orders_version += 1
+        for key, order in new.items():
+            prev = old.get(key)
+            if prev is None:
+                self._emit("order", "opened", key, None, order)
+            elif (prev.get('status'), prev.get('filled'), prev.get('amount')) != \
+                    (order.get('status'), order.get('filled'), order.get('amount')):
+                self._emit("order", "changed", key, prev, order)
+        for key, prev in old.items():
+            if key not in new:
+                self._emit("order", "closed", key, prev, None)
+        return True
+
+    def upsert_position(self, pos):
+        key = position_symbol(pos)
+        if position_size(pos) == 0:
+            self.remove_position(key)
+            return
+        with self._lock:
+            prev = self._positions.get(key)
+            self._positions = dict(self._positions)
+            self._positions[key] = pos
+            self._positions_version += 1
+        if prev is None:
+            self._emit("position", "opened", key, None, pos)
+        elif position_size(prev) != position_size(pos):
+            self._emit("position", "resized", key, prev, pos)
+
+    def remove_position(self, key):
+        with self._lock:
+            prev = self._positions.get(key)
+            if prev is None:
+                return
+            self._positions = dict(self._positions)
+            del self._positions[key]
+            self._positions_version += 1
+        self._emit("position", "closed", key, prev, None)
+
+    def upsert_order(self, order):
+        key = order.get('id')
+        if key is None:
+            return
+        if order.get('status', 'open') != 'open':
+            self.remove_order(key, order)
+            return
+        with self._lock:
+            prev = self._orders.get(key)
+            self._orders = dict(self._orders)
+            self._orders[key] = order
+            self._orders_version += 1
+        if prev is None:
+            self._emit("order", "opened", key, None, order)
+        else:
+            self._emit("order", "changed", key, prev, order)
+
+    def remove_order(self, key, order=None):
+        with self._lock:
+            prev = self._orders.get(key)
+            if prev is not None:
+                self._orders = dict(self._orders)
+                del self._orders[key]
+                self._orders_version += 1
+        if prev is not None or order is not None:
+            self._emit("order", "closed", key, prev, order)
+
+    def record_fill(self, fill):
+        self.fills.append(fill)
+        self._emit("fill", "filled", fill.get('order'), None, fill)
+
+    def set_stream_live(self, live):
+        with self._lock:
+            was_live = self._stream_live
+            self._stream_live = live
+            if was_live and not live:
+                # Updates may have been missed while the stream was down.
+                self._positions_time = 0
+                self._orders_time = 0
+        if was_live != live:
+            logger.info("Account snapshot stream %s.", "live" if live else "down, falling back to REST")
+
+    def stream_live(self):
+        return self._stream_live
+
+    def invalidate(self):
+        """Mark the snapshot stale so the next bounded read goes to the exchange."""
+        with self._lock:
+            self._positions_time = 0
+            self._orders_time = 0
+
+    def positions_age(self):
+        if self._stream_live:
+            return 0
+        return time.time() - self._positions_time
+
+    def orders_age(self):
+        if self._stream_live:
+            return 0
+        return time.time() - self._orders_time
+
+    def positions(self):
+        with self._lock:
+            return list(self._positions.values())
+
+    def open_orders(self):
+        with self._lock:
+            return list(self._orders.values())
+
+    def get_positions(self, symbol=None, max_age=None):
+        max_age = config.SNAPSHOT_MAX_AGE if max_age is None else max_age
+        if self.positions_age() > max_age:
+            with self._positions_lock:
+                # Another reader may have refreshed while we waited for the lock.
+                if self.positions_age() > max_age:
+                    version = self._positions_version
+                    self.apply_positions(self.client.fetch_positions(), version)
+        positions = self.positions()
+        if symbol:
+            positions = [p for p in positions if symbol in position_symbol(p)]
+        return positions
+
+    def get_open_orders(self, symbol=None, max_age=None):
+        max_age = config.SNAPSHOT_MAX_AGE if max_age is None else max_age
+        if self.orders_age() > max_age:
+            with self._orders_lock:
+                if self.orders_age() > max_age:
+                    version = self._orders_version
+                    self.apply_orders(self.client.fetch_open_orders(), version)
+        orders = self.open_orders()
+        if symbol:
+            orders = [o for o in orders if symbol in order_symbol(o)]
+        return orders
+
+    def has_position(self, symbol, side, max_age=None):
+        for pos in self.get_positions(symbol, max_age=max_age):
+            size = position_size(pos)
+            if side.lower() == "buy" and size > 0:
+                return True
+            if side.lower() == "sell" and size < 0:
+                return True
+        return False
+
+    def has_open_order(self, symbol, side, max_age=None):
+        for order in self.get_open_orders(symbol, max_age=max_age):
+            if order.get('side', '').lower() == side.lower() and order.get('status', 'open').lower() == 'open':
+                return True
+        return False
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error("Error refreshing account snapshot: %s", e)
+            interval = config.SNAPSHOT_RECONCILE_INTERVAL if self._stream_live else self.refresh_interval
+            self._stop_event.wait(interval)
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return self._thread
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="AccountSnapshot", daemon=True)
+            self._thread.start()
+            return self._thread
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_account_snapshot(client=None):
+    """
+    Return the process-wide AccountSnapshot, creating and starting it on first use.
+    """
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None:
+            if client is None:
+                from exchange import get_client
+                client = get_client()
+            _snapshot = AccountSnapshot(client)
+            _snapshot.start()
+        return _snapshot
+
+
+if __name__ == '__main__':
+    snapshot = get_account_snapshot()
+    snapshot.add_listener(lambda kind, event, key, old, new: print(kind, event, key))
+    while True:
+        print("Positions:", snapshot.get_positions(), "Open orders:", snapshot.get_open_orders())
+        time.sleep(5)
@@ -2,24 +2,105 @@ import json
 import threading
 import time
 import websocket
+import config
+from tick_store import TickStore, BUY, SELL
+from feed_stats import FeedStats
+
+# Prefer a faster JSON backend when installed
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# Symbols streamed over one combined connection; the first one drives current_price
+SYMBOLS = [s.upper() for s in config.BINANCE_SYMBOLS]
+PRIMARY_SYMBOL = SYMBOLS[0]
+
+# Per-symbol trade history (timestamp, price, qty, side) in preallocated ring buffers
+tick_store = TickStore(config.TICK_BUFFER_SIZE)
+
+# Wire-to-process latency, message rate and staleness for this feed
+feed_stats = FeedStats()
+_last_stats_log = time.time()
 
 # Global variable to store the latest BTC/USDT price
 current_price = None
+current_price_event_ms = None
+
+# Tick notification: a sequence number bumped on every price update
+price_seq = 0
+_price_condition = threading.Condition()
+_subscribers = []
+
+def subscribe(callback):
+    """
+    Register callback(price, seq) to be called from the WebSocket thread on every price update.
+    """
+    _subscribers.append(callback)
+
+def unsubscribe(callback):
+    if callback in _subscribers:
+        _subscribers.remove(callback)
+
+def wait_for_price(last_seq=0, timeout=None):
+    """
+    Block until a price newer than last_seq arrives or timeout expires.
+    Returns (seq, price); seq equals last_seq on timeout.
+    """
+    with _price_condition:
+        _price_condition.wait_for(lambda: price_seq != last_seq, timeout)
+        return price_seq, current_price
+
+def price_age(now=None):
+    """
+    Seconds since the exchange produced the trade behind current_price, or None.
+    """
+    if current_price_event_ms is None:
+        return None
+    return (now or time.time()) - current_price_event_ms / 1000.0
+
+def _publish_price(price, event_ms=None):
+    global current_price, current_price_event_ms, price_seq
+    with _price_condition:
+        current_price = price
+        current_price_event_ms = event_ms
+        price_seq += 1
+        seq = price_seq
+        _price_condition.notify_all()
+    for callback in list(_subscribers):
+        try:
+            callback(price, seq)
+        except Exception as e:
+            print("Error in price subscriber:", e)
+
+def _log_feed_stats(now):
+    global _last_stats_log
+    if now - _last_stats_log < config.FEED_STATS_LOG_INTERVAL:
+        return
+    _last_stats_log = now
+    print("Binance feed stats:", feed_stats.summary(), "price age:", price_age(now))
 
 def on_message(ws, message):
-    global current_price
     try:
-        data = json.loads(message)
-        # Ensure the necessary keys exist
-        if "p" not in data or "q" not in data or "m" not in data:
+        data = _loads(message)
+        # Combined-stream messages wrap the payload as {"stream": ..., "data": {...}}
+        data = data.get("data", data)
+        # Only the needed fields; anything without them (e.g. subscription acks) is skipped
+        try:
+            price = float(data["p"])
+            qty = float(data["q"])
+            is_sell = data["m"]
+        except KeyError:
             return
-        trade_data = {
-            "timestamp": time.time(),
-            "price": float(data["p"]),
-            "buy_qty": float(data["q"]) if not data["m"] else 0,
-            "sell_qty": float(data["q"]) if data["m"] else 0
-        }
-        current_price = trade_data["price"]
+        symbol = data.get("s", PRIMARY_SYMBOL)
+        event_ms = data.get("E") or data.get("T")
+        now = time.time()
+        tick_store.append(symbol, now, price, qty, SELL if is_sell else BUY)
+        if symbol == PRIMARY_SYMBOL:
+            _publish_price(price, event_ms)
+        feed_stats.record(event_ms)
+        _log_feed_stats(now)
     except Exception as e:
         print("Error processing message:", e)
 
@@ -33,14 +114,14 @@ def on_open(ws):
     print("WebSocket connection opened")
     subscribe_message = {
         "method": "SUBSCRIBE",
-        "params": ["btcusdt@aggTrade"],
+        "params": [f"{symbol.lower()}@aggTrade" for symbol in SYMBOLS],
         "id": 1
     }
     ws.send(json.dumps(subscribe_message))
 
 def start_websocket():
     ws = websocket.WebSocketApp(
-        "wss://fstream.binance.com/ws",
+        "wss://fstream.binance.com/stream",
         on_message=on_message,
         on_error=on_error,
         on_close=on_close
@@ -48,17 +129,27 @@ def start_websocket():
     ws.on_open = on_open
     ws.run_forever()
 
+_websocket_thread = None
+_websocket_thread_lock = threading.Lock()
+
 def run_in_thread():
     """
-    Start the Binance WebSocket in a separate thread.
+    Start the Binance WebSocket in a separate thread; later calls return the running thread.
     """
-    websocket_thread = threading.Thread(target=start_websocket, daemon=True)
-    websocket_thread.start()
-    return websocket_thread
+    global _websocket_thread
+    with _websocket_thread_lock:
+        if _websocket_thread is None or not _websocket_thread.is_alive():
+            _websocket_thread = threading.Thread(target=start_websocket, daemon=True)
+            _websocket_thread.start()
+        return _websocket_thread
 
 if __name__ == "__main__":
     run_in_thread()
     while True:
         if current_price is not None:
             print(f"Latest BTC/USDT price: {current_price}")
+        for symbol in tick_store.symbols():
+            print(f"{symbol}: last={tick_store.latest_price(symbol)} "
+                  f"vwap60s={tick_store.vwap(symbol, seconds=60)} "
+                  f"imbalance60s={tick_store.volume_imbalance(symbol, seconds=60):.3f}")
         time.sleep(2)
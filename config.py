@@ -30,8 +30,107 @@ REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
 REDIS_PORT = int(os.getenv('REDIS_PORT', '6379'))
 REDIS_DB = int(os.getenv('REDIS_DB', '0'))
 
-# Market data caching TTL (in seconds)
+# Signal delivery from youtube_ocr to signal_processor: "stream" (Redis Streams) or "poll"
+SIGNAL_DELIVERY = os.getenv('SIGNAL_DELIVERY', 'stream')
+SIGNAL_STREAM = os.getenv('SIGNAL_STREAM', 'signals')
+SIGNAL_STREAM_GROUP = os.getenv('SIGNAL_STREAM_GROUP', 'signal_processor')
+SIGNAL_STREAM_CONSUMER = os.getenv('SIGNAL_STREAM_CONSUMER', '')
+SIGNAL_STREAM_BLOCK_MS = int(os.getenv('SIGNAL_STREAM_BLOCK_MS', '5000'))
+SIGNAL_STREAM_MAXLEN = int(os.getenv('SIGNAL_STREAM_MAXLEN', '10000'))
+
+# Binance aggTrade symbols streamed over one combined connection (first one is the primary price)
+BINANCE_SYMBOLS = [s.strip() for s in os.getenv('BINANCE_SYMBOLS', 'btcusdt').split(',') if s.strip()]
+TICK_BUFFER_SIZE = int(os.getenv('TICK_BUFFER_SIZE', '65536'))
+FEED_STATS_LOG_INTERVAL = float(os.getenv('FEED_STATS_LOG_INTERVAL', '60'))
+
+# Start-up: seconds each warm-up phase may take before main.py carries on without it,
+# and whether main.py also runs the YouTube OCR loop in-process
+STARTUP_WARMUP_TIMEOUT = float(os.getenv('STARTUP_WARMUP_TIMEOUT', '30'))
+OCR_ENABLED = os.getenv('OCR_ENABLED', '0') == '1'
+
+# YouTube signal stream watched by youtube_ocr
+YOUTUBE_URL = os.getenv('YOUTUBE_URL', 'https://www.youtube.com/live/jkP1Sw7M2iU')
+# Streams watched by ocr_supervisor, JSON: [{"url": ..., "keys": ["signal_MAIN", ...], "stream": "signals"}, ...]
+# ("stream" is optional: without it a stream only writes its keys; empty = YOUTUBE_URL into
+# signal_MAIN/signal and SIGNAL_STREAM), and the OCR worker pool size (0 = one per CPU)
+OCR_STREAMS = os.getenv('OCR_STREAMS', '')
+OCR_POOL_SIZE = int(os.getenv('OCR_POOL_SIZE', '0'))
+
+# YouTube OCR: region of interest as "x1,y1,x2,y2" fractions of the frame (empty = whole frame),
+# change gate (difference-hash bit distance) and sampling interval in seconds
+OCR_ROI = os.getenv('OCR_ROI', '')
+OCR_CHANGE_THRESHOLD = int(os.getenv('OCR_CHANGE_THRESHOLD', '4'))
+OCR_CACHE_SIZE = int(os.getenv('OCR_CACHE_SIZE', '256'))
+OCR_SAMPLE_INTERVAL = float(os.getenv('OCR_SAMPLE_INTERVAL', '1'))
+OCR_STATS_INTERVAL = float(os.getenv('OCR_STATS_INTERVAL', '30'))
+# "process" runs EasyOCR in a supervised worker process (frames via shared memory); "thread" runs it in-process
+OCR_WORKER_MODE = os.getenv('OCR_WORKER_MODE', 'process')
+OCR_WORKER_TIMEOUT = float(os.getenv('OCR_WORKER_TIMEOUT', '30'))
+# YouTube stream: resolved URL lifetime when it carries no expiry, background refresh margin
+# before expiry, reconnect backoff bounds and failed reads before forcing a fresh resolution
+STREAM_URL_TTL = float(os.getenv('STREAM_URL_TTL', '3600'))
+STREAM_URL_REFRESH_MARGIN = float(os.getenv('STREAM_URL_REFRESH_MARGIN', '300'))
+STREAM_RECONNECT_BACKOFF_MIN = float(os.getenv('STREAM_RECONNECT_BACKOFF_MIN', '0.5'))
+STREAM_RECONNECT_BACKOFF_MAX = float(os.getenv('STREAM_RECONNECT_BACKOFF_MAX', '30'))
+STREAM_RESOLVE_AFTER_FAILURES = int(os.getenv('STREAM_RESOLVE_AFTER_FAILURES', '3'))
+# OCR model profile (see ocr_profiles.PROFILES): auto, default, cpu_quantized, cpu_float or gpu
+OCR_PROFILE = os.getenv('OCR_PROFILE', 'auto')
+OCR_TORCH_THREADS = int(os.getenv('OCR_TORCH_THREADS', '2'))
+OCR_BATCH_SIZE = int(os.getenv('OCR_BATCH_SIZE', '8'))  # gpu profile only; EasyOCR does not batch on CPU
+# Label pre-detector (off by default; set 1 to enable): colour mask + optional templates. With it on,
+# the whole region is still read every OCR_FULL_EVERY_N frames, changed or not
+OCR_LABEL_DETECTOR = os.getenv('OCR_LABEL_DETECTOR', '0') == '1'
+OCR_LABEL_HSV_RANGES = os.getenv('OCR_LABEL_HSV_RANGES', '')  # JSON: [[[h,s,v],[h,s,v]], ...]
+OCR_LABEL_TEMPLATE_DIR = os.getenv('OCR_LABEL_TEMPLATE_DIR', '')
+OCR_LABEL_MATCH_THRESHOLD = float(os.getenv('OCR_LABEL_MATCH_THRESHOLD', '0.75'))
+OCR_FULL_EVERY_N = int(os.getenv('OCR_FULL_EVERY_N', '10'))
+# Zone keyword matching (disabled: zones are published blank); families as JSON {"name": ["keyword", ...]}
+OCR_ZONE_DETECTION = os.getenv('OCR_ZONE_DETECTION', '0') == '1'
+OCR_KEYWORD_FAMILIES = os.getenv('OCR_KEYWORD_FAMILIES', '')
+# Minimum bigram Dice score for a keyword match (about 0.08 below difflib's ratio for a one-character OCR slip)
+OCR_KEYWORD_DICE_THRESHOLD = float(os.getenv('OCR_KEYWORD_DICE_THRESHOLD', '0.75'))
+
+# Market data caching TTL (in seconds), on-disk copy loaded at start-up and how long before
+# expiry the background thread refreshes it
 MARKET_CACHE_TTL = int(os.getenv('MARKET_CACHE_TTL', '300'))
+MARKET_CACHE_FILE = os.getenv('MARKET_CACHE_FILE', 'markets_cache.json')
+MARKET_REFRESH_MARGIN = float(os.getenv('MARKET_REFRESH_MARGIN', '60'))
+
+# Shared position/order snapshot (in seconds)
+SNAPSHOT_REFRESH_INTERVAL = float(os.getenv('SNAPSHOT_REFRESH_INTERVAL', '2'))
+SNAPSHOT_MAX_AGE = float(os.getenv('SNAPSHOT_MAX_AGE', '3'))
+SNAPSHOT_RECONCILE_INTERVAL = float(os.getenv('SNAPSHOT_RECONCILE_INTERVAL', '30'))
+
+# Delta Exchange private WebSocket feed
+DELTA_WS_URL = os.getenv('DELTA_WS_URL', 'wss://socket.india.delta.exchange')
+DELTA_WS_ENABLED = os.getenv('DELTA_WS_ENABLED', '1') == '1'
+
+# Execution: how long to wait for an order/position state change, how often to re-read
+# the snapshot while waiting (REST polling when the stream is down) and how many
+# positions to close at once
+EXECUTION_WAIT_TIMEOUT = float(os.getenv('EXECUTION_WAIT_TIMEOUT', '5'))
+EXECUTION_POLL_INTERVAL = float(os.getenv('EXECUTION_POLL_INTERVAL', '0.25'))
+EXECUTION_MAX_CONCURRENT_CLOSES = int(os.getenv('EXECUTION_MAX_CONCURRENT_CLOSES', '4'))
+
+# Idempotent orders: client order ids derived from the signal are submitted at most once
+# (claims kept in Redis for CLIENT_ORDER_ID_TTL seconds) and transport errors are retried
+# under the same id. ORDER_PRECHECKS=0 skips the position/open-order checks before orders.
+ORDER_PRECHECKS = os.getenv('ORDER_PRECHECKS', '1') == '1'
+CLIENT_ORDER_ID_TTL = int(os.getenv('CLIENT_ORDER_ID_TTL', '86400'))
+# Seconds a claim is kept after a submission that failed in transport (the order may still have landed)
+CLIENT_ORDER_ID_FAILED_TTL = int(os.getenv('CLIENT_ORDER_ID_FAILED_TTL', '60'))
+ORDER_SUBMIT_RETRIES = int(os.getenv('ORDER_SUBMIT_RETRIES', '2'))
+# Local order store: most orders kept, and seconds a filled/canceled order is kept
+ORDER_STORE_MAX_SIZE = int(os.getenv('ORDER_STORE_MAX_SIZE', '10000'))
+ORDER_STORE_TERMINAL_TTL = float(os.getenv('ORDER_STORE_TERMINAL_TTL', '86400'))
+# Seconds the write-behind thread lets Redis writes collect before flushing them in one pipeline
+REDIS_WRITE_BEHIND_INTERVAL = float(os.getenv('REDIS_WRITE_BEHIND_INTERVAL', '0.05'))
+# Shared Redis connection pool: most connections per process, and seconds to wait for a free one
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '20'))
+REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', '5'))
+# Keep local copies of hot keys, invalidated by Redis keyspace notifications ('1' to enable)
+REDIS_CLIENT_CACHE = os.getenv('REDIS_CLIENT_CACHE', '0') == '1'
+REDIS_CACHED_KEYS = [key.strip() for key in os.getenv('REDIS_CACHED_KEYS', 'last_sl_closed_side,signal').split(',') if key.strip()]
 
 # Database configuration (if needed)
 DATABASE_URI = os.getenv('DATABASE_URI', 'sqlite:///trading.db')
@@ -49,3 +148,11 @@ PROFIT_TRAILING_CONFIG = {
     "fixed_stop_loss_pct": 0.005,  # fixed stop loss at 0.5% adverse movement
     "trailing_unit": "percent"
 }
+
+# Upper bound on trailing-stop evaluations per second; ticks arriving faster are coalesced (0 = no limit)
+PROFIT_TRAILING_MAX_EVALS_PER_SEC = float(os.getenv('PROFIT_TRAILING_MAX_EVALS_PER_SEC', '10'))
+
+# Partial-booking bracket stops are re-sent only after moving at least one tick, and at most
+# once per BRACKET_UPDATE_MIN_INTERVAL seconds per position (newer stops replace queued ones)
+BRACKET_UPDATE_MIN_INTERVAL = float(os.getenv('BRACKET_UPDATE_MIN_INTERVAL', '1'))
+BRACKET_DEFAULT_TICK_SIZE = float(os.getenv('BRACKET_DEFAULT_TICK_SIZE', '0.5'))
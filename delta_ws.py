@@ -0,0 +1,224 @@
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+import websocket
+import config
+from account_snapshot import get_account_snapshot
+
+logger = logging.getLogger(__name__)
+
+ORDER_STATUS = {
+    "open": "open",
+    "pending": "open",
+    "closed": "closed",
+    "cancelled": "canceled",
+}
+
+
+def to_float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_position(data):
+    """Convert a Delta `positions` channel payload into the ccxt-like dict used elsewhere."""
+    symbol = data.get("product_symbol") or data.get("symbol")
+    size = to_float(data.get("size"))
+    entry = data.get("entry_price")
+    return {
+        "symbol": symbol,
+        "size": size,
+        "contracts": abs(size),
+        "side": "long" if size > 0 else "short",
+        "entryPrice": to_float(entry, None),
+        "info": data,
+    }
+
+
+def parse_order(data):
+    """Convert a Delta `orders` channel payload into the ccxt-like dict used elsewhere."""
+    amount = to_float(data.get("size"))
+    remaining = to_float(data.get("unfilled_size"), amount)
+    return {
+        "id": str(data.get("id")) if data.get("id") is not None else None,
+        "clientOrderId": data.get("client_order_id"),
+        "symbol": data.get("product_symbol"),
+        "side": data.get("side"),
+        "type": data.get("order_type"),
+        "price": to_float(data.get("limit_price"), None),
+        "amount": amount,
+        "filled": amount - remaining,
+        "remaining": remaining,
+        "status": ORDER_STATUS.get(data.get("state"), data.get("state")),
+        "info": data,
+    }
+
+
+def parse_fill(data):
+    """Convert a Delta `user_trades` channel payload into a ccxt-like trade dict."""
+    return {
+        "id": data.get("fill_id") or data.get("id"),
+        "order": str(data.get("order_id")) if data.get("order_id") is not None else None,
+        "clientOrderId": data.get("client_order_id"),
+        "symbol": data.get("symbol") or data.get("product_symbol"),
+        "side": data.get("side"),
+        "amount": to_float(data.get("size")),
+        "price": to_float(data.get("price"), None),
+        "timestamp": data.get("timestamp"),
+        "info": data,
+    }
+
+
+class DeltaPrivateFeed:
+    """
+    Authenticated Delta Exchange WebSocket client streaming the `orders`,
+    `positions` and `user_trades` channels into an AccountSnapshot.
+
+    The URL is configurable so the feed can be pointed at a local stand-in server;
+    handle_message() can also be fed decoded messages directly.
+    """
+
+    CHANNELS = ["orders", "positions", "user_trades"]
+
+    def __init__(self, snapshot=None, url=None, api_key=None, api_secret=None, reconnect_delay=5):
+        self.snapshot = snapshot or get_account_snapshot()
+        self.url = url or config.DELTA_WS_URL
+        self.api_key = api_key or config.API_KEY
+        self.api_secret = api_secret or config.API_SECRET
+        self.reconnect_delay = reconnect_delay
+        self.ws = None
+        self.authenticated = False
+        self._snapshots_seen = set()
+        self._stop_event = threading.Event()
+
+    def auth_message(self):
+        timestamp = str(int(time.time()))
+        signature_data = "GET" + timestamp + "/live"
+        signature = hmac.new(self.api_secret.encode(), signature_data.encode(), hashlib.sha256).hexdigest()
+        return {
+            "type": "auth",
+            "payload": {"api-key": self.api_key, "signature": signature, "timestamp": timestamp},
+        }
+
+    def subscribe_message(self):
+        return {
+            "type": "subscribe",
+            "payload": {"channels": [{"name": name, "symbols": ["all"]} for name in self.CHANNELS]},
+        }
+
+    def on_open(self, ws):
+        logger.info("Delta private WebSocket connection opened")
+        self.authenticated = False
+        self._snapshots_seen.clear()
+        ws.send(json.dumps(self.auth_message()))
+
+    def on_message(self, ws, message):
+        try:
+            data = json.loads(message)
+        except Exception as e:
+            logger.error("Error decoding Delta WebSocket message: %s", e)
+            return
+        msg_type = data.get("type")
+        if msg_type in ("auth", "key-auth", "success") and not self.authenticated:
+            if data.get("success") is False or data.get("status_code", 200) >= 400:
+                logger.error("Delta WebSocket authentication failed: %s", data)
+                ws.close()
+                return
+            self.authenticated = True
+            ws.send(json.dumps(self.subscribe_message()))
+            logger.info("Delta WebSocket authenticated; subscribed to %s", self.CHANNELS)
+            return
+        if msg_type == "error":
+            logger.error("Delta WebSocket error message: %s", data)
+            return
+        try:
+            self.handle_message(data)
+        except Exception as e:
+            logger.error("Error processing Delta WebSocket message: %s", e)
+
+    def _mark_snapshot(self, channel):
+        # Local state is authoritative only once both full snapshots have arrived.
+        self._snapshots_seen.add(channel)
+        if {"positions", "orders"} <= self._snapshots_seen:
+            self.snapshot.set_stream_live(True)
+
+    def handle_message(self, data):
+        msg_type = data.get("type")
+        action = data.get("action")
+        if msg_type == "positions":
+            if action == "snapshot":
+                self.snapshot.apply_positions([parse_position(p) for p in data.get("result", [])])
+                self._mark_snapshot(msg_type)
+            elif action == "delete":
+                pos = parse_position(data)
+                self.snapshot.remove_position(pos["symbol"])
+            else:
+                self.snapshot.upsert_position(parse_position(data))
+        elif msg_type == "orders":
+            if action == "snapshot":
+                self.snapshot.apply_orders([parse_order(o) for o in data.get("result", [])])
+                self._mark_snapshot(msg_type)
+            elif action == "delete":
+                order = parse_order(data)
+                if order["status"] == "open":
+                    order["status"] = "canceled"
+                self.snapshot.remove_order(order["id"], order)
+            else:
+                self.snapshot.upsert_order(parse_order(data))
+        elif msg_type == "user_trades":
+            self.snapshot.record_fill(parse_fill(data))
+
+    def on_error(self, ws, error):
+        logger.error("Delta WebSocket error: %s", error)
+
+    def on_close(self, ws, close_status_code, close_msg):
+        logger.warning("Delta WebSocket closed: %s %s", close_status_code, close_msg)
+        self.authenticated = False
+        self.snapshot.set_stream_live(False)
+
+    def run_forever(self):
+        while not self._stop_event.is_set():
+            self.ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self.on_open,
+                on_message=self.on_message,
+                on_error=self.on_error,
+                on_close=self.on_close
+            )
+            try:
+                self.ws.run_forever(ping_interval=30, ping_timeout=10)
+            except Exception as e:
+                logger.error("Delta WebSocket run error: %s", e)
+            self.snapshot.set_stream_live(False)
+            if not self._stop_event.is_set():
+                time.sleep(self.reconnect_delay)
+
+    def stop(self):
+        self._stop_event.set()
+        if self.ws:
+            self.ws.close()
+
+
+def run_in_thread(snapshot=None, url=None):
+    """
+    Start the Delta private WebSocket feed in a separate thread.
+    """
+    feed = DeltaPrivateFeed(snapshot=snapshot, url=url)
+    thread = threading.Thread(target=feed.run_forever, name="DeltaPrivateWS", daemon=True)
+    thread.start()
+    return feed
+
+
+if __name__ == "__main__":
+    from logger import setup_logging
+    setup_logging()
+    feed = run_in_thread()
+    while True:
+        snapshot = feed.snapshot
+        print("Live:", snapshot.stream_live(), "Positions:", snapshot.positions(), "Open orders:", snapshot.open_orders())
+        time.sleep(5)
@@ -1,16 +1,28 @@
+import os
+import json
 import time
+import threading
 import ccxt
 import config
 import logging
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_ACCOUNT = 'default'
+
+# Delta accepts at most this many orders per batch request
+MAX_BATCH_ORDERS = 50
+
+# Product ids that were hardcoded before they were looked up in the markets; used when
+# the markets cannot be loaded or do not list the symbol.
+FALLBACK_PRODUCT_IDS = {"BTCUSD": 27, "BTC/USD:USD": 27}
+
 class DeltaExchangeClient:
-    def __init__(self):
+    def __init__(self, api_key=None, api_secret=None):
         try:
             self.exchange = ccxt.delta({
-                'apiKey': config.API_KEY,
-                'secret': config.API_SECRET,
+                'apiKey': api_key or config.API_KEY,
+                'secret': api_secret or config.API_SECRET,
                 'urls': {
                     'api': {
                         'public': config.DELTA_API_URLS['public'],
@@ -28,21 +40,141 @@ class DeltaExchangeClient:
 
         self._market_cache = None
         self._market_cache_time = 0
+        self._market_lock = threading.Lock()
+        self._product_ids = {}
+        self._tick_sizes = {}
+        self._market_refresher = None
+        self._stop_event = threading.Event()
+        self.load_market_cache_file()
+
+    def _set_markets(self, markets, fetched_at):
+        # Precompute symbol -> product_id / tick size, keyed by both ccxt symbol and exchange id.
+        product_ids = {}
+        tick_sizes = {}
+        for symbol, market in markets.items():
+            info = market.get('info') or {}
+            product_id = market.get('numericId') or info.get('id')
+            tick_size = info.get('tick_size') or (market.get('precision') or {}).get('price')
+            for key in (symbol, market.get('id')):
+                if key is None:
+                    continue
+                if product_id is not None:
+                    product_ids[key] = int(product_id)
+                if tick_size is not None:
+                    tick_sizes[key] = float(tick_size)
+        self._product_ids = product_ids
+        self._tick_sizes = tick_sizes
+        self._market_cache = markets
+        self._market_cache_time = fetched_at
+
+    def load_market_cache_file(self, path=None):
+        """
+        Load markets saved by a previous process so the first order does not wait on a
+        download. ccxt is seeded with them too. Returns True if a cache was loaded.
+        """
+        path = path or config.MARKET_CACHE_FILE
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            fetched_at, markets = float(data['fetched_at']), data['markets']
+            self.exchange.set_markets(markets)
+            self._set_markets(markets, fetched_at)
+            logger.info("Loaded %d markets from %s (%.0fs old).", len(markets), path, time.time() - fetched_at)
+            return True
+        except Exception as e:
+            logger.warning("Ignoring unreadable markets cache %s: %s", path, e)
+            return False
+
+    def save_market_cache_file(self, path=None):
+        path = path or config.MARKET_CACHE_FILE
+        if not path or self._market_cache is None:
+            return
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'fetched_at': self._market_cache_time, 'markets': self._market_cache}, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning("Could not save markets cache to %s: %s", path, e)
+
+    def refresh_markets(self, max_age=None):
+        """
+        Download markets, update the indexes and the on-disk cache. With max_age, a
+        copy fetched less than max_age seconds ago (e.g. by a concurrent caller) is kept.
+        """
+        with self._market_lock:
+            if max_age is not None and self._market_cache and time.time() - self._market_cache_time < max_age:
+                return self._market_cache
+            try:
+                markets = self.exchange.load_markets(True)
+            except Exception as e:
+                logger.error("Error loading markets: %s", e)
+                raise
+            self._set_markets(markets, time.time())
+            logger.debug("Markets loaded: %s", list(markets.keys()))
+        self.save_market_cache_file()
+        return markets
 
     def load_markets(self, reload=False):
-        current_time = time.time()
-        if not reload and self._market_cache and (current_time - self._market_cache_time < config.MARKET_CACHE_TTL):
+        """
+        Return markets without blocking once any copy is held: an expired cache is
+        still returned while the background refresher replaces it. Only a process
+        with no cached markets at all (or reload=True) waits on the download.
+        """
+        if not reload and self._market_cache:
+            if time.time() - self._market_cache_time >= config.MARKET_CACHE_TTL:
+                self.start_market_refresher()
             logger.debug("Returning cached market data.")
             return self._market_cache
+        return self.refresh_markets(max_age=None if reload else config.MARKET_CACHE_TTL)
+
+    def get_product_id(self, symbol):
+        """
+        Numeric product id for a ccxt symbol or exchange market id (e.g. "BTCUSD").
+        Falls back to FALLBACK_PRODUCT_IDS when the markets are unavailable or do not
+        list the symbol; raises KeyError for other unknown symbols.
+        """
         try:
-            markets = self.exchange.load_markets(reload)
-            self._market_cache = markets
-            self._market_cache_time = current_time
-            logger.debug("Markets loaded: %s", list(markets.keys()))
-            return markets
+            if not self._product_ids:
+                self.load_markets()
+            return self._product_ids[symbol]
         except Exception as e:
-            logger.error("Error loading markets: %s", e)
-            raise
+            if symbol not in FALLBACK_PRODUCT_IDS:
+                raise
+            logger.warning("Product id for %s not in markets (%s); using %d.", symbol, e, FALLBACK_PRODUCT_IDS[symbol])
+            return FALLBACK_PRODUCT_IDS[symbol]
+
+    def get_tick_size(self, symbol):
+        if not self._tick_sizes:
+            self.load_markets()
+        return self._tick_sizes[symbol]
+
+    def _market_refresh_loop(self):
+        while not self._stop_event.is_set():
+            age = time.time() - self._market_cache_time
+            delay = config.MARKET_CACHE_TTL - config.MARKET_REFRESH_MARGIN - age
+            if delay > 0 and self._market_cache:
+                self._stop_event.wait(delay)
+                continue
+            try:
+                self.refresh_markets(max_age=config.MARKET_CACHE_TTL - config.MARKET_REFRESH_MARGIN)
+            except Exception:
+                self._stop_event.wait(min(30, config.MARKET_CACHE_TTL))
+
+    def start_market_refresher(self):
+        """Start the thread that refreshes markets MARKET_REFRESH_MARGIN seconds before they expire."""
+        with self._market_lock:
+            if self._market_refresher and self._market_refresher.is_alive():
+                return self._market_refresher
+            self._stop_event.clear()
+            self._market_refresher = threading.Thread(target=self._market_refresh_loop, name="MarketRefresher", daemon=True)
+            self._market_refresher.start()
+            return self._market_refresher
+
+    def stop(self):
+        self._stop_event.set()
 
     def fetch_balance(self):
         try:
@@ -62,6 +194,22 @@ class DeltaExchangeClient:
             logger.error("Error creating limit order: %s", e)
             raise
 
+    def fetch_order_by_client_id(self, client_order_id, symbol=None):
+        """
+        The order carrying client_order_id (open, filled or canceled), or None when the
+        exchange reports no such order. Any other error is raised: the order's fate is unknown.
+        """
+        try:
+            return self.exchange.fetch_order(None, symbol, {"clientOrderId": client_order_id})
+        except ccxt.OrderNotFound:
+            return None
+        except ccxt.NetworkError:
+            raise
+        except ccxt.ExchangeError as e:
+            if "not_found" in str(e):
+                return None
+            raise
+
     def cancel_order(self, order_id, symbol, params=None):
         try:
             result = self.exchange.cancel_order(order_id, symbol, params or {})
@@ -89,6 +237,93 @@ class DeltaExchangeClient:
             logger.error("Error modifying bracket order: %s", e)
             raise
 
+    def _private_request(self, method_name, path, http_method, body):
+        if hasattr(self.exchange, method_name):
+            return getattr(self.exchange, method_name)(body)
+        return self.exchange.request(path, 'private', http_method, body)
+
+    def _product(self, symbol):
+        product_id = self.get_product_id(symbol)
+        return product_id, self.exchange.market(symbol)['id']
+
+    def _parse_orders(self, response):
+        result = response.get('result', response) if isinstance(response, dict) else response
+        if isinstance(result, dict):
+            result = [result]
+        return [self.exchange.parse_order(order) for order in result or []]
+
+    def create_orders(self, symbol, orders):
+        """
+        Place several limit orders on one product with Delta's batch endpoint.
+        orders is a list of {"side", "amount", "price", "params"}; params may carry
+        bracket_* fields. Returns the created orders in ccxt format.
+        """
+        product_id, product_symbol = self._product(symbol)
+        created = []
+        for start in range(0, len(orders), MAX_BATCH_ORDERS):
+            batch = []
+            for order in orders[start:start + MAX_BATCH_ORDERS]:
+                entry = {
+                    "side": order["side"],
+                    "size": int(order["amount"]),
+                    "order_type": "limit_order",
+                    "limit_price": str(order["price"]),
+                }
+                entry.update(order.get("params") or {})
+                batch.append(entry)
+            request_body = {"product_id": product_id, "product_symbol": product_symbol, "orders": batch}
+            try:
+                response = self._private_request('privatePostOrdersBatch', 'orders/batch', 'POST', request_body)
+            except Exception as e:
+                logger.error("Error creating batch orders: %s", e)
+                raise
+            created.extend(self._parse_orders(response))
+        logger.debug("Batch orders created: %s", created)
+        return created
+
+    def cancel_orders(self, order_ids, symbol):
+        """Cancel several orders of one product with Delta's batch endpoint."""
+        if not order_ids:
+            return []
+        product_id, product_symbol = self._product(symbol)
+        canceled = []
+        for start in range(0, len(order_ids), MAX_BATCH_ORDERS):
+            batch = [{"id": int(order_id)} for order_id in order_ids[start:start + MAX_BATCH_ORDERS]]
+            request_body = {"product_id": product_id, "product_symbol": product_symbol, "orders": batch}
+            try:
+                response = self._private_request('privateDeleteOrdersBatch', 'orders/batch', 'DELETE', request_body)
+            except Exception as e:
+                logger.error("Error canceling batch orders: %s", e)
+                raise
+            canceled.extend(self._parse_orders(response))
+        logger.debug("Batch orders canceled: %s", canceled)
+        return canceled
+
+    def cancel_all_orders(self, symbol=None, limit_orders=True, stop_orders=False):
+        """
+        Cancel every open order (of one product, if symbol is given) in one request.
+        Stop orders, which include position brackets, are kept unless stop_orders is set.
+        """
+        request_body = {"cancel_limit_orders": limit_orders, "cancel_stop_orders": stop_orders}
+        if symbol:
+            request_body["product_id"] = self.get_product_id(symbol)
+        try:
+            result = self._private_request('privateDeleteOrdersAll', 'orders/all', 'DELETE', request_body)
+            logger.debug("All orders canceled: %s", result)
+            return result
+        except Exception as e:
+            logger.error("Error canceling all orders: %s", e)
+            raise
+
+    def fetch_open_orders(self, symbol=None):
+        try:
+            orders = self.exchange.fetch_open_orders(symbol)
+            logger.debug("Open orders fetched: %s", orders)
+            return orders
+        except Exception as e:
+            logger.error("Error fetching open orders: %s", e)
+            raise
+
     def fetch_positions(self):
         try:
             if hasattr(self.exchange, 'fetch_positions'):
@@ -103,8 +338,25 @@ class DeltaExchangeClient:
             logger.error("Error fetching positions: %s", e)
             raise
 
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(account=DEFAULT_ACCOUNT, api_key=None, api_secret=None):
+    """
+    Return the process-wide DeltaExchangeClient for an account, creating it on first use.
+    Sharing one client per account shares its markets cache, time sync and rate limiter.
+    """
+    with _clients_lock:
+        client = _clients.get(account)
+        if client is None:
+            client = DeltaExchangeClient(api_key=api_key, api_secret=api_secret)
+            client.start_market_refresher()
+            _clients[account] = client
+            logger.debug("Created shared DeltaExchangeClient for account '%s'.", account)
+        return client
+
 if __name__ == '__main__':
-    client = DeltaExchangeClient()
+    client = get_client()
     try:
         markets = client.load_markets()
         print("Markets loaded successfully:", list(markets.keys()))
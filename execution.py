@@ -0,0 +1,97 @@
+import time
+import logging
+import threading
+from account_snapshot import get_account_snapshot, position_size
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def net_position_size(snapshot, symbol, max_age=None):
+    return sum(position_size(pos) for pos in snapshot.get_positions(symbol, max_age=max_age))
+
+
+class ExecutionWaiter:
+    """
+    Waits for order-state and position changes instead of sleeping a fixed time.
+
+    Every snapshot event (WebSocket push or REST refresh) wakes the waiters, which
+    re-check their condition. While the private stream is down the snapshot is
+    re-read every poll_interval seconds, so REST polling drives the same waits.
+    """
+
+    def __init__(self, snapshot=None, poll_interval=None, timeout=None):
+        self.snapshot = snapshot or get_account_snapshot()
+        self.poll_interval = poll_interval or config.EXECUTION_POLL_INTERVAL
+        self.timeout = timeout or config.EXECUTION_WAIT_TIMEOUT
+        self._condition = threading.Condition()
+        self.snapshot.add_listener(self._on_event)
+
+    def _on_event(self, kind, event, key, old, new):
+        with self._condition:
+            self._condition.notify_all()
+
+    def wait_for(self, predicate, timeout=None):
+        """
+        Block until predicate() is true or timeout expires; returns the last result.
+        predicate reads the snapshot with max_age=self.poll_interval.
+        """
+        deadline = time.time() + (self.timeout if timeout is None else timeout)
+        while True:
+            try:
+                result = predicate()
+            except Exception as e:
+                logger.error("Error checking execution state: %s", e)
+                result = False
+            if result:
+                return result
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return result
+            with self._condition:
+                self._condition.wait(min(remaining, self.poll_interval))
+
+    def wait_for_orders_closed(self, order_ids, symbol, timeout=None):
+        """Wait until none of order_ids is open any more (filled or canceled)."""
+        pending = {str(order_id) for order_id in order_ids or []}
+        if not pending:
+            return True
+
+        def closed():
+            open_ids = {str(o.get('id')) for o in self.snapshot.get_open_orders(symbol, max_age=self.poll_interval)}
+            return not (pending & open_ids)
+
+        done = self.wait_for(closed, timeout)
+        if not done:
+            logger.warning("Orders %s on %s still open after waiting.", sorted(pending), symbol)
+        return done
+
+    def wait_for_position_change(self, symbol, before, side, timeout=None):
+        """
+        Wait until the net position of symbol has moved from before in the direction
+        of side ("buy" increases it, "sell" decreases it).
+        """
+        def moved():
+            size = net_position_size(self.snapshot, symbol, max_age=self.poll_interval)
+            return size > before if side.lower() == "buy" else size < before
+
+        return self.wait_for(moved, timeout)
+
+    def wait_for_flat(self, symbol, timeout=None):
+        """Wait until there is no open position on symbol."""
+        return self.wait_for(lambda: net_position_size(self.snapshot, symbol, max_age=self.poll_interval) == 0, timeout)
+
+
+_waiter = None
+_waiter_lock = threading.Lock()
+
+
+def get_execution_waiter(snapshot=None):
+    """
+    Return the process-wide ExecutionWaiter, creating it on first use.
+    """
+    global _waiter
+    with _waiter_lock:
+        if _waiter is None:
+            _waiter = ExecutionWaiter(snapshot)
+        return _waiter
@@ -0,0 +1,67 @@
+import threading
+import time
+import numpy as np
+
+
+class FeedStats:
+    """
+    Per-feed health metrics: wire-to-process latency (exchange event time to local
+    processing time) kept in a preallocated ring, message rate, and staleness of
+    the latest message.
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.latency_ms = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+        self.messages = 0
+        self.rate = 0.0
+        self.last_event_ms = None
+        self.last_process_time = None
+        self._rate_start = time.time()
+        self._rate_messages = 0
+        self._lock = threading.Lock()
+
+    def record(self, event_ms, process_time=None):
+        process_time = process_time or time.time()
+        with self._lock:
+            self.messages += 1
+            self.last_process_time = process_time
+            if event_ms:
+                self.latency_ms[self.count % self.capacity] = process_time * 1000.0 - event_ms
+                self.count += 1
+                self.last_event_ms = event_ms
+
+    def update_rate(self, now=None):
+        """Recompute messages/second since the previous call; returns the rate."""
+        now = now or time.time()
+        with self._lock:
+            elapsed = now - self._rate_start
+            if elapsed > 0:
+                self.rate = (self.messages - self._rate_messages) / elapsed
+                self._rate_start = now
+                self._rate_messages = self.messages
+            return self.rate
+
+    def percentiles(self, pcts=(50, 90, 99)):
+        """Latency percentiles in milliseconds over the retained window, or None if empty."""
+        with self._lock:
+            n = min(self.count, self.capacity)
+            if not n:
+                return None
+            values = np.percentile(self.latency_ms[:n], pcts)
+        return dict(zip(pcts, (float(v) for v in values)))
+
+    def staleness(self, now=None):
+        """Seconds since the exchange produced the latest message, or None before the first one."""
+        if self.last_event_ms is None:
+            return None
+        return (now or time.time()) - self.last_event_ms / 1000.0
+
+    def summary(self):
+        return {
+            "messages": self.messages,
+            "rate": round(self.update_rate(), 2),
+            "latency_ms": self.percentiles(),
+            "staleness_s": self.staleness(),
+        }
@@ -0,0 +1,97 @@
+import threading
+import time
+
+
+class RateCounter:
+    """Events per second, recomputed each time rate() is called."""
+
+    def __init__(self):
+        self.count = 0
+        self._last_count = 0
+        self._last_time = time.time()
+
+    def tick(self):
+        self.count += 1
+
+    def rate(self):
+        now = time.time()
+        elapsed = now - self._last_time
+        if elapsed <= 0:
+            return 0.0
+        value = (self.count - self._last_count) / elapsed
+        self._last_count = self.count
+        self._last_time = now
+        return value
+
+
+class LatestFrameCapture:
+    """
+    Drains a stream on its own thread and keeps only the newest frame, so the
+    consumer always works on the freshest picture instead of OpenCV's backlog.
+
+    The stream only needs read_frame() -> (ret, frame). After max_failures
+    consecutive failed reads the capture marks itself failed and stops.
+    """
+
+    def __init__(self, stream, max_failures=5, retry_delay=5):
+        self.stream = stream
+        self.max_failures = max_failures
+        self.retry_delay = retry_delay
+        self.frame = None
+        self.frame_id = 0
+        self.captured_at = None
+        self.failed = False
+        self.capture_rate = RateCounter()
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="FrameCapture", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        failures = 0
+        while not self._stop_event.is_set():
+            try:
+                ret, frame = self.stream.read_frame()
+            except Exception as e:
+                print("Frame capture error:", e)
+                ret, frame = False, None
+            if not ret or frame is None:
+                failures += 1
+                if failures >= self.max_failures:
+                    with self._condition:
+                        self.failed = True
+                        self._condition.notify_all()
+                    return
+                self._stop_event.wait(self.retry_delay)
+                continue
+            failures = 0
+            self.capture_rate.tick()
+            with self._condition:
+                self.frame = frame
+                self.frame_id += 1
+                self.captured_at = time.time()
+                self._condition.notify_all()
+
+    def get_latest(self, last_id=0, timeout=None):
+        """
+        Wait for a frame newer than last_id. Returns (frame_id, frame, captured_at),
+        or None on timeout, failure or stop. Intermediate frames are dropped.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.frame_id != last_id or self.failed or self._stop_event.is_set(), timeout
+            )
+            if self.frame_id == last_id or self.frame is None:
+                return None
+            return self.frame_id, self.frame, self.captured_at
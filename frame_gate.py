@@ -0,0 +1,91 @@
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+
+def parse_roi(value):
+    """
+    Parse "x1,y1,x2,y2" given as fractions of the frame (e.g. "0.5,0,1,0.4").
+    Returns None for an empty value, meaning the whole frame.
+    """
+    if not value:
+        return None
+    x1, y1, x2, y2 = (float(v) for v in value.split(","))
+    return x1, y1, x2, y2
+
+
+def crop_roi(image, roi):
+    """Return (crop, (x_offset, y_offset)) for a fractional ROI; the crop is a view, not a copy."""
+    if roi is None:
+        return image, (0, 0)
+    h, w = image.shape[:2]
+    x1, y1 = int(roi[0] * w), int(roi[1] * h)
+    x2, y2 = int(roi[2] * w), int(roi[3] * h)
+    return image[y1:y2, x1:x2], (x1, y1)
+
+
+def dhash(gray, hash_size=16):
+    """Difference hash of a grayscale image as a Python int of hash_size**2 bits."""
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class FrameGate:
+    """
+    Decides whether a region has changed enough since the last OCR to be worth
+    recognizing again, and caches OCR results per region hash. A region only counts
+    as seen once its OCR succeeded (recognize returned), so a failed OCR is retried
+    on the next frame even if the region stays still.
+    """
+
+    def __init__(self, threshold=4, cache_size=256, hash_size=16):
+        self.threshold = threshold
+        self.hash_size = hash_size
+        self.cache_size = cache_size
+        self.last_hash = None
+        self.cache = OrderedDict()
+        self.skipped = 0
+        self.recognized = 0
+        self.cache_hits = 0
+
+    def check(self, gray):
+        """Return (changed, region_hash) against the last committed region."""
+        region_hash = dhash(gray, self.hash_size)
+        if self.last_hash is not None and hamming(region_hash, self.last_hash) <= self.threshold:
+            self.skipped += 1
+            return False, region_hash
+        return True, region_hash
+
+    def commit(self, region_hash):
+        """Mark region_hash as recognized; later frames are compared against it."""
+        self.last_hash = region_hash
+
+    def recognize(self, region_hash, gray, ocr, refresh=False):
+        """
+        Return cached OCR results for this hash, or run ocr(gray) and cache them, then
+        commit the hash. refresh=True ignores the cached copy. Empty results are not
+        cached (they may only mean a pre-filter found nothing), and if ocr raises
+        nothing is committed or cached.
+        """
+        results = None if refresh else self.cache.get(region_hash)
+        if results is not None:
+            self.cache.move_to_end(region_hash)
+            self.cache_hits += 1
+            self.commit(region_hash)
+            return results
+        results = ocr(gray)
+        self.recognized += 1
+        if results:
+            self.cache[region_hash] = results
+            self.cache.move_to_end(region_hash)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.pop(region_hash, None)
+        self.commit(region_hash)
+        return results
@@ -0,0 +1,89 @@
+import numpy as np
+
+SIGNAL_KEYWORDS = ["buy signal", "short signal", "take profit"]
+
+
+def is_trading_signal(text):
+    txt = text.lower()
+    return any(k in txt for k in SIGNAL_KEYWORDS)
+
+
+def ngrams(text, n=2):
+    """Set of character n-grams of a lower-cased, space-padded string."""
+    padded = f" {text.lower().strip()} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class KeywordMatcher:
+    """
+    Precompiled fuzzy matcher scoring every OCR token of a frame against every
+    keyword of every family in one matrix product.
+
+    The score is the Dice coefficient of character n-gram sets,
+    2 * |A & B| / (|A| + |B|). It costs a fraction of difflib's ratio but scores
+    lower on near misses (a one-character slip in a short label costs two bigrams),
+    so its threshold is tuned separately.
+    """
+
+    def __init__(self, families, threshold=0.75, n=2):
+        self.threshold = threshold
+        self.n = n
+        self.keywords = []
+        self.families = []
+        for family, keywords in families.items():
+            for keyword in keywords:
+                self.keywords.append(keyword)
+                self.families.append(family)
+        self.family_names = list(families)
+        self._family_index = np.array([self.family_names.index(f) for f in self.families], dtype=np.int64)
+
+        keyword_grams = [ngrams(k, n) for k in self.keywords]
+        self.vocab = {g: i for i, g in enumerate(sorted(set().union(*keyword_grams)))} if keyword_grams else {}
+        self._keyword_matrix = np.zeros((len(self.keywords), len(self.vocab)), dtype=np.float32)
+        for row, grams in enumerate(keyword_grams):
+            self._keyword_matrix[row, [self.vocab[g] for g in grams]] = 1.0
+        self._keyword_sizes = np.array([len(g) for g in keyword_grams], dtype=np.float32)
+
+    def score(self, tokens):
+        """Return a (len(tokens), len(keywords)) matrix of similarity scores."""
+        token_matrix = np.zeros((len(tokens), len(self.vocab)), dtype=np.float32)
+        token_sizes = np.zeros(len(tokens), dtype=np.float32)
+        for row, token in enumerate(tokens):
+            grams = ngrams(token, self.n)
+            token_sizes[row] = len(grams)
+            cols = [self.vocab[g] for g in grams if g in self.vocab]
+            if cols:
+                token_matrix[row, cols] = 1.0
+        if not len(tokens) or not len(self.keywords):
+            return np.zeros((len(tokens), len(self.keywords)), dtype=np.float32)
+        shared = token_matrix @ self._keyword_matrix.T
+        return 2.0 * shared / (token_sizes[:, None] + self._keyword_sizes[None, :])
+
+    def best_matches(self, tokens):
+        """
+        Return {family: (token_index, keyword, score)} for the best-scoring token of
+        each family, or None for a family whose best score is below the threshold.
+        """
+        scores = self.score(tokens)
+        best = {}
+        for f, family in enumerate(self.family_names):
+            columns = np.flatnonzero(self._family_index == f)
+            if not scores.size or not columns.size:
+                best[family] = None
+                continue
+            family_scores = scores[:, columns]
+            token_index, col = np.unravel_index(np.argmax(family_scores), family_scores.shape)
+            value = float(family_scores[token_index, col])
+            best[family] = (int(token_index), self.keywords[columns[col]], value) if value >= self.threshold else None
+        return best
+
+    def match_tokens(self, tokens):
+        """Return, per token, the family of its best keyword at or above the threshold, else None."""
+        scores = self.score(tokens)
+        if not scores.size:
+            return [None] * len(tokens)
+        cols = scores.argmax(axis=1)
+        return [
+            self.families[c] if scores[row, c] >= self.threshold else None
+            for row, c in enumerate(cols)
+        ]
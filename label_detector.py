@@ -0,0 +1,139 @@
+import glob
+import json
+import os
+import cv2
+import numpy as np
+
+# Default HSV colour ranges of the overlay label boxes: green (buy), red (short/take profit)
+DEFAULT_HSV_RANGES = [
+    [[35, 80, 80], [85, 255, 255]],
+    [[0, 80, 80], [10, 255, 255]],
+    [[170, 80, 80], [180, 255, 255]],
+]
+
+
+def load_templates(template_dir):
+    """Load every image in template_dir as a grayscale template."""
+    templates = []
+    if not template_dir:
+        return templates
+    for path in sorted(glob.glob(os.path.join(template_dir, "*"))):
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is not None:
+            templates.append((os.path.basename(path), image))
+    return templates
+
+
+def merge_boxes(boxes, pad=0, limit=None):
+    """
+    Pad boxes, clip them to limit=(w, h) and merge overlapping ones, repeating until no
+    two merged boxes overlap (a box that bridges two others joins all three).
+    """
+    merged = []
+    for x, y, w, h in boxes:
+        x1, y1, x2, y2 = x - pad, y - pad, x + w + pad, y + h + pad
+        if limit:
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(limit[0], x2), min(limit[1], y2)
+        merged.append([x1, y1, x2, y2])
+    changed = True
+    while changed:
+        changed = False
+        boxes, merged = sorted(merged), []
+        for box in boxes:
+            for other in merged:
+                if box[0] <= other[2] and box[2] >= other[0] and box[1] <= other[3] and box[3] >= other[1]:
+                    other[0], other[1] = min(other[0], box[0]), min(other[1], box[1])
+                    other[2], other[3] = max(other[2], box[2]), max(other[3], box[3])
+                    changed = True
+                    break
+            else:
+                merged.append(box)
+    return [(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in merged]
+
+
+class LabelDetector:
+    """
+    Finds candidate signal-label boxes in milliseconds using a colour mask with
+    contour filtering, plus optional matchTemplate against label images on disk.
+    Returns boxes as (x, y, w, h) in the coordinates of the image passed in.
+    """
+
+    def __init__(self, hsv_ranges=None, templates=None, match_threshold=0.75,
+                 min_area=150, min_aspect=1.5, pad=6):
+        self.hsv_ranges = [(np.array(lo, dtype=np.uint8), np.array(hi, dtype=np.uint8))
+                           for lo, hi in (hsv_ranges or DEFAULT_HSV_RANGES)]
+        self.templates = templates or []
+        self.match_threshold = match_threshold
+        self.min_area = min_area
+        self.min_aspect = min_aspect
+        self.pad = pad
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 3))
+
+    @classmethod
+    def from_config(cls, config):
+        hsv_ranges = json.loads(config.OCR_LABEL_HSV_RANGES) if config.OCR_LABEL_HSV_RANGES else None
+        return cls(
+            hsv_ranges=hsv_ranges,
+            templates=load_templates(config.OCR_LABEL_TEMPLATE_DIR),
+            match_threshold=config.OCR_LABEL_MATCH_THRESHOLD
+        )
+
+    def colour_boxes(self, bgr):
+        hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+        mask = None
+        for lo, hi in self.hsv_ranges:
+            part = cv2.inRange(hsv, lo, hi)
+            mask = part if mask is None else cv2.bitwise_or(mask, part)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self._kernel)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            # Labels are wide, short boxes; skip specks and candle bodies.
+            if w * h >= self.min_area and w >= self.min_aspect * h:
+                boxes.append((x, y, w, h))
+        return boxes
+
+    def template_boxes(self, gray):
+        boxes = []
+        for _, template in self.templates:
+            th, tw = template.shape[:2]
+            if th > gray.shape[0] or tw > gray.shape[1]:
+                continue
+            scores = cv2.matchTemplate(gray, template, cv2.TM_CCOEFF_NORMED)
+            ys, xs = np.where(scores >= self.match_threshold)
+            boxes.extend((int(x), int(y), tw, th) for x, y in zip(xs, ys))
+        return boxes
+
+    def detect(self, bgr, gray=None):
+        if gray is None:
+            gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        boxes = self.colour_boxes(bgr) + self.template_boxes(gray)
+        return merge_boxes(boxes, pad=self.pad, limit=(gray.shape[1], gray.shape[0]))
+
+
+class PrefilteredOcr:
+    """
+    Wraps an OCR callable ocr(gray, boxes=None) so it only recognizes the label
+    boxes found by a LabelDetector. With full=True (or without a detector or bgr
+    image) the whole region is read; the caller schedules those full reads to catch
+    labels the detector misses (SignalExtractor does so every OCR_FULL_EVERY_N frames).
+    """
+
+    def __init__(self, ocr, detector=None):
+        self.ocr = ocr
+        self.detector = detector
+        self.calls = 0
+        self.full_runs = 0
+
+    def __call__(self, gray, bgr=None, full=False):
+        self.calls += 1
+        if full or self.detector is None or bgr is None:
+            self.full_runs += 1
+            return self.ocr(gray)
+        boxes = self.detector.detect(bgr, gray)
+        if not boxes:
+            return []
+        # Recognize all label boxes in one batched call, without text detection.
+        return self.ocr(gray, boxes)
@@ -1,8 +1,70 @@
 import threading
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from signal_processor import start_signal_processing_loop
 from profit_trailing import ProfitTrailing
 from logger import setup_logging
+from exchange import get_client
+from account_snapshot import get_account_snapshot
+import config
+import binance_ws
+import delta_ws
+
+logger = logging.getLogger(__name__)
+
+
+def warm_markets():
+    get_client().load_markets()
+
+def warm_positions():
+    get_account_snapshot().get_positions(max_age=config.SNAPSHOT_MAX_AGE)
+
+def warm_price_feed():
+    binance_ws.run_in_thread()
+    _, price = binance_ws.wait_for_price(0, timeout=config.STARTUP_WARMUP_TIMEOUT)
+    if price is None:
+        raise RuntimeError("no Binance tick received yet")
+
+def warm_private_feed():
+    # Stream private order/position/fill updates into the shared account snapshot.
+    feed = delta_ws.run_in_thread()
+    deadline = time.time() + config.STARTUP_WARMUP_TIMEOUT
+    while not feed.snapshot.stream_live():
+        if time.time() > deadline:
+            raise RuntimeError("private feed not live yet; REST polling covers until it is")
+        time.sleep(0.1)
+
+def warm_ocr():
+    import youtube_ocr
+    youtube_ocr.warm_up()
+
+def _timed_phase(name, func):
+    start = time.time()
+    try:
+        func()
+        logger.info("Warm-up: %s ready in %.2fs.", name, time.time() - start)
+    except Exception as e:
+        logger.warning("Warm-up: %s failed after %.2fs: %s", name, time.time() - start, e)
+
+def warm_up():
+    """
+    Warm markets, positions, the WebSocket feeds and (when enabled) the OCR model in
+    parallel, waiting at most STARTUP_WARMUP_TIMEOUT. Phases still running carry on
+    in the background.
+    """
+    phases = [("markets", warm_markets), ("positions", warm_positions), ("price feed", warm_price_feed)]
+    if config.DELTA_WS_ENABLED:
+        phases.append(("private feed", warm_private_feed))
+    if config.OCR_ENABLED:
+        phases.append(("OCR model", warm_ocr))
+
+    start = time.time()
+    pool = ThreadPoolExecutor(max_workers=len(phases), thread_name_prefix="warmup")
+    futures = [pool.submit(_timed_phase, name, func) for name, func in phases]
+    _, pending = wait(futures, timeout=config.STARTUP_WARMUP_TIMEOUT)
+    pool.shutdown(wait=False)
+    logger.info("Warm-up finished in %.2fs (%d phase(s) still running).", time.time() - start, len(pending))
 
 
 def profit_trailing_thread():
@@ -11,8 +73,12 @@ def profit_trailing_thread():
 
 def main():
     setup_logging()
-    logger = logging.getLogger(__name__)
-    
+    warm_up()
+
+    if config.OCR_ENABLED:
+        import youtube_ocr
+        youtube_ocr.run_in_thread()
+
     # Start profit trailing in a daemon thread.
     pt_thread = threading.Thread(target=profit_trailing_thread, daemon=True)
     pt_thread.start()  
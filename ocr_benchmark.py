@@ -0,0 +1,119 @@
+"""
+Benchmark OCR profiles on stored sample frames.
+
+Sample frames are image files in a directory. An optional labels.json there maps
+file name -> expected signal text ("" for frames without a signal). For every
+profile the script reports frames/sec, the recognition batch size and the share
+of frames whose detected signal matches the label. Batching only applies to the
+gpu profile: EasyOCR recognizes crops one at a time on CPU.
+
+    python ocr_benchmark.py samples/ --profiles default cpu_quantized cpu_float --prefilter
+"""
+import argparse
+import glob
+import json
+import os
+import time
+import cv2
+import config
+from frame_gate import crop_roi, parse_roi
+from keyword_matcher import is_trading_signal
+from label_detector import LabelDetector, PrefilteredOcr
+from ocr_profiles import PROFILES, build_reader, run_ocr
+
+
+def load_samples(sample_dir):
+    labels = {}
+    labels_path = os.path.join(sample_dir, "labels.json")
+    if os.path.exists(labels_path):
+        with open(labels_path) as f:
+            labels = json.load(f)
+    samples = []
+    for path in sorted(glob.glob(os.path.join(sample_dir, "*"))):
+        frame = cv2.imread(path)
+        if frame is not None:
+            samples.append((os.path.basename(path), frame))
+    return samples, labels
+
+
+def detected_signal(results):
+    # Same rule as yt_main_loop: the right-most trading-signal token wins.
+    signals = [(bbox[0][0], text) for bbox, text, _ in results if is_trading_signal(text)]
+    return max(signals)[1].lower().strip() if signals else ""
+
+
+def benchmark_profile(name, samples, labels, roi, prefilter, repeat, default_threads=None):
+    profile = PROFILES[name]
+    if default_threads:
+        # build_reader only sets threads for profiles that pin them; start each profile from the
+        # process default so a previous profile's setting does not carry over.
+        import torch
+        torch.set_num_threads(default_threads)
+    reader = build_reader(profile)
+    ocr = lambda gray, boxes=None: run_ocr(reader, gray, boxes, profile["batch_size"])
+    if prefilter:
+        ocr = PrefilteredOcr(ocr, LabelDetector.from_config(config))
+
+    crops = []
+    for file_name, frame in samples:
+        roi_bgr, _ = crop_roi(frame, roi)
+        crops.append((file_name, roi_bgr, cv2.cvtColor(roi_bgr, cv2.COLOR_BGR2GRAY)))
+
+    if prefilter:
+        run = ocr
+    else:
+        run = lambda gray, bgr: ocr(gray)
+
+    # Warm-up so model initialisation is not counted.
+    if crops:
+        run(crops[0][2], crops[0][1])
+
+    correct = labelled = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for file_name, roi_bgr, gray in crops:
+            results = run(gray, roi_bgr)
+            if file_name in labels:
+                labelled += 1
+                expected = labels[file_name].lower().strip()
+                found = detected_signal(results)
+                correct += (expected in found) if expected else (found == "")
+    elapsed = time.perf_counter() - start
+    frames = len(crops) * repeat
+    return {
+        "profile": name,
+        "fps": frames / elapsed if elapsed else 0.0,
+        "batch_size": profile["batch_size"] if profile["gpu"] else None,
+        "accuracy": correct / labelled if labelled else None,
+        "frames": frames,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sample_dir")
+    parser.add_argument("--profiles", nargs="+", default=["default", "cpu_quantized", "cpu_float"],
+                        choices=sorted(PROFILES))
+    parser.add_argument("--roi", default=config.OCR_ROI, help='"x1,y1,x2,y2" fractions of the frame')
+    parser.add_argument("--prefilter", action="store_true", help="recognize only label boxes found by LabelDetector")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    samples, labels = load_samples(args.sample_dir)
+    if not samples:
+        parser.error(f"No readable images in {args.sample_dir}")
+    print(f"{len(samples)} frames, {len(labels)} labelled")
+    import torch
+    default_threads = torch.get_num_threads()
+    print(f"{'profile':<16}{'fps':>10}{'batch':>8}{'accuracy':>10}")
+    for name in args.profiles:
+        row = benchmark_profile(name, samples, labels, parse_roi(args.roi), args.prefilter, args.repeat,
+                                default_threads)
+        accuracy = f"{row['accuracy']:.1%}" if row["accuracy"] is not None else "n/a"
+        batch = row["batch_size"] if row["batch_size"] is not None else "none"
+        print(f"{row['profile']:<16}{row['fps']:>10.2f}{batch:>8}{accuracy:>10}")
+    print("Recognition batching is GPU-only; EasyOCR recognizes crops one at a time on CPU.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import config
+
+# OCR profiles: device, dynamic int8 quantization of the models, torch intra-op threads
+# (None = torch default) and recognition batch size. EasyOCR batches recognition on GPU
+# only (on CPU it reads crops one at a time), so CPU profiles use a batch size of 1.
+PROFILES = {
+    "default": {"gpu": False, "quantize": True, "threads": None, "batch_size": 1},
+    "cpu_quantized": {"gpu": False, "quantize": True, "threads": config.OCR_TORCH_THREADS, "batch_size": 1},
+    "cpu_float": {"gpu": False, "quantize": False, "threads": config.OCR_TORCH_THREADS, "batch_size": 1},
+    "gpu": {"gpu": True, "quantize": False, "threads": None, "batch_size": config.OCR_BATCH_SIZE},
+}
+
+
+def resolve_profile(name=None, cuda=False):
+    """Return (name, settings) for a profile name; "auto" picks "gpu" with CUDA, else "cpu_quantized"."""
+    name = name or config.OCR_PROFILE
+    if name == "auto":
+        name = "gpu" if cuda else "cpu_quantized"
+    if name not in PROFILES:
+        raise ValueError(f"Unknown OCR profile '{name}'. Choose from {sorted(PROFILES)} or 'auto'.")
+    return name, PROFILES[name]
+
+
+def build_reader(profile):
+    import torch
+    import easyocr
+    if profile["threads"]:
+        # Keep OCR from fighting the trading threads for every core.
+        torch.set_num_threads(profile["threads"])
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Can only be set once per process, before any parallel work.
+    return easyocr.Reader(['en'], gpu=profile["gpu"], quantize=profile["quantize"], verbose=False)
+
+
+def recognize_boxes(reader, gray, boxes, batch_size=1):
+    """
+    Recognize text in known (x, y, w, h) boxes of one image, skipping text detection.
+    Uses Reader.recognize, which batches the crops by batch_size on GPU (on CPU it
+    recognizes them one at a time).
+    """
+    horizontal_list = [[x, x + w, y, y + h] for x, y, w, h in boxes]
+    return reader.recognize(gray, horizontal_list=horizontal_list, free_list=[], batch_size=batch_size)
+
+
+def run_ocr(reader, gray, boxes=None, batch_size=1):
+    """readtext over the whole image, or recognition of the given boxes only (batched on GPU)."""
+    if boxes:
+        return recognize_boxes(reader, gray, boxes, batch_size)
+    return reader.readtext(gray, batch_size=batch_size)
@@ -0,0 +1,254 @@
+"""
+Watch several YouTube signal streams at once.
+
+Streams are spread round-robin over a bounded pool of worker processes. Each
+worker loads the OCR model once and time-slices it across its streams, taking
+the newest frame of each in turn. Every stream publishes to its own Redis keys
+(and optional signal stream), and workers report per-stream throughput and lag
+back to the supervisor.
+
+    OCR_STREAMS='[{"url": "https://www.youtube.com/live/...", "keys": ["signal_A"]}]' python ocr_supervisor.py
+"""
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+import config
+
+
+def load_streams():
+    """
+    Stream configs from OCR_STREAMS, or the single YOUTUBE_URL stream. An entry
+    publishes to a signal stream only if it names one; the legacy single-URL config
+    feeds the trading stream (SIGNAL_STREAM) as youtube_ocr does.
+    """
+    if config.OCR_STREAMS:
+        streams = json.loads(config.OCR_STREAMS)
+    else:
+        streams = [{"url": config.YOUTUBE_URL, "keys": ["signal_MAIN", "signal"], "stream": config.SIGNAL_STREAM}]
+    for stream in streams:
+        stream.setdefault("name", stream["url"])
+        stream.setdefault("keys", [])
+        stream.setdefault("stream", None)
+    return streams
+
+
+def _worker_main(worker_id, streams, stats_queue, profile_name):
+    # Heavy imports happen only in the worker process.
+    from frame_capture import LatestFrameCapture, RateCounter
+    from ocr_profiles import PROFILES, build_reader, run_ocr
+    from redis_pool import get_redis
+    from youtube_ocr import SignalExtractor, YouTubeStream, publish_aggregated
+
+    profile = PROFILES[profile_name]
+    reader = build_reader(profile)  # One model per worker, shared by all of its streams.
+    ocr = lambda gray, boxes=None: run_ocr(reader, gray, boxes, profile["batch_size"])
+    r = get_redis()
+
+    slots = []
+    for stream_config in streams:
+        stream = YouTubeStream(stream_config["url"])
+        slots.append({
+            "config": stream_config,
+            "stream": stream,
+            "capture": None,
+            "extractor": SignalExtractor(ocr),
+            "frame_id": 0,
+            "next_at": 0.0,
+            "restart_at": 0.0,
+            "backoff": 0.0,
+            "ocr_rate": RateCounter(),
+            "frames": 0,
+            "dropped": 0,
+            "lag": None,
+            "ocr_time": None,
+            "published": 0,
+            "last_publish": None,
+            "errors": 0,
+        })
+    print(f"OCR worker {worker_id} ready with {len(slots)} stream(s) ({profile_name}).")
+
+    last_stats = time.time()
+    while True:
+        now = time.time()
+        for slot in slots:
+            capture = slot["capture"]
+            if capture is not None and capture.failed:
+                print(f"[{slot['config']['name']}] Stream error encountered. Restarting capture "
+                      f"in {slot['backoff']:.1f}s...")
+                capture.stop()  # Its thread has already exited.
+                slot["stream"].release()
+                slot["capture"] = capture = None
+                slot["errors"] += 1
+                slot["restart_at"] = now + slot["backoff"]
+                slot["backoff"] = min(max(slot["backoff"] * 2, config.STREAM_RECONNECT_BACKOFF_MIN),
+                                      config.STREAM_RECONNECT_BACKOFF_MAX)
+            if capture is None and now >= slot["restart_at"]:
+                # The capture thread opens the stream (YouTubeStream.read_frame reconnects with its
+                # own backoff), so a slow yt-dlp resolve never blocks this worker's other streams.
+                slot["capture"] = capture = LatestFrameCapture(slot["stream"], retry_delay=0)
+                capture.start()
+                slot["frame_id"] = 0
+
+        # Serve the stream that has been waiting longest and has a new frame.
+        ready = sorted((s for s in slots if s["capture"] is not None and s["next_at"] <= now),
+                       key=lambda s: s["next_at"])
+        served = False
+        for slot in ready:
+            latest = slot["capture"].get_latest(slot["frame_id"], timeout=0)
+            if latest is None:
+                continue
+            if slot["frame_id"]:
+                slot["dropped"] += latest[0] - slot["frame_id"] - 1
+            slot["frame_id"], frame, captured_at = latest
+            slot["frames"] += 1
+            slot["backoff"] = 0.0
+            slot["next_at"] = now + config.OCR_SAMPLE_INTERVAL
+            slot["lag"] = time.time() - captured_at
+            extractor = slot["extractor"]
+            recognized = extractor.recognized
+            start = time.perf_counter()
+            try:
+                aggregated = extractor.process(frame)
+            except RuntimeError as e:
+                print(f"[{slot['config']['name']}] OCR error:", e)
+                slot["errors"] += 1
+                continue
+            if extractor.recognized != recognized:
+                # Frames skipped by the change gate do not count as OCR runs.
+                slot["ocr_time"] = time.perf_counter() - start
+                slot["ocr_rate"].tick()
+            if aggregated is not None:
+                try:
+                    publish_aggregated(r, aggregated, keys=slot["config"]["keys"], stream=slot["config"]["stream"])
+                    extractor.mark_published(aggregated)
+                    slot["published"] += 1
+                    slot["last_publish"] = time.time()
+                    print(f"[{slot['config']['name']}] Updated Redis:", aggregated)
+                except Exception as e:
+                    print(f"[{slot['config']['name']}] Redis update error:", e)
+                    slot["errors"] += 1
+            served = True
+            break
+
+        if time.time() - last_stats >= 1:
+            try:
+                stats_queue.put_nowait((worker_id, {
+                    slot["config"]["name"]: {
+                        "ocr_fps": slot["ocr_rate"].rate(),
+                        "capture_fps": slot["capture"].capture_rate.rate() if slot["capture"] else 0.0,
+                        "lag": slot["lag"],
+                        "ocr_time": slot["ocr_time"],
+                        "frames": slot["frames"],
+                        "dropped": slot["dropped"],
+                        "skipped": slot["extractor"].gate.skipped,
+                        "published": slot["published"],
+                        "last_publish": slot["last_publish"],
+                        "errors": slot["errors"],
+                        "connected": slot["capture"] is not None and not slot["capture"].failed
+                                     and slot["frame_id"] > 0,
+                    }
+                    for slot in slots
+                }))
+            except queue.Full:
+                pass
+            last_stats = time.time()
+
+        if not served:
+            time.sleep(0.05)
+
+
+class OcrSupervisor:
+    """
+    Spreads stream configs over at most pool_size OCR worker processes (default:
+    one per CPU, never more than there are streams), restarts workers that die
+    and collects their per-stream stats.
+    """
+
+    def __init__(self, streams, pool_size=None, profile_name=None):
+        from ocr_profiles import resolve_profile
+        self.streams = streams
+        cpus = os.cpu_count() or 1
+        self.pool_size = max(1, min(len(streams), pool_size or cpus))
+        # Workers run on CPU unless a GPU profile is asked for explicitly.
+        self.profile_name, _ = resolve_profile(profile_name, cuda=False)
+        self.restarts = 0
+        self._ctx = mp.get_context("spawn")
+        self._stats_queue = self._ctx.Queue(maxsize=1000)
+        self._stats = {}
+        self.workers = [None] * self.pool_size
+
+    def assignments(self, worker_id):
+        return self.streams[worker_id::self.pool_size]
+
+    def _start_worker(self, worker_id):
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.assignments(worker_id), self._stats_queue, self.profile_name),
+            name=f"OCRStreamWorker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        self.workers[worker_id] = process
+
+    def start(self):
+        print(f"Starting {self.pool_size} OCR worker(s) for {len(self.streams)} stream(s) ({self.profile_name}).")
+        for worker_id in range(self.pool_size):
+            self._start_worker(worker_id)
+
+    def check_workers(self):
+        for worker_id, process in enumerate(self.workers):
+            if process is not None and not process.is_alive():
+                print(f"OCR worker {worker_id} exited with code {process.exitcode}. Restarting...")
+                self.restarts += 1
+                self._start_worker(worker_id)
+
+    def collect_stats(self):
+        while True:
+            try:
+                worker_id, stats = self._stats_queue.get_nowait()
+            except queue.Empty:
+                break
+            for name, stream_stats in stats.items():
+                self._stats[name] = dict(stream_stats, worker=worker_id)
+
+    def stream_stats(self):
+        """Latest stats per stream name."""
+        self.collect_stats()
+        return dict(self._stats)
+
+    def log_stats(self):
+        now = time.time()
+        for name, s in sorted(self.stream_stats().items()):
+            lag = f"{s['lag']:.2f}s" if s["lag"] is not None else "n/a"
+            since = f"{now - s['last_publish']:.0f}s ago" if s["last_publish"] else "never"
+            print(f"[{name}] worker {s['worker']} | capture {s['capture_fps']:.1f} fps | OCR {s['ocr_fps']:.2f} fps | "
+                  f"lag {lag} | frames {s['frames']} (dropped {s['dropped']}, unchanged {s['skipped']}) | "
+                  f"published {s['published']} ({since}) | errors {s['errors']}")
+
+    def stop(self):
+        for process in self.workers:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in self.workers:
+            if process is not None:
+                process.join(timeout=5)
+
+    def run(self):
+        self.start()
+        last_log = time.time()
+        try:
+            while True:
+                time.sleep(1)
+                self.check_workers()
+                self.collect_stats()
+                if time.time() - last_log >= config.OCR_STATS_INTERVAL:
+                    self.log_stats()
+                    last_log = time.time()
+        finally:
+            self.stop()
+
+
+if __name__ == "__main__":
+    OcrSupervisor(load_streams(), pool_size=config.OCR_POOL_SIZE).run()
@@ -0,0 +1,151 @@
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+
+def _worker_main(shm_name, requests, results, profile_name):
+    # Heavy imports happen only in the worker process.
+    from ocr_profiles import PROFILES, build_reader, run_ocr
+    profile = PROFILES[profile_name]
+    reader = build_reader(profile)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    results.put(("ready", None))
+    try:
+        while True:
+            item = requests.get()
+            if item is None:
+                break
+            req_id, shape, boxes = item
+            # Zero-copy view over the frame the parent wrote into shared memory.
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+            try:
+                out = [
+                    ([[float(x), float(y)] for x, y in bbox], text, float(prob))
+                    for bbox, text, prob in run_ocr(reader, frame, boxes, profile["batch_size"])
+                ]
+                results.put((req_id, out))
+            except Exception as e:
+                results.put((req_id, f"OCR failed: {e}"))
+            del frame
+    finally:
+        shm.close()
+
+
+class OcrWorker:
+    """
+    Runs EasyOCR in a separate process so recognition never holds the trading
+    process's GIL. Frames are handed over through one shared-memory slot (the
+    parent waits for each result before writing the next frame) and only the
+    small list of (bbox, text, prob) results comes back. A worker that dies or
+    exceeds the timeout is restarted with a fresh slot; the old one is unlinked,
+    as is the last one on close(). A frame larger than the slot restarts the
+    worker on a slot of that size.
+    """
+
+    def __init__(self, profile_name="cpu_quantized", max_frame_bytes=1920 * 1080 * 3, timeout=30, start_timeout=300):
+        self.profile_name = profile_name
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.restarts = 0
+        self._ctx = mp.get_context("spawn")
+        self._max_frame_bytes = max_frame_bytes
+        self._shm = None
+        self._req_id = 0
+        self._start()
+
+    def _start(self):
+        self._shm = shared_memory.SharedMemory(create=True, size=self._max_frame_bytes)
+        self._requests = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._ready = False
+        self.process = self._ctx.Process(
+            target=_worker_main,
+            args=(self._shm.name, self._requests, self._results, self.profile_name),
+            name="OCRWorker",
+            daemon=True
+        )
+        self.process.start()
+
+    def _restart(self, reason):
+        print(f"Restarting OCR worker ({reason}).")
+        self.restarts += 1
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(timeout=5)
+        self._release_shm()
+        self._start()
+
+    def _release_shm(self):
+        if self._shm is None:
+            return
+        shm, self._shm = self._shm, None
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _wait_ready(self):
+        deadline = time.time() + self.start_timeout
+        while not self._ready:
+            try:
+                tag, _ = self._results.get(timeout=1)
+                self._ready = tag == "ready"
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise RuntimeError("OCR worker exited during start-up")
+                if time.time() > deadline:
+                    raise RuntimeError("OCR worker did not start in time")
+
+    def recognize(self, gray, boxes=None):
+        """
+        Run OCR on a uint8 image in the worker, or only on (x, y, w, h) boxes of it;
+        raises RuntimeError if the worker fails.
+        """
+        if not self.process.is_alive():
+            self._restart("worker died")
+        self._wait_ready()
+        gray = np.ascontiguousarray(gray, dtype=np.uint8)
+        if gray.nbytes > self._shm.size:
+            # Grow the slot: restart the worker on a fresh slot that fits this frame.
+            self._max_frame_bytes = gray.nbytes
+            self._restart(f"frame of {gray.nbytes} bytes exceeds shared slot of {self._shm.size}")
+            self._wait_ready()
+        np.ndarray(gray.shape, dtype=np.uint8, buffer=self._shm.buf)[...] = gray
+        self._req_id += 1
+        req_id = self._req_id
+        self._requests.put((req_id, gray.shape, boxes))
+
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                result_id, payload = self._results.get(timeout=1)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    self._restart("worker died during recognition")
+                    raise RuntimeError("OCR worker died")
+                if time.time() > deadline:
+                    self._restart("recognition timed out")
+                    raise RuntimeError("OCR worker timed out")
+                continue
+            if result_id != req_id:
+                continue  # Late answer to an abandoned request.
+            if isinstance(payload, str):
+                raise RuntimeError(payload)
+            return payload
+
+    def close(self):
+        """Stop the worker and unlink its shared-memory slot; safe to call more than once."""
+        if self._shm is None:
+            return
+        try:
+            if self.process.is_alive():
+                self._requests.put(None)
+                self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout=5)
+        finally:
+            self._release_shm()
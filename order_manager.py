@@ -2,158 +2,386 @@ import logging
 import uuid
 import time
 import json
-import redis
-from exchange import DeltaExchangeClient
+import hashlib
+import ccxt
+from redis_pool import get_redis
+from exchange import get_client
+from account_snapshot import get_account_snapshot
+from order_store import OrderRecord, OrderStore
+from write_behind import get_write_behind
 import config
 
 logger = logging.getLogger(__name__)
 
+# Redis layout: one hash per order (JSON-encoded fields) and one id set per status
+ORDER_KEY = "orders:{}"
+ORDER_STATUS_KEY = "orders:status:{}"
+ORDER_STATUSES = ("open", "pending", "closed", "canceled", "cancelled", "filled", "rejected", "expired")
+
+def make_bracket_params(stop_loss=None, take_profit=None, trigger_method="last_traded_price"):
+    """
+    Bracket fields for an order request; sent with the entry order they protect it
+    from the moment it is accepted.
+    """
+    params = {"bracket_stop_trigger_method": trigger_method}
+    if stop_loss is not None:
+        params["bracket_stop_loss_limit_price"] = str(stop_loss)
+        params["bracket_stop_loss_price"] = str(stop_loss)
+    if take_profit is not None:
+        params["bracket_take_profit_limit_price"] = str(take_profit)
+        params["bracket_take_profit_price"] = str(take_profit)
+    return params
+
+def signal_key(signal_data, seq=None, nonce=None):
+    """
+    Identity of a signal: its stream sequence id, else a hash of its content and
+    nonce. Polled signals have no sequence id and the same text repeats byte for
+    byte (buy, sell, buy again), so the poller passes a nonce unique to each
+    occurrence.
+    """
+    if seq:
+        return f"seq:{seq}"
+    payload = json.dumps(signal_data, sort_keys=True)
+    if nonce is not None:
+        payload = f"{payload}:{nonce}"
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def make_client_order_id(key, side, purpose="entry"):
+    """
+    Deterministic client order id (32 hex chars, Delta's limit) for the order a
+    signal produces, so a replayed or retried signal maps to the same id.
+    """
+    return hashlib.sha1(f"{key}:{side.lower()}:{purpose}".encode()).hexdigest()[:32]
+
 class OrderManager:
     def __init__(self):
-        self.client = DeltaExchangeClient()
-        self.orders = {}
-        self.redis_client = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB)
+        self.client = get_client()
+        self.snapshot = get_account_snapshot(self.client)
+        self.orders = OrderStore(max_size=config.ORDER_STORE_MAX_SIZE, terminal_ttl=config.ORDER_STORE_TERMINAL_TTL)
+        self.redis_client = get_redis()
+        self.writer = get_write_behind()
+        self.load_orders()
+        # Orders that leave the exchange's open list are closed locally too.
+        self.snapshot.add_listener(self._on_snapshot_event)
+
+    def _store_order_in_redis(self, record):
+        """
+        Queue the record's current state for Redis; the write-behind thread writes it
+        (hash plus status index) in its next pipeline, off the trading path.
+        """
+        key = ORDER_KEY.format(record.id)
+        fields = {name: json.dumps(value) for name, value in record.to_dict().items()}
+        order_id, status, terminal = record.id, record.status, not record.is_open
+
+        def write(pipe):
+            pipe.hset(key, mapping=fields)
+            for other in ORDER_STATUSES:
+                if other != status:
+                    pipe.srem(ORDER_STATUS_KEY.format(other), order_id)
+            pipe.sadd(ORDER_STATUS_KEY.format(status), order_id)
+            if terminal:
+                pipe.expire(key, int(config.ORDER_STORE_TERMINAL_TTL))
 
-    def _store_order_in_redis(self, order_info):
-        key = f"order:{order_info['id']}"
-        self.redis_client.set(key, json.dumps(order_info))
+        self.writer.submit(key, write)
 
-    def is_order_open(self, symbol, side):
-        # First, check actual open orders via API
+    def load_orders(self):
+        """
+        Rehydrate the order store from Redis with two pipelined reads: the status
+        index sets, then every order hash. Returns the number of orders loaded.
+        """
         try:
-            open_orders = self.client.exchange.fetch_open_orders(symbol)
-            for order in open_orders:
-                if order.get('side', '').lower() == side.lower() and order.get('status', '').lower() == 'open':
-                    return True
+            pipe = self.redis_client.pipeline(transaction=False)
+            for status in ORDER_STATUSES:
+                pipe.smembers(ORDER_STATUS_KEY.format(status))
+            ids = sorted({
+                member.decode() if isinstance(member, bytes) else member
+                for members in pipe.execute() for member in members
+            })
+            if not ids:
+                return 0
+            pipe = self.redis_client.pipeline(transaction=False)
+            for order_id in ids:
+                pipe.hgetall(ORDER_KEY.format(order_id))
+            records = []
+            for order_id, data in zip(ids, pipe.execute()):
+                if not data:
+                    # Expired terminal order: drop it from the indexes too.
+                    self.writer.submit(("orders:expired", order_id), lambda p, order_id=order_id: [
+                        p.srem(ORDER_STATUS_KEY.format(status), order_id) for status in ORDER_STATUSES
+                    ])
+                    continue
+                fields = {
+                    (name.decode() if isinstance(name, bytes) else name): json.loads(value)
+                    for name, value in data.items()
+                }
+                records.append(OrderRecord.from_dict(fields))
         except Exception as e:
-            logger.error("Error checking open orders via API: %s", e)
+            logger.error("Error loading orders from Redis: %s", e)
+            return 0
+        for record in sorted(records, key=lambda r: r.timestamp or 0):
+            self.orders.add(record)
+        logger.info("Loaded %d orders from Redis (%d open).", len(records), sum(r.is_open for r in records))
+        return len(records)
 
-        # Fallback to local cache
-        for order in self.orders.values():
-            if order['symbol'] == symbol and order['side'].lower() == side.lower() and order['status'].lower() == 'open':
-                return True
-        return False
+    def _on_snapshot_event(self, kind, event, key, old, new):
+        if kind != "order" or event not in ("changed", "closed"):
+            return
+        record = self.orders.get(key)
+        if record is None or not record.is_open:
+            return
+        status = (new or {}).get('status') or ('closed' if event == "closed" else record.status)
+        if status.lower() != record.status:
+            self.orders.set_status(key, status)
+            self._store_order_in_redis(record)
+
+    def has_local_open_order(self, symbol, side, max_age=None):
+        """
+        True if an order placed by this process for (symbol, side) is still open locally;
+        with max_age (seconds), only orders placed within that time count.
+        """
+        return self.orders.has_open(symbol, side, max_age=max_age)
 
     def has_open_position(self, symbol, side):
         """
         Returns True if an actual position is open on the exchange.
         """
         try:
-            positions = self.client.fetch_positions()
-            for pos in positions:
-                pos_symbol = (pos.get('info', {}).get('product_symbol') or pos.get('symbol') or '')
-                if symbol not in pos_symbol:
-                    continue
-                size = pos.get('size') or pos.get('contracts') or 0
-                try:
-                    size = float(size)
-                except Exception:
-                    size = 0.0
-                if side.lower() == "buy" and size > 0:
-                    return True
-                if side.lower() == "sell" and size < 0:
-                    return True
+            return self.snapshot.has_position(symbol, side)
         except Exception as e:
             logger.error("Error checking open positions via API: %s", e)
         return False
 
-    def place_order(self, symbol, side, amount, price, params=None):
+    def record_order(self, order, symbol, side, amount, price=None, params=None):
+        """
+        Keep an order returned by the exchange in the local store (and Redis); returns it as a dict.
+        """
+        order_id = order.get('id')
+        if not order_id:
+            order_id = int(time.time() * 1000)
+        record = OrderRecord(
+            id=order_id,
+            symbol=symbol,
+            side=side,
+            amount=amount,
+            price=price,
+            params=params or {},
+            status=order.get('status') or 'open',
+            timestamp=order.get('timestamp') or int(time.time() * 1000),
+            client_order_id=(params or {}).get('client_order_id'),
+        )
+        self.orders.add(record)
+        self._store_order_in_redis(record)
+        return record.to_dict()
+
+    def claim_client_order_id(self, client_order_id):
+        """
+        Return True if client_order_id has not been submitted before (and claim it),
+        False for a duplicate. Ids are submitted at most once, even across restarts.
+        """
+        try:
+            return bool(self.redis_client.set(f"client_order:{client_order_id}", int(time.time()),
+                                              nx=True, ex=config.CLIENT_ORDER_ID_TTL))
+        except Exception as e:
+            logger.error("Error claiming client order id %s: %s", client_order_id, e)
+            return True
+
+    def release_client_order_id(self, client_order_id, error=None):
+        """
+        Undo a claim after a failed submission. A rejected order frees its id at once;
+        after a transport error the order may still have reached the exchange, so the
+        claim is only shortened to CLIENT_ORDER_ID_FAILED_TTL.
+        """
+        key = f"client_order:{client_order_id}"
+        try:
+            if isinstance(error, ccxt.NetworkError):
+                self.redis_client.expire(key, config.CLIENT_ORDER_ID_FAILED_TTL)
+            else:
+                self.redis_client.delete(key)
+        except Exception as e:
+            logger.error("Error releasing client order id %s: %s", client_order_id, e)
+
+    def find_order_by_client_id(self, client_order_id, symbol=None):
+        """
+        Look for the order carrying client_order_id: locally, in streamed fills, then
+        in the exchange's order history over REST. Returns None only when the exchange
+        confirms there is no such order; raises when the lookup itself fails.
+        """
+        record = self.orders.find_by_client_id(client_order_id)
+        if record is not None:
+            return record.to_dict()
+        for fill in list(self.snapshot.fills):
+            if fill.get('clientOrderId') == client_order_id:
+                return dict(fill, id=fill.get('order'), status='closed')
+        return self.client.fetch_order_by_client_id(client_order_id, symbol)
+
+    def submit(self, create, symbol, client_order_id=None):
+        """
+        Call create() to send an order. With a client order id, a transport error is
+        retried under the same id only once the exchange confirms (over REST) that the
+        order never arrived; if it did, that order is returned. When the lookup fails
+        too, the original error is raised rather than risking a duplicate (e.g. a
+        second IOC close that would open a reverse position).
+        """
+        attempts = 1 + (config.ORDER_SUBMIT_RETRIES if client_order_id else 0)
+        for attempt in range(1, attempts + 1):
+            try:
+                return create()
+            except ccxt.NetworkError as e:
+                if attempt == attempts:
+                    raise
+                try:
+                    existing = self.find_order_by_client_id(client_order_id, symbol)
+                except Exception as lookup_error:
+                    logger.error("Cannot confirm whether order %s reached the exchange (%s). Not retrying.",
+                                 client_order_id, lookup_error)
+                    raise e
+                if existing:
+                    logger.info("Order %s reached the exchange despite %s.", client_order_id, e)
+                    return existing
+                logger.warning("Retrying order %s after %s (attempt %d/%d).", client_order_id, e, attempt + 1, attempts)
+
+    def place_order(self, symbol, side, amount, price, params=None, client_order_id=None):
+        if client_order_id:
+            if not self.claim_client_order_id(client_order_id):
+                logger.info("Order %s was already submitted. Skipping duplicate.", client_order_id)
+                return None
+            params = dict(params or {}, client_order_id=client_order_id)
         try:
-            order = self.client.create_limit_order(symbol, side, amount, price, params)
-            order_id = order.get('id')
-            if not order_id:
-                order_id = int(time.time() * 1000)
-            order_info = {
-                'id': order_id,
-                'symbol': symbol,
-                'side': side,
-                'amount': amount,
-                'price': price,
-                'params': params or {},
-                'status': order.get('status', 'open'),
-                'timestamp': order.get('timestamp', int(time.time() * 1000))
-            }
-            self.orders[order_id] = order_info
-            self._store_order_in_redis(order_info)
+            try:
+                order = self.submit(lambda: self.client.create_limit_order(symbol, side, amount, price, params),
+                                    symbol, client_order_id)
+            except Exception as e:
+                if client_order_id:
+                    self.release_client_order_id(client_order_id, e)
+                raise
+            order_info = self.record_order(order, symbol, side, amount, price, params)
+            self.snapshot.invalidate()
             logger.debug("Placed order: %s", order_info)
             return order_info
         except Exception as e:
             logger.error("Error placing order for %s: %s", symbol, e)
             raise
 
+    def place_bracket_order(self, symbol, side, amount, price, stop_loss=None, take_profit=None, params=None,
+                            client_order_id=None):
+        """
+        Place a limit entry with its bracket stop loss / take profit in the same request.
+        """
+        order_params = dict(params or {})
+        order_params.update(make_bracket_params(stop_loss, take_profit))
+        return self.place_order(symbol, side, amount, price, params=order_params, client_order_id=client_order_id)
+
+    def place_orders(self, symbol, orders):
+        """
+        Place several limit orders in one batch request; orders is a list of
+        {"side", "amount", "price", "params"}.
+        """
+        try:
+            created = self.client.create_orders(symbol, orders)
+            placed = [
+                self.record_order(order, symbol, request['side'], request['amount'], request['price'], request.get('params'))
+                for order, request in zip(created, orders)
+            ]
+            self.snapshot.invalidate()
+            logger.debug("Placed batch orders: %s", placed)
+            return placed
+        except Exception as e:
+            logger.error("Error placing batch orders for %s: %s", symbol, e)
+            raise
+
     def attach_bracket_to_order(self, order_id, product_id, product_symbol, bracket_params):
         try:
             exchange_order = self.client.modify_bracket_order(order_id, product_id, product_symbol, bracket_params)
-            if order_id in self.orders:
-                self.orders[order_id]['params'].update(bracket_params)
-                self.orders[order_id]['status'] = exchange_order.get('state', self.orders[order_id]['status'])
-                self._store_order_in_redis(self.orders[order_id])
-                logger.debug("Attached bracket to order %s: %s", order_id, self.orders[order_id])
-                return self.orders[order_id]
+            record = self.orders.get(order_id)
+            if record is not None:
+                record.params.update(bracket_params)
+                self.orders.set_status(order_id, exchange_order.get('state') or record.status)
+                self._store_order_in_redis(record)
+                logger.debug("Attached bracket to order %s: %s", order_id, record.to_dict())
+                return record.to_dict()
             else:
-                order_info = {
-                    'id': order_id,
-                    'product_id': product_id,
-                    'product_symbol': product_symbol,
-                    'params': bracket_params,
-                    'status': exchange_order.get('state', 'open'),
-                    'timestamp': exchange_order.get('created_at', int(time.time() * 1000000))
-                }
-                self.orders[order_id] = order_info
-                self._store_order_in_redis(order_info)
-                logger.debug("Attached bracket to order (new record) %s: %s", order_id, order_info)
-                return order_info
+                record = self.orders.add(OrderRecord(
+                    id=order_id,
+                    product_id=product_id,
+                    product_symbol=product_symbol,
+                    params=dict(bracket_params),
+                    status=exchange_order.get('state', 'open'),
+                    timestamp=exchange_order.get('created_at', int(time.time() * 1000000))
+                ))
+                self._store_order_in_redis(record)
+                logger.debug("Attached bracket to order (new record) %s: %s", order_id, record.to_dict())
+                return record.to_dict()
         except Exception as e:
             logger.error("Error attaching bracket to order %s: %s", order_id, e)
             raise
 
     def modify_bracket_order(self, order_id, new_bracket_params):
-        if order_id not in self.orders:
+        record = self.orders.get(order_id)
+        if record is None:
             raise ValueError("Bracket order ID not found.")
-        order = self.orders[order_id]
-        order['params'].update(new_bracket_params)
-        self._store_order_in_redis(order)
-        logger.debug("Modified bracket order %s locally: %s", order_id, order)
-        return order
+        record.params.update(new_bracket_params)
+        self._store_order_in_redis(record)
+        logger.debug("Modified bracket order %s locally: %s", order_id, record.to_dict())
+        return record.to_dict()
 
     def cancel_order(self, order_id):
-        if order_id not in self.orders:
+        record = self.orders.get(order_id)
+        if record is None:
             raise ValueError("Order ID not found.")
-        order = self.orders[order_id]
-        symbol = order.get('symbol') or order.get('product_symbol')
         try:
-            result = self.client.cancel_order(order_id, symbol)
-            order['status'] = 'canceled'
-            self._store_order_in_redis(order)
+            result = self.client.cancel_order(order_id, record.symbol)
+            self.orders.set_status(order_id, 'canceled')
+            self._store_order_in_redis(record)
+            self.snapshot.invalidate()
             logger.debug("Canceled order %s: %s", order_id, result)
             return result
         except Exception as e:
             logger.error("Error canceling order %s: %s", order_id, e)
             raise
 
+    def cancel_orders(self, order_ids, symbol):
+        """
+        Cancel several orders of one symbol in one batch request.
+        """
+        if not order_ids:
+            return []
+        try:
+            result = self.client.cancel_orders(order_ids, symbol)
+        except Exception as e:
+            logger.error("Error canceling orders %s: %s", order_ids, e)
+            raise
+        for order_id in order_ids:
+            record = self.orders.set_status(order_id, 'canceled')
+            if record is not None:
+                self._store_order_in_redis(record)
+        self.snapshot.invalidate()
+        logger.debug("Canceled orders %s: %s", order_ids, result)
+        return result
+
+    def cancel_open_orders(self, symbol, side=None):
+        """
+        Cancel all open orders of a symbol, or only those on one side, in one request.
+        Returns the canceled order ids.
+        """
+        order_ids = [
+            order['id'] for order in self.snapshot.get_open_orders(symbol)
+            if order.get('status', '').lower() == 'open'
+            and (side is None or order.get('side', '').lower() == side.lower())
+        ]
+        self.cancel_orders(order_ids, symbol)
+        return order_ids
+
 if __name__ == '__main__':
     om = OrderManager()
     try:
-        limit_order = om.place_order("BTCUSD", "buy", 1, 45000)
-        print("Limit order placed:", limit_order)
+        limit_order = om.place_bracket_order("BTCUSD", "buy", 1, 45000, stop_loss=44000, take_profit=55000)
+        print("Limit order with bracket placed:", limit_order)
     except Exception as e:
         print("Failed to place limit order:", e)
         exit(1)
 
-    bracket_params = {
-        "bracket_stop_loss_limit_price": "50000",
-        "bracket_stop_loss_price": "50000",
-        "bracket_take_profit_limit_price": "55000",
-        "bracket_take_profit_price": "55000",
-        "bracket_stop_trigger_method": "last_traded_price"
-    }
     try:
-        updated_order = om.attach_bracket_to_order(
-            order_id=limit_order['id'],
-            product_id=27,
-            product_symbol="BTCUSD",
-            bracket_params=bracket_params
-        )
-        print("Bracket attached, updated order:", updated_order)
+        canceled = om.cancel_open_orders("BTCUSD", "buy")
+        print("Canceled pending buy orders:", canceled)
     except Exception as e:
-        print("Failed to attach bracket to order:", e)
\ No newline at end of file
+        print("Failed to cancel orders:", e)
\ No newline at end of file
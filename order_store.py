@@ -0,0 +1,196 @@
+import time
+import threading
+from collections import OrderedDict, defaultdict
+
+OPEN_STATUSES = frozenset(["open", "pending"])
+
+
+class OrderRecord:
+    """Locally placed order. Fixed attribute set, so thousands of them stay small."""
+
+    __slots__ = ("id", "symbol", "side", "amount", "price", "params", "status", "timestamp",
+                 "client_order_id", "product_id", "product_symbol", "updated_at")
+
+    def __init__(self, id, symbol=None, side=None, amount=None, price=None, params=None, status="open",
+                 timestamp=None, client_order_id=None, product_id=None, product_symbol=None):
+        self.id = id
+        self.symbol = symbol or product_symbol
+        self.side = (side or "").lower()
+        self.amount = amount
+        self.price = price
+        self.params = params or {}
+        self.status = (status or "open").lower()
+        self.timestamp = timestamp if timestamp is not None else int(time.time() * 1000)
+        self.client_order_id = client_order_id
+        self.product_id = product_id
+        self.product_symbol = product_symbol
+        self.updated_at = time.time()
+
+    @property
+    def is_open(self):
+        return self.status in OPEN_STATUSES
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__ if name != "updated_at"}
+        return {key: value for key, value in data.items() if value is not None}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data.get(name) for name in cls.__slots__ if name != "updated_at"})
+
+
+class OrderStore:
+    """
+    Local orders indexed by id, client order id, symbol, status and open
+    (symbol, side), so "any open order for (symbol, side)" is a set lookup.
+
+    Orders that reach a terminal status are evicted after terminal_ttl seconds (swept
+    on writes and reads alike), and the store never holds more than max_size orders
+    (oldest terminal ones go first, then the oldest overall).
+    """
+
+    def __init__(self, max_size=10000, terminal_ttl=86400):
+        self.max_size = max_size
+        self.terminal_ttl = terminal_ttl
+        self._orders = OrderedDict()
+        self._by_client_id = {}
+        self._by_symbol = defaultdict(set)
+        self._by_status = defaultdict(set)
+        self._open = defaultdict(set)
+        self._terminal = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        self._sweep()
+        return len(self._orders)
+
+    def __contains__(self, order_id):
+        self._sweep()
+        return order_id in self._orders
+
+    def get(self, order_id):
+        self._sweep()
+        return self._orders.get(order_id)
+
+    def find_by_client_id(self, client_order_id):
+        self._sweep()
+        order_id = self._by_client_id.get(client_order_id)
+        return self._orders.get(order_id) if order_id is not None else None
+
+    def _sweep(self):
+        """Evict expired terminal orders before a read; one comparison when none has expired."""
+        terminal = self._terminal
+        if not terminal:
+            return
+        with self._lock:
+            if terminal and time.time() - next(iter(terminal.values())) >= self.terminal_ttl:
+                self.evict()
+
+    def _index(self, record):
+        self._by_symbol[record.symbol].add(record.id)
+        self._by_status[record.status].add(record.id)
+        if record.client_order_id:
+            self._by_client_id[record.client_order_id] = record.id
+        if record.is_open:
+            self._open[(record.symbol, record.side)].add(record.id)
+        else:
+            self._terminal[record.id] = record.updated_at
+
+    def _unindex(self, record):
+        for index, key in ((self._by_symbol, record.symbol), (self._by_status, record.status),
+                           (self._open, (record.symbol, record.side))):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(record.id)
+                if not ids:
+                    del index[key]
+        if record.client_order_id and self._by_client_id.get(record.client_order_id) == record.id:
+            del self._by_client_id[record.client_order_id]
+        self._terminal.pop(record.id, None)
+
+    def add(self, record):
+        """Insert or replace a record; returns it."""
+        with self._lock:
+            previous = self._orders.pop(record.id, None)
+            if previous is not None:
+                self._unindex(previous)
+            self._orders[record.id] = record
+            self._index(record)
+            self.evict()
+            return record
+
+    def update(self, order_id, **fields):
+        """Change fields of a stored record (keeping the indexes in step); returns it or None."""
+        with self._lock:
+            record = self._orders.get(order_id)
+            if record is None:
+                return None
+            self._unindex(record)
+            for name, value in fields.items():
+                if name in ("status", "side") and value is not None:
+                    value = value.lower()
+                setattr(record, name, value)
+            record.updated_at = time.time()
+            self._index(record)
+            return record
+
+    def set_status(self, order_id, status):
+        return self.update(order_id, status=status)
+
+    def remove(self, order_id):
+        with self._lock:
+            record = self._orders.pop(order_id, None)
+            if record is not None:
+                self._unindex(record)
+            return record
+
+    def has_open(self, symbol, side, max_age=None):
+        """
+        True if an open order exists for (symbol, side). With max_age (seconds) only
+        orders placed within that time count.
+        """
+        ids = self._open.get((symbol, side.lower()))
+        if not ids:
+            return False
+        if max_age is None:
+            return True
+        cutoff = (time.time() - max_age) * 1000
+        with self._lock:
+            return any(self._orders[order_id].timestamp >= cutoff for order_id in ids)
+
+    def open_orders(self, symbol=None, side=None):
+        with self._lock:
+            if symbol is not None and side is not None:
+                ids = self._open.get((symbol, side.lower()), ())
+            else:
+                ids = [order_id for (s, d), group in self._open.items()
+                       if (symbol is None or s == symbol) and (side is None or d == side.lower())
+                       for order_id in group]
+            return [self._orders[order_id] for order_id in ids]
+
+    def by_symbol(self, symbol):
+        self._sweep()
+        with self._lock:
+            return [self._orders[order_id] for order_id in self._by_symbol.get(symbol, ())]
+
+    def by_status(self, status):
+        self._sweep()
+        with self._lock:
+            return [self._orders[order_id] for order_id in self._by_status.get(status.lower(), ())]
+
+    def evict(self, now=None):
+        """Drop expired terminal orders, then the oldest ones beyond max_size. Returns the count."""
+        now = now or time.time()
+        evicted = 0
+        with self._lock:
+            while self._terminal:
+                order_id, finished_at = next(iter(self._terminal.items()))
+                if now - finished_at < self.terminal_ttl:
+                    break
+                self.remove(order_id)
+                evicted += 1
+            while self.max_size and len(self._orders) > self.max_size:
+                order_id = next(iter(self._terminal)) if self._terminal else next(iter(self._orders))
+                self.remove(order_id)
+                evicted += 1
+        return evicted
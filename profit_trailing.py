@@ -1,43 +1,102 @@
 import time
+import json
+import queue
 import logging
 import threading
-from exchange import DeltaExchangeClient
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from exchange import get_client
+from account_snapshot import get_account_snapshot, position_size
 import config
 import binance_ws  # Live price updates via WS
 from trade_manager import TradeManager
+from order_manager import make_bracket_params
+from trailing_engine import TrailingStopEngine, TriggerIndex, RULE_DYNAMIC, RULE_PARTIAL, RULE_NAMES
+from write_behind import RedisHash, get_write_behind
 from notifier import send_email
 from signal_state import set_last_sl_closed_side  # <-- Added for SL state tracking
 
 logger = logging.getLogger(__name__)
 
+TRAILING_STOPS_KEY = "trailing_stops"
+
+# The ProfitTrailing whose track() loop runs in this process, if any.
+_tracker = None
+
+
+def is_tighter(stop, existing, size):
+    """True if stop is tighter than existing (None: no stop yet) for a position of this size."""
+    return existing is None or (stop > existing if size > 0 else stop < existing)
+
+
+def lock_trailing_stop(order_id, stop, size):
+    """
+    Tighten one position's trailing stop to stop (raise it for a long, lower it for a
+    short); a looser stop is ignored. With a tracker running in this process the lock is
+    handed to it and applied on its next loop (within check_interval); otherwise only the
+    persisted stop is updated, for the next tracker to load. Returns False if the current
+    stop is already tighter.
+    """
+    tracker = _tracker
+    if tracker is not None:
+        if not is_tighter(stop, tracker.position_trailing_stop.get(order_id), size):
+            return False
+        tracker.lock_stop(order_id, stop, size)
+        return True
+    writer = get_write_behind()
+    try:
+        writer.flush()  # So the read below sees stops still queued in the write-behind.
+    except Exception as e:
+        logger.warning("Could not flush pending Redis writes before locking a stop: %s", e)
+    existing = writer.redis_client.hget(TRAILING_STOPS_KEY, json.dumps(order_id))
+    existing = json.loads(existing) if existing is not None else None
+    if not is_tighter(stop, existing, size):
+        return False
+    RedisHash(writer, TRAILING_STOPS_KEY)[order_id] = stop
+    return True
+
+
 class ProfitTrailing:
-    def __init__(self, check_interval):
-        self.client = DeltaExchangeClient()
+    def __init__(self, check_interval, max_evaluations_per_second=None):
+        self.client = get_client()
         self.trade_manager = TradeManager()
+        self.snapshot = get_account_snapshot(self.client)
+        # Stops are re-evaluated on every tick; check_interval is the idle re-check when no tick arrives.
         self.check_interval = check_interval
-        self.position_trailing_stop = {}
+        if max_evaluations_per_second is None:
+            max_evaluations_per_second = config.PROFIT_TRAILING_MAX_EVALS_PER_SEC
+        self.min_evaluation_interval = 1.0 / max_evaluations_per_second if max_evaluations_per_second else 0
+        # Ratcheted stops survive a restart: mirrored to Redis write-behind, read back in one call.
+        self.position_trailing_stop = RedisHash.load(get_write_behind(), TRAILING_STOPS_KEY)
         self.last_had_positions = True
         self.last_position_fetch_time = 0
         self.position_fetch_interval = 5
         self.cached_positions = []
         self.last_error_email_sent = 0
         self.last_display = {}
+        self.engine = TrailingStopEngine()
+        # A tick only re-evaluates positions whose next price boundary it crossed.
+        self.triggers = TriggerIndex(self.engine)
+        # Positions are re-read when the snapshot reports a change, not on every tick.
+        self._positions_changed = threading.Event()
+        self.snapshot.add_listener(self._on_snapshot_event)
+        # Positions whose stops trigger on the same tick are closed concurrently.
+        self._executor = ThreadPoolExecutor(max_workers=config.EXECUTION_MAX_CONCURRENT_CLOSES,
+                                            thread_name_prefix="BookProfit")
+        # Partial-booking bracket updates: latest stop waiting to be sent, last stop/time sent and
+        # positions with an update in flight, per order id. Sent from the executor, not this thread.
+        self.bracket_min_interval = config.BRACKET_UPDATE_MIN_INTERVAL
+        self._tick_size = None
+        self._pending_brackets = {}
+        self._sent_brackets = {}
+        self._brackets_in_flight = set()
+        # Stop locks from other threads (TP signals), applied by the tracker loop.
+        self._stop_locks = queue.Queue()
 
     def fetch_open_positions(self):
         try:
-            positions = self.client.fetch_positions()
-            open_positions = []
-            for pos in positions:
-                size = pos.get('size') or pos.get('contracts') or 0
-                try:
-                    size = float(size)
-                except Exception:
-                    size = 0.0
-                if size != 0:
-                    pos_symbol = (pos.get('info', {}).get('product_symbol') or pos.get('symbol'))
-                    if pos_symbol and "BTCUSD" in pos_symbol:
-                        open_positions.append(pos)
-            return open_positions
+            positions = self.snapshot.get_positions("BTCUSD", max_age=self.position_fetch_interval)
+            return [pos for pos in positions if position_size(pos) != 0]
         except Exception as e:
             logger.error("Error fetching open positions: %s", e)
             if "ip_not_whitelisted" in str(e):
@@ -59,165 +118,141 @@ class ProfitTrailing:
                     self.last_error_email_sent = time.time()
             return []
 
-    def compute_profit_pct(self, pos, live_price):
-        entry = pos.get('entryPrice') or pos.get('entry_price') or pos.get('info', {}).get('entry_price')
-        try:
-            entry = float(entry)
-        except Exception:
-            return None
-        size = pos.get('size') or pos.get('contracts') or 0
-        try:
-            size = float(size)
-        except Exception:
-            size = 0.0
-        return (live_price - entry) / entry if size > 0 else (entry - live_price) / entry
-
-    def get_trailing_config(self, profit_pct):
-        conf = config.PROFIT_TRAILING_CONFIG
-        if profit_pct < conf["start_trailing_profit_pct"]:
-            return None
-        applicable = None
-        for level in conf["levels"]:
-            if profit_pct >= level["min_profit_pct"]:
-                applicable = level
-        return applicable
+    def _on_snapshot_event(self, kind, event, key, old, new):
+        if kind == "position":
+            self._positions_changed.set()
 
-    def update_trailing_stop(self, pos, live_price):
+    def _close_position(self, pos, size, reason):
         order_id = pos.get('id')
-        entry = pos.get('entryPrice') or pos.get('entry_price') or pos.get('info', {}).get('entry_price')
-        try:
-            entry = float(entry)
-        except Exception:
-            return None, None, None
-
-        size = pos.get('size') or pos.get('contracts') or 0
-        try:
-            size = float(size)
-        except Exception:
-            size = 0.0
-
-        profit_pct = self.compute_profit_pct(pos, live_price)
-        if profit_pct is None:
-            return None, None, None
-
-        conf = config.PROFIT_TRAILING_CONFIG
-        fixed_sl = conf["fixed_stop_loss_pct"]
-
-        existing_display = self.last_display.get(order_id)
-        existing_rule = existing_display["rule"] if existing_display else "fixed_stop"
-
-        rule = "fixed_stop"
-        level_conf = None
-        if profit_pct >= conf["start_trailing_profit_pct"]:
-            level_conf = self.get_trailing_config(profit_pct)
-            if existing_rule in ["dynamic", "partial_booking"]:
-                rule = existing_rule
-            elif level_conf and level_conf.get("trailing_stop_offset") is not None:
-                rule = "dynamic"
-            elif level_conf:
-                rule = "partial_booking"
-
-        if rule == "fixed_stop":
-            new_trailing = entry * (1 - fixed_sl) if size > 0 else entry * (1 + fixed_sl)
-        elif rule == "dynamic" and level_conf:
-            new_trailing = entry * (1 + level_conf["trailing_stop_offset"]) if size > 0 else entry * (1 - level_conf["trailing_stop_offset"])
-        elif rule == "partial_booking" and level_conf:
-            book_fraction = level_conf.get("book_fraction", 1.0)
-            new_trailing = entry * (1 + profit_pct * book_fraction) if size > 0 else entry * (1 - profit_pct * book_fraction)
+        if size > 0:
+            close_order = self.trade_manager.place_market_order("BTCUSD", "sell", size, params={"time_in_force": "ioc"})
+            set_last_sl_closed_side("buy")
+            logger.info("%s triggered for long order %s. Booking profit. Close order: %s", reason, order_id, close_order)
         else:
-            new_trailing = entry * (1 - fixed_sl) if size > 0 else entry * (1 + fixed_sl)
-
-        stored_trailing = self.position_trailing_stop.get(order_id)
-        if stored_trailing is not None:
-            new_trailing = max(stored_trailing, new_trailing) if size > 0 else min(stored_trailing, new_trailing)
-
-        self.position_trailing_stop[order_id] = new_trailing
-        return new_trailing, profit_pct, rule
+            close_order = self.trade_manager.place_market_order("BTCUSD", "buy", abs(size), params={"time_in_force": "ioc"})
+            set_last_sl_closed_side("sell")
+            logger.info("%s triggered for short order %s. Booking profit. Close order: %s", reason, order_id, close_order)
 
-    def compute_raw_profit(self, pos, live_price):
-        entry = pos.get('entryPrice') or pos.get('entry_price') or pos.get('info', {}).get('entry_price')
-        try:
-            entry = float(entry)
-        except Exception:
-            return None
-        size = pos.get('size') or pos.get('contracts') or 0
-        try:
-            size = float(size)
-        except Exception:
-            size = 0.0
-        return (live_price - entry) * size if size > 0 else (entry - live_price) * abs(size)
+    def tick_size(self):
+        if self._tick_size is None:
+            try:
+                self._tick_size = self.client.get_tick_size("BTCUSD")
+            except Exception as e:
+                logger.warning("BTCUSD tick size unavailable (%s); using %s.", e, config.BRACKET_DEFAULT_TICK_SIZE)
+                self._tick_size = config.BRACKET_DEFAULT_TICK_SIZE
+        return self._tick_size
 
-    def book_profit(self, pos, live_price):
+    def _update_bracket(self, pos, trailing_stop):
         order_id = pos.get('id')
-        size = pos.get('size') or pos.get('contracts') or 0
         try:
-            size = float(size)
-        except Exception:
-            size = 0.0
+            bracket_params = make_bracket_params(stop_loss=trailing_stop)
+            updated_order = self.trade_manager.order_manager.attach_bracket_to_order(
+                order_id=order_id,
+                product_id=self.client.get_product_id("BTCUSD"),
+                product_symbol="BTCUSD",
+                bracket_params=bracket_params
+            )
+            logger.info("Bracket order updated for partial booking: %s", updated_order)
+        except Exception as e:
+            logger.error("Error updating bracket order for partial booking: %s", e)
+            # Not on the exchange: forget it so the stop is sent again (unless a newer one is queued).
+            self._sent_brackets[order_id] = (None, self._sent_brackets.get(order_id, (None, 0))[1])
+            self._pending_brackets.setdefault(order_id, (pos, trailing_stop))
+        finally:
+            self._brackets_in_flight.discard(order_id)
+
+    def queue_bracket_update(self, pos, trailing_stop):
+        """Queue a raised partial-booking stop; flush_bracket_updates decides when it is sent."""
+        self._pending_brackets[pos.get('id')] = (pos, trailing_stop)
 
-        trailing_stop, profit_pct, rule = self.update_trailing_stop(pos, live_price)
+    def flush_bracket_updates(self, now=None):
+        """
+        Send queued partial-booking stops that moved at least one tick from the last stop sent,
+        at most once per bracket_min_interval per position and one request in flight per position.
+        Stops held back by the interval stay queued for a later call.
+        """
+        now = time.time() if now is None else now
+        tick = self.tick_size()
+        for order_id, (pos, trailing_stop) in list(self._pending_brackets.items()):
+            sent_stop, sent_time = self._sent_brackets.get(order_id, (None, 0))
+            if sent_stop is not None and abs(trailing_stop - sent_stop) < tick:
+                self._pending_brackets.pop(order_id, None)
+                continue
+            if order_id in self._brackets_in_flight or now - sent_time < self.bracket_min_interval:
+                continue
+            self._pending_brackets.pop(order_id, None)
+            self._sent_brackets[order_id] = (trailing_stop, now)
+            self._brackets_in_flight.add(order_id)
+            self._executor.submit(self._update_bracket, pos, trailing_stop)
+
+    def _forget_brackets(self, open_ids):
+        for order_id in set(self._sent_brackets) - open_ids:
+            del self._sent_brackets[order_id]
+        for order_id in set(self._pending_brackets) - open_ids:
+            self._pending_brackets.pop(order_id, None)
 
-        if rule == "dynamic":
-            if size > 0 and live_price < trailing_stop:
-                close_order = self.trade_manager.place_market_order("BTCUSD", "sell", size, params={"time_in_force": "ioc"})
-                set_last_sl_closed_side("buy")
-                logger.info("Trailing stop triggered for long order %s. Booking full profit. Close order: %s", order_id, close_order)
-                return True
-            elif size < 0 and live_price > trailing_stop:
-                close_order = self.trade_manager.place_market_order("BTCUSD", "buy", abs(size), params={"time_in_force": "ioc"})
-                set_last_sl_closed_side("sell")
-                logger.info("Trailing stop triggered for short order %s. Booking full profit. Close order: %s", order_id, close_order)
-                return True
-        elif rule == "partial_booking":
+    def lock_stop(self, order_id, stop, size):
+        """Queue a stop lock for the tracker loop; safe to call from any thread."""
+        self._stop_locks.put((order_id, stop, size))
+
+    def apply_stop_locks(self):
+        """Apply queued stop locks to the engine (positions it holds) or the persisted stops."""
+        while True:
             try:
-                bracket_params = {
-                    "bracket_stop_loss_limit_price": str(trailing_stop),
-                    "bracket_stop_loss_price": str(trailing_stop),
-                    "bracket_stop_trigger_method": "last_traded_price"
-                }
-                updated_order = self.trade_manager.order_manager.attach_bracket_to_order(
-                    order_id=order_id,
-                    product_id=27,
-                    product_symbol="BTCUSD",
-                    bracket_params=bracket_params
-                )
-                logger.info("Bracket order updated for partial booking: %s", updated_order)
-            except Exception as e:
-                logger.error("Error updating bracket order for partial booking: %s", e)
+                order_id, stop, size = self._stop_locks.get_nowait()
+            except queue.Empty:
+                return
+            i = self.triggers.lock_stop(order_id, stop)
+            if i is not None:
+                self.position_trailing_stop[order_id] = stop
+                logger.info("Trailing SL for order %s locked at %.2f.", order_id, stop)
+                if self.engine.rule[i] == RULE_PARTIAL:
+                    self.queue_bracket_update(self.engine.positions[i], stop)
+            elif order_id not in self.engine.ids and is_tighter(stop, self.position_trailing_stop.get(order_id), size):
+                # Not loaded yet: engine.sync picks the stop up when the position arrives.
+                self.position_trailing_stop[order_id] = stop
+                logger.info("Trailing SL for order %s locked at %.2f (position not loaded yet).", order_id, stop)
+
+    def book_profit(self, pos, size, trailing_stop, rule):
+        """
+        Act on one evaluated position: close it when its stop was crossed (rule is
+        fixed_stop or dynamic), or queue a bracket update to a raised trailing_stop
+        (partial_booking).
+        Returns True if the position was closed.
+        """
+        if rule == RULE_PARTIAL:
+            self.queue_bracket_update(pos, trailing_stop)
             return False
-        elif rule == "fixed_stop":
-            if size > 0 and live_price < trailing_stop:
-                close_order = self.trade_manager.place_market_order("BTCUSD", "sell", size, params={"time_in_force": "ioc"})
-                set_last_sl_closed_side("buy")
-                logger.info("Fixed stop triggered for long order %s. Booking profit. Close order: %s", order_id, close_order)
-                return True
-            elif size < 0 and live_price > trailing_stop:
-                close_order = self.trade_manager.place_market_order("BTCUSD", "buy", abs(size), params={"time_in_force": "ioc"})
-                set_last_sl_closed_side("sell")
-                logger.info("Fixed stop triggered for short order %s. Booking profit. Close order: %s", order_id, close_order)
-                return True
-        return False
+        self._close_position(pos, size, "Trailing stop" if rule == RULE_DYNAMIC else "Fixed stop")
+        return True
 
     def track(self):
+        global _tracker
+        _tracker = self
         binance_ws.run_in_thread()
-        wait_time = 0
-        while binance_ws.current_price is None and wait_time < 30:
-            logger.info("Waiting for live price update...")
-            time.sleep(2)
-            wait_time += 2
+        logger.info("Waiting for live price update...")
+        last_seq, _ = binance_ws.wait_for_price(0, timeout=30)
         if binance_ws.current_price is None:
             logger.warning("Live price still not available. Exiting Profit Trailing Tracker.")
             return
 
         while True:
+            # Wake on the next tick (or after check_interval when the feed is quiet).
+            last_seq, live_price = binance_ws.wait_for_price(last_seq, timeout=self.check_interval)
             current_time = time.time()
-            if current_time - self.last_position_fetch_time >= self.position_fetch_interval:
+            # Re-read positions when the snapshot reports a change (pushed or polled) and at least every
+            # position_fetch_interval; in between the engine and trigger index keep their state.
+            if self._positions_changed.is_set() or current_time - self.last_position_fetch_time >= self.position_fetch_interval:
+                self._positions_changed.clear()
                 self.cached_positions = self.fetch_open_positions()
                 self.last_position_fetch_time = current_time
+                self.engine.sync(self.cached_positions, self.position_trailing_stop)
+                self.triggers.rebuild()
+                self._forget_brackets({pos.get('id') for pos in self.cached_positions})
                 if not self.cached_positions:
                     self.position_trailing_stop.clear()
+            self.apply_stop_locks()
 
-            live_price = binance_ws.current_price
             if live_price is None:
                 continue
 
@@ -233,36 +268,32 @@ class ProfitTrailing:
                     logger.info("Positions found. Profit trailing resumed.")
                     self.last_had_positions = True
 
-                for pos in open_positions:
-                    order_id = pos.get('id')
-                    size = pos.get('size') or pos.get('contracts') or 0
-                    try:
-                        size = float(size)
-                    except Exception:
-                        size = 0.0
-                    if size == 0:
-                        continue
-                    entry = pos.get('entryPrice') or pos.get('entry_price') or pos.get('info', {}).get('entry_price')
-                    try:
-                        entry_val = float(entry)
-                    except Exception:
-                        entry_val = None
-                    profit_pct = self.compute_profit_pct(pos, live_price)
-                    profit_display = profit_pct * 100 if profit_pct is not None else None
-                    raw_profit = self.compute_raw_profit(pos, live_price)
-                    profit_usd = raw_profit / 1000 if raw_profit is not None else None
-                    profit_inr = profit_usd * 85 if profit_usd is not None else None
-
-                    trailing_stop, max_profit_pct, rule = self.update_trailing_stop(pos, live_price)
+                # Evaluate only the positions whose stop, level or partial-booking boundary the price
+                # crossed (all of them after a resync); only changed stops are persisted.
+                result = self.triggers.evaluate(live_price)
+                visited = result.index.tolist()
+                ids = [self.engine.ids[i] for i in visited]
+                stops, rules = result.stop.tolist(), result.rule.tolist()
+                for order_id, trailing_stop, changed in zip(ids, stops, result.stop_changed.tolist()):
+                    if changed:
+                        self.position_trailing_stop[order_id] = trailing_stop
 
+                entries = self.engine.entry[result.index].tolist()
+                profits, raw_profits = result.profit_pct.tolist(), result.raw_profit.tolist()
+                for order_id, entry_val, profit_pct, raw_profit, trailing_stop, rule_code in zip(
+                        ids, entries, profits, raw_profits, stops, rules):
+                    profit_display = profit_pct * 100
+                    profit_usd = raw_profit / 1000
+                    profit_inr = profit_usd * 85
+                    rule = RULE_NAMES[rule_code]
                     display = {
                         "entry": entry_val,
                         "live": live_price,
-                        "profit": round(profit_display or 0, 2),
-                        "usd": round(profit_usd or 0, 2),
-                        "inr": round(profit_inr or 0, 2),
+                        "profit": round(profit_display, 2),
+                        "usd": round(profit_usd, 2),
+                        "inr": round(profit_inr, 2),
                         "rule": rule,
-                        "sl": round(trailing_stop or 0, 2)
+                        "sl": round(trailing_stop, 2)
                     }
 
                     if self.last_display.get(order_id) != display:
@@ -273,10 +304,25 @@ class ProfitTrailing:
                         )
                         self.last_display[order_id] = display
 
-                    if self.book_profit(pos, live_price):
-                        logger.info(f"Profit booked for order {order_id}.")
+                # Raised partial-booking stops are queued; flush_bracket_updates rate-limits sending them.
+                for j in np.flatnonzero(result.partial & result.stop_changed):
+                    self.queue_bracket_update(self.engine.positions[visited[j]], stops[j])
+                to_book = [(self.engine.positions[visited[j]], float(self.engine.size[visited[j]]), stops[j], rules[j])
+                           for j in np.flatnonzero(result.close)]
+                if len(to_book) == 1:
+                    booked = [self.book_profit(*to_book[0])]
+                else:
+                    booked = list(self._executor.map(lambda args: self.book_profit(*args), to_book))
+                for (pos, _, _, _), done in zip(to_book, booked):
+                    if done:
+                        logger.info(f"Profit booked for order {pos.get('id')}.")
+            if self._pending_brackets:
+                self.flush_bracket_updates(current_time)
 
-            time.sleep(self.check_interval)
+            # Coalesce bursts: ticks arriving during this pause collapse into the latest one.
+            remaining = self.min_evaluation_interval - (time.time() - current_time)
+            if remaining > 0:
+                time.sleep(remaining)
 
 if __name__ == '__main__':
     pt = ProfitTrailing(check_interval=1)
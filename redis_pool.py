@@ -0,0 +1,190 @@
+import logging
+import threading
+import time
+import redis
+import config
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Return the process-wide Redis connection pool built from config. It is bounded:
+    callers wait up to REDIS_POOL_TIMEOUT for a free connection instead of opening more.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = redis.BlockingConnectionPool(
+                host=config.REDIS_HOST,
+                port=config.REDIS_PORT,
+                db=config.REDIS_DB,
+                max_connections=config.REDIS_MAX_CONNECTIONS,
+                timeout=config.REDIS_POOL_TIMEOUT,
+                health_check_interval=30
+            )
+        return _pool
+
+
+def get_redis():
+    """A Redis client on the shared pool (cheap; clients hold no connection of their own)."""
+    return redis.Redis(connection_pool=get_pool())
+
+
+class ClientSideCache:
+    """
+    Local copies of a few hot, small keys, invalidated through Redis keyspace
+    notifications. A background thread subscribes to the keys' notification
+    channels; any write, delete or expiry drops the local copy. Values are only
+    cached while that subscription is up, so a lost connection falls back to
+    reading Redis until it is re-established.
+
+    Needs notify-keyspace-events with K, g, $ and x (start() adds them when the
+    server allows CONFIG SET; otherwise the cache stays disabled).
+    """
+
+    REQUIRED_EVENTS = "Kg$x"
+
+    def __init__(self, redis_client, keys, db=None, retry_delay=1.0):
+        self.redis_client = redis_client
+        self.keys = set(keys)
+        self.db = config.REDIS_DB if db is None else db
+        self.retry_delay = retry_delay
+        self.hits = 0
+        self.misses = 0
+        self._values = {}
+        self._generations = dict.fromkeys(self.keys, 0)
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _channel(self, key):
+        return f"__keyspace@{self.db}__:{key}"
+
+    def _enable_notifications(self):
+        current = self.redis_client.config_get("notify-keyspace-events").get("notify-keyspace-events", "")
+        if isinstance(current, bytes):
+            current = current.decode()
+        if "A" in current:
+            current = current.replace("A", "g$lshzxet")
+        missing = "".join(flag for flag in self.REQUIRED_EVENTS if flag not in current)
+        if missing:
+            self.redis_client.config_set("notify-keyspace-events", current + missing)
+            logger.info("Enabled Redis keyspace notifications (%s).", current + missing)
+
+    def start(self):
+        """Start the invalidation listener; returns False if notifications cannot be enabled."""
+        try:
+            self._enable_notifications()
+        except Exception as e:
+            logger.warning("Redis client-side cache disabled (keyspace notifications unavailable): %s", e)
+            return False
+        self._thread = threading.Thread(target=self._listen, name="RedisCacheInvalidation", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop_event.set()
+
+    def invalidate(self, key=None):
+        with self._lock:
+            keys = [key] if key is not None else list(self._values)
+            for k in keys:
+                self._values.pop(k, None)
+                self._generations[k] = self._generations.get(k, 0) + 1
+
+    def _listen(self):
+        channels = {self._channel(key): key for key in self.keys}
+        while not self._stop_event.is_set():
+            pubsub = self.redis_client.pubsub()
+            try:
+                pubsub.subscribe(*channels)
+                while not self._stop_event.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    channel = message["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    if message["type"] == "subscribe":
+                        if message["data"] == len(channels):
+                            self._ready.set()
+                    elif message["type"] == "message" and channel in channels:
+                        self.invalidate(channels[channel])
+            except Exception as e:
+                logger.error("Redis cache invalidation listener error: %s", e)
+            finally:
+                # Writes may be missed while unsubscribed: stop serving local copies.
+                self._ready.clear()
+                self.invalidate()
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            self._stop_event.wait(self.retry_delay)
+
+    def get(self, key):
+        if key not in self.keys or not self._ready.is_set():
+            return self.redis_client.get(key)
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                return self._values[key]
+            generation = self._generations[key]
+        self.misses += 1
+        value = self.redis_client.get(key)
+        with self._lock:
+            # Keep it only if no invalidation arrived while the read was in flight.
+            if generation == self._generations[key] and self._ready.is_set():
+                self._values[key] = value
+        return value
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+
+_cache = None
+_cache_started = False
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Return the process-wide ClientSideCache for REDIS_CACHED_KEYS, or None when
+    REDIS_CLIENT_CACHE is off or the server does not allow keyspace notifications.
+    """
+    global _cache, _cache_started
+    with _cache_lock:
+        if not _cache_started:
+            _cache_started = True
+            if config.REDIS_CLIENT_CACHE:
+                cache = ClientSideCache(get_redis(), config.REDIS_CACHED_KEYS)
+                if cache.start():
+                    _cache = cache
+        return _cache
+
+
+def cached_get(key, redis_client=None):
+    """GET through the client-side cache when it holds key, else straight from Redis."""
+    cache = get_cache()
+    if cache is not None and key in cache.keys:
+        return cache.get(key)
+    return (redis_client or get_redis()).get(key)
+
+
+if __name__ == "__main__":
+    client = get_redis()
+    client.set("last_sl_closed_side", "buy")
+    cache = get_cache()
+    if cache is not None:
+        cache.wait_ready(5)
+    for _ in range(3):
+        start = time.perf_counter()
+        value = cached_get("last_sl_closed_side")
+        print(f"last_sl_closed_side={value!r} in {(time.perf_counter() - start) * 1e6:.0f} us")
+    if cache is not None:
+        print("hits:", cache.hits, "misses:", cache.misses)
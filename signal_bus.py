@@ -0,0 +1,120 @@
+import json
+import logging
+import socket
+import time
+import config
+
+logger = logging.getLogger(__name__)
+
+# INCR and XADD in one server-side step, so stream order always matches seq order
+# even with several publishers (the consumer drops any seq not above the last one).
+PUBLISH_SCRIPT = """
+local seq = redis.call('INCR', KEYS[2])
+redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[2], '*', 'seq', seq, 'data', ARGV[1])
+return seq
+"""
+
+
+def publish_signal(redis_client, signal_data, stream=None):
+    """
+    Append a signal to the Redis Stream with a monotonically increasing sequence id.
+    Returns the sequence id.
+    """
+    stream = stream or config.SIGNAL_STREAM
+    return redis_client.eval(PUBLISH_SCRIPT, 2, stream, f"{stream}:seq",
+                             json.dumps(signal_data), config.SIGNAL_STREAM_MAXLEN)
+
+
+class SignalStreamConsumer:
+    """
+    Blocking consumer-group reader for the signal stream.
+
+    Each entry is handed to the callback once: entries left pending by a crashed
+    consumer are replayed on start, and the last processed sequence id is stored
+    together with the XACK so a replayed entry that was already handled is skipped.
+    """
+
+    def __init__(self, redis_client, stream=None, group=None, consumer=None, block_ms=None):
+        self.redis_client = redis_client
+        self.stream = stream or config.SIGNAL_STREAM
+        self.group = group or config.SIGNAL_STREAM_GROUP
+        # A stable consumer name lets a restarted process pick up its own pending entries.
+        self.consumer = consumer or config.SIGNAL_STREAM_CONSUMER or socket.gethostname()
+        self.block_ms = block_ms or config.SIGNAL_STREAM_BLOCK_MS
+        self.last_seq_key = f"{self.stream}:{self.group}:last_seq"
+
+    def ensure_group(self):
+        try:
+            # Start from new entries only; older signals are already stale.
+            self.redis_client.xgroup_create(self.stream, self.group, id="$", mkstream=True)
+            logger.info("Created consumer group '%s' on stream '%s'.", self.group, self.stream)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def last_processed_seq(self):
+        value = self.redis_client.get(self.last_seq_key)
+        return int(value) if value else 0
+
+    def _handle(self, entry_id, fields, callback):
+        seq = int(fields.get(b"seq") or fields.get("seq") or 0)
+        raw = fields.get(b"data") or fields.get("data")
+        if seq and seq <= self.last_processed_seq():
+            logger.info("Signal seq %s already processed. Acknowledging duplicate.", seq)
+            self.redis_client.xack(self.stream, self.group, entry_id)
+            return
+        try:
+            signal_data = json.loads(raw) if raw else None
+        except Exception as e:
+            logger.error("Invalid signal payload in stream entry %s: %s", entry_id, e)
+            signal_data = None
+        if signal_data is not None:
+            callback(signal_data, seq)
+        pipe = self.redis_client.pipeline(transaction=True)
+        if seq:
+            pipe.set(self.last_seq_key, seq)
+        pipe.xack(self.stream, self.group, entry_id)
+        pipe.execute()
+
+    def _read(self, start_id, block):
+        response = self.redis_client.xreadgroup(
+            self.group, self.consumer, {self.stream: start_id}, count=10, block=block
+        )
+        entries = []
+        for _, stream_entries in response or []:
+            entries.extend(stream_entries)
+        return entries
+
+    def replay_pending(self, callback):
+        """
+        Hand over everything delivered to this consumer but never acknowledged, page
+        by page until the pending list is drained. Returns the number of entries.
+        """
+        start_id, replayed = "0", 0
+        while True:
+            pending = self._read(start_id, None)
+            if not pending:
+                break
+            for entry_id, fields in pending:
+                if fields:
+                    self._handle(entry_id, fields, callback)
+                else:
+                    # Trimmed from the stream while pending: nothing left to replay.
+                    self.redis_client.xack(self.stream, self.group, entry_id)
+                start_id = entry_id
+            replayed += len(pending)
+        if replayed:
+            logger.info("Replayed %d pending signal(s) from stream '%s'.", replayed, self.stream)
+        return replayed
+
+    def run(self, callback):
+        self.ensure_group()
+        self.replay_pending(callback)
+        logger.info("Waiting for signals on stream '%s' (group '%s').", self.stream, self.group)
+        while True:
+            try:
+                for entry_id, fields in self._read(">", self.block_ms):
+                    self._handle(entry_id, fields, callback)
+            except Exception as e:
+                logger.error("Error reading signal stream: %s", e)
+                time.sleep(1)
@@ -1,9 +1,11 @@
 import time
 import json
-import redis
 import logging
-from order_manager import OrderManager
+from order_manager import OrderManager, make_client_order_id, signal_key
 from trade_manager import TradeManager
+from account_snapshot import position_size
+from signal_bus import SignalStreamConsumer
+from redis_pool import get_redis, cached_get
 import config
 import binance_ws  # Added for live price
 from signal_state import get_last_sl_closed_side, clear_last_sl_closed_side  # Added for SL state control
@@ -15,7 +17,7 @@ last_closed_side = None
 
 def fetch_signal_from_redis(redis_client, key='signal'):
     try:
-        data = redis_client.get(key)
+        data = cached_get(key, redis_client)
         if not data:
             return None
         return json.loads(data)
@@ -30,53 +32,48 @@ def adjust_price(price, offset):
         return price
 
 def cancel_conflicting_pending_orders_api(order_manager, symbol, new_side):
+    """Returns the ids of the orders canceled."""
+    if new_side is None:
+        logger.info("No side in signal; leaving pending orders for %s in place.", symbol)
+        return []
+    # "" cancels every pending order; otherwise only the opposite side.
+    side = None if new_side == "" else ("sell" if new_side.lower() == "buy" else "buy")
     try:
-        orders = order_manager.client.exchange.fetch_open_orders(symbol)
-        if not orders:
+        canceled = order_manager.cancel_open_orders(symbol, side)
+        if canceled:
+            logger.info("Canceled pending orders: %s", canceled)
+        else:
             logger.info("No pending orders found via API for %s", symbol)
-            return
-        for order in orders:
-            if order.get('status', '').lower() != 'open':
-                continue
-            order_side = order.get('side', '').lower()
-            if new_side == "" or order_side != new_side.lower():
-                try:
-                    order_manager.client.cancel_order(order['id'], symbol)
-                    logger.info("Canceled pending order: %s", order['id'])
-                except Exception as e:
-                    logger.error("Error canceling order %s: %s", order['id'], e)
+        return canceled
     except Exception as e:
-        logger.error("Error fetching pending orders via API: %s", e)
+        logger.error("Error canceling pending orders for %s: %s", symbol, e)
+        return []
 
 def cancel_same_side_pending_orders(order_manager, symbol, side):
+    """Returns the ids of the orders canceled."""
     try:
-        pending_orders = order_manager.client.exchange.fetch_open_orders(symbol)
-        for order in pending_orders:
-            if order.get('side', '').lower() == side.lower() and order.get('status', '').lower() == 'open':
-                try:
-                    order_manager.client.cancel_order(order['id'], symbol)
-                    logger.info("Canceled same-side pending order: %s", order['id'])
-                except Exception as e:
-                    logger.error("Error canceling same-side order %s: %s", order['id'], e)
+        canceled = order_manager.cancel_open_orders(symbol, side)
+        if canceled:
+            logger.info("Canceled same-side pending orders: %s", canceled)
+        return canceled
     except Exception as e:
-        logger.error("Error fetching pending orders for same-side cancellation: %s", e)
+        logger.error("Error canceling same-side pending orders for %s: %s", symbol, e)
+        return []
 
 def open_pending_order_exists(order_manager, symbol, side):
     try:
-        orders = order_manager.client.exchange.fetch_open_orders(symbol)
-        for order in orders:
-            if order.get('side', '').lower() == side.lower() and order.get('status', '').lower() == 'open':
-                return True
-        return False
+        return order_manager.snapshot.has_open_order(symbol, side)
     except Exception as e:
         logger.error("Error checking for pending orders: %s", e)
         return False
 
-def process_signal(signal_data, order_manager, trade_manager):
+def process_signal(signal_data, order_manager, trade_manager, seq=None, nonce=None):
     global last_executed_side, last_closed_side
 
     if not signal_data:
         return None
+    # Orders from this signal get client order ids derived from it, so a replay cannot duplicate them.
+    key = signal_key(signal_data, seq, nonce)
 
     last_signal = signal_data.get("last_signal", {})
     supply_zone = signal_data.get("supply_zone", {})
@@ -99,29 +96,23 @@ def process_signal(signal_data, order_manager, trade_manager):
     if "take profit" in signal_text or "tp" in signal_text:
         logger.info("Take profit signal detected. Locking 50%% of profit and enabling trailing.")
         try:
-            positions = order_manager.client.fetch_positions()
-            for pos in positions:
-                pos_symbol = pos.get('info', {}).get('product_symbol') or pos.get('symbol')
-                if pos_symbol and "BTCUSD" in pos_symbol:
-                    entry = float(pos.get('entryPrice') or pos.get('entry_price') or pos.get('info', {}).get('entry_price'))
-                    size = float(pos.get('size') or pos.get('contracts') or 0)
-                    if size == 0:
-                        continue
-                    live_price = binance_ws.current_price
-                    if live_price is None:
-                        continue
-                    profit = (live_price - entry) if size > 0 else (entry - live_price)
-                    lock_price = entry + profit * 0.5 if size > 0 else entry - profit * 0.5
-
-                    from profit_trailing import ProfitTrailing
-                    pt = ProfitTrailing(check_interval=1)
-                    existing = pt.position_trailing_stop.get(pos.get('id'))
-                    if existing is None or (size > 0 and lock_price > existing) or (size < 0 and lock_price < existing):
-                        pt.position_trailing_stop[pos.get('id')] = lock_price
-                        logger.info("Updated trailing SL to tighter level: %.2f", lock_price)
-                    else:
-                        logger.info("Existing trailing SL is tighter. No update made.")
-                    logger.info("Locked trailing SL at 50%% profit level: %.2f", lock_price)
+            for pos in order_manager.snapshot.get_positions("BTCUSD"):
+                entry = float(pos.get('entryPrice') or pos.get('entry_price') or pos.get('info', {}).get('entry_price'))
+                size = position_size(pos)
+                if size == 0:
+                    continue
+                live_price = binance_ws.current_price
+                if live_price is None:
+                    continue
+                profit = (live_price - entry) if size > 0 else (entry - live_price)
+                lock_price = entry + profit * 0.5 if size > 0 else entry - profit * 0.5
+
+                from profit_trailing import lock_trailing_stop
+                if lock_trailing_stop(pos.get('id'), lock_price, size):
+                    logger.info("Updated trailing SL to tighter level: %.2f", lock_price)
+                else:
+                    logger.info("Existing trailing SL is tighter. No update made.")
+                logger.info("Locked trailing SL at 50%% profit level: %.2f", lock_price)
         except Exception as e:
             logger.error("Error setting trailing SL from TP signal: %s", e)
         return None
@@ -145,13 +136,16 @@ def process_signal(signal_data, order_manager, trade_manager):
         logger.info("Last position on side '%s' was closed. Ignoring same-side signal.", new_side)
         return None
 
-    cancel_conflicting_pending_orders_api(order_manager, "BTCUSD", new_side)
     if new_side:
-        cancel_same_side_pending_orders(order_manager, "BTCUSD", new_side)
+        # Conflicting and same-side pending orders alike: every open order, in one batch cancel.
+        canceled = cancel_conflicting_pending_orders_api(order_manager, "BTCUSD", "")
+    else:
+        canceled = cancel_conflicting_pending_orders_api(order_manager, "BTCUSD", new_side)
 
-    time.sleep(2)
+    # Proceed as soon as the cancels are confirmed rather than after a fixed pause.
+    trade_manager.waiter.wait_for_orders_closed(canceled, "BTCUSD")
 
-    if new_side and open_pending_order_exists(order_manager, "BTCUSD", new_side):
+    if config.ORDER_PRECHECKS and new_side and open_pending_order_exists(order_manager, "BTCUSD", new_side):
         logger.info("A pending %s order still exists for BTCUSD. Skipping new order.", new_side)
         return None
 
@@ -175,58 +169,42 @@ def process_signal(signal_data, order_manager, trade_manager):
                 last_signal.get("text"), entry_price, sl_price, tp_price)
 
     try:
-        positions = order_manager.client.fetch_positions()
-        for pos in positions:
-            pos_symbol = pos.get('info', {}).get('product_symbol') or pos.get('symbol')
-            if pos_symbol and "BTCUSD" in pos_symbol:
-                pos_size = pos.get('size') or pos.get('contracts') or "0"
-                pos_amount = float(pos_size)
-                if new_side == "buy" and pos_amount < 0:
-                    logger.info("Opposite short position exists. Closing it before buying.")
-                    trade_manager.place_market_order("BTCUSD", "buy", abs(pos_amount), params={"time_in_force": "ioc"})
-                    last_closed_side = "sell"
-                    time.sleep(2)
-                elif new_side == "sell" and pos_amount > 0:
-                    logger.info("Opposite long position exists. Closing it before selling.")
-                    trade_manager.place_market_order("BTCUSD", "sell", pos_amount, params={"time_in_force": "ioc"})
-                    last_closed_side = "buy"
-                    time.sleep(2)
+        opposite = [
+            pos for pos in order_manager.snapshot.get_positions("BTCUSD")
+            if (new_side == "buy" and position_size(pos) < 0) or (new_side == "sell" and position_size(pos) > 0)
+        ]
+        if opposite:
+            if new_side == "buy":
+                logger.info("Opposite short position exists. Closing it before buying.")
+                last_closed_side = "sell"
+            else:
+                logger.info("Opposite long position exists. Closing it before selling.")
+                last_closed_side = "buy"
+            # Closes run concurrently and each returns once its fill is seen.
+            trade_manager.close_positions("BTCUSD", opposite, key=key)
     except Exception as e:
         logger.error("Error checking/closing opposite position: %s", e)
 
-    if order_manager.has_open_position("BTCUSD", new_side):
+    if config.ORDER_PRECHECKS and order_manager.has_open_position("BTCUSD", new_side):
         logger.info("An open %s position already exists for BTCUSD. Skipping new order.", new_side)
         return None
 
     try:
-        limit_order = order_manager.place_order("BTCUSD", new_side, 1, entry_price, params={"time_in_force": "gtc"})
-        logger.info("Limit order placed: %s", limit_order)
+        # Entry and bracket SL/TP in one request: the order is never live without its stop.
+        limit_order = order_manager.place_bracket_order(
+            "BTCUSD", new_side, 1, entry_price,
+            stop_loss=sl_price, take_profit=tp_price,
+            params={"time_in_force": "gtc"},
+            client_order_id=make_client_order_id(key, new_side, "entry")
+        )
+        logger.info("Limit order with bracket placed: %s", limit_order)
         last_executed_side = new_side
         last_closed_side = None
+        return limit_order
     except Exception as e:
         logger.error("Failed to place limit order: %s", e)
         return None
 
-    bracket_params = {
-        "bracket_stop_loss_limit_price": str(sl_price),
-        "bracket_stop_loss_price": str(sl_price),
-        "bracket_take_profit_limit_price": str(tp_price),
-        "bracket_take_profit_price": str(tp_price),
-        "bracket_stop_trigger_method": "last_traded_price"
-    }
-    try:
-        updated_order = order_manager.attach_bracket_to_order(
-            order_id=limit_order['id'],
-            product_id=27,
-            product_symbol="BTCUSD",
-            bracket_params=bracket_params
-        )
-        logger.info("Bracket attached, updated order: %s", updated_order)
-        return updated_order
-    except Exception as e:
-        logger.error("Failed to attach bracket to order: %s", e)
-        return None
-
 def signals_are_different(new_signal, old_signal):
     if not old_signal:
         return True
@@ -234,23 +212,43 @@ def signals_are_different(new_signal, old_signal):
     old_text = old_signal.get("last_signal", {}).get("text")
     return new_text != old_text
 
+def handle_new_signal(signal_data, order_manager, trade_manager, seq=None, nonce=None):
+    logger.info("New signal detected.")
+    updated_order = process_signal(signal_data, order_manager, trade_manager, seq=seq, nonce=nonce)
+    if updated_order:
+        logger.info("Order processed successfully: %s", updated_order)
+    else:
+        logger.info("Order processing skipped or failed for this signal.")
+    return updated_order
+
 def start_signal_processing_loop():
     global last_executed_side, last_closed_side
     order_manager = OrderManager()
     trade_manager = TradeManager()
-    redis_client = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB)
+    redis_client = get_redis()
 
     last_signal = None
+    if config.SIGNAL_DELIVERY == "stream":
+        logger.info("Starting signal processing loop (Redis Stream '%s')...", config.SIGNAL_STREAM)
+
+        def on_signal(signal_data, seq):
+            nonlocal last_signal
+            if signals_are_different(signal_data, last_signal):
+                logger.info("Signal seq %s received.", seq)
+                handle_new_signal(signal_data, order_manager, trade_manager, seq=seq)
+                last_signal = signal_data
+            else:
+                logger.debug("Signal seq %s is identical to the last one.", seq)
+
+        SignalStreamConsumer(redis_client).run(on_signal)
+        return
+
     logger.info("Starting signal processing loop...")
     while True:
         signal_data = fetch_signal_from_redis(redis_client, key="signal")
         if signal_data and signals_are_different(signal_data, last_signal):
-            logger.info("New signal detected.")
-            updated_order = process_signal(signal_data, order_manager, trade_manager)
-            if updated_order:
-                logger.info("Order processed successfully: %s", updated_order)
-            else:
-                logger.info("Order processing skipped or failed for this signal.")
+            # Each newly seen signal is its own occurrence, even if identical to an earlier one.
+            handle_new_signal(signal_data, order_manager, trade_manager, nonce=time.time_ns())
             last_signal = signal_data
         else:
             logger.debug("No new signal or signal is identical to the last one.")
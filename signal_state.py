@@ -1,14 +1,21 @@
-import redis
-import config
+from redis_pool import get_redis, get_cache, cached_get
 
-r = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB)
+r = get_redis()
+
+def _invalidate(key):
+    # Our own write must not wait for the keyspace notification to drop the local copy.
+    cache = get_cache()
+    if cache is not None:
+        cache.invalidate(key)
 
 def set_last_sl_closed_side(side):
     r.set("last_sl_closed_side", side)
+    _invalidate("last_sl_closed_side")
 
 def get_last_sl_closed_side():
-    value = r.get("last_sl_closed_side")
+    value = cached_get("last_sl_closed_side", r)
     return value.decode() if value else None
 
 def clear_last_sl_closed_side():
     r.delete("last_sl_closed_side")
+    _invalidate("last_sl_closed_side")
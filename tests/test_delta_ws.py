@@ -0,0 +1,240 @@
+"""
+Drive DeltaPrivateFeed against a local stand-in for Delta's private WebSocket:
+auth and subscribe, position/order/fill pushes, then a dropped connection with
+REST fallback and a reconnect.
+"""
+import base64
+import hashlib
+import json
+import queue
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("websocket")
+
+import delta_ws
+from account_snapshot import AccountSnapshot
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class StandInServer:
+    """Minimal single-client WebSocket server (text frames only) on 127.0.0.1."""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(1)
+        self.url = "ws://127.0.0.1:%d" % self.sock.getsockname()[1]
+        self.received = queue.Queue()
+        self.connections = 0
+        self.conn = None
+        self._connected = threading.Event()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self._handshake(conn)
+            self.conn = conn
+            self.connections += 1
+            self._connected.set()
+            self._read_frames(conn)
+
+    def _handshake(self, conn):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            request += conn.recv(4096)
+        key = next(line.split(b":", 1)[1].strip() for line in request.split(b"\r\n")
+                   if line.lower().startswith(b"sec-websocket-key"))
+        accept = base64.b64encode(hashlib.sha1(key + WS_GUID.encode()).digest())
+        conn.sendall(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                     b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+
+    def _recv_exact(self, conn, n):
+        data = b""
+        while len(data) < n:
+            chunk = conn.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("client went away")
+            data += chunk
+        return data
+
+    def _read_frames(self, conn):
+        try:
+            while True:
+                head = self._recv_exact(conn, 2)
+                opcode, length = head[0] & 0x0F, head[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack(">H", self._recv_exact(conn, 2))[0]
+                elif length == 127:
+                    length = struct.unpack(">Q", self._recv_exact(conn, 8))[0]
+                mask = self._recv_exact(conn, 4) if head[1] & 0x80 else b"\0\0\0\0"
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self._recv_exact(conn, length)))
+                if opcode == 0x8:
+                    self._frame(conn, 0x8, payload[:2])
+                    return
+                if opcode == 0x9:
+                    self._frame(conn, 0xA, payload)
+                elif opcode == 0x1:
+                    self.received.put(json.loads(payload))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _frame(self, conn, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack(">BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+        conn.sendall(header + payload)
+
+    def wait_connected(self, timeout=5):
+        assert self._connected.wait(timeout), "feed did not connect"
+        self._connected.clear()
+
+    def expect(self, msg_type, timeout=5):
+        message = self.received.get(timeout=timeout)
+        assert message["type"] == msg_type, message
+        return message
+
+    def send(self, message):
+        self._frame(self.conn, 0x1, json.dumps(message).encode())
+
+    def drop(self):
+        """Cut the connection without a close handshake."""
+        self.conn.shutdown(socket.SHUT_RDWR)
+        self.conn.close()
+
+    def close(self):
+        self.sock.close()
+
+
+class RestClient:
+    """Stands in for DeltaExchangeClient's REST calls used by the snapshot."""
+
+    def __init__(self):
+        self.calls = 0
+        self.positions = [{"symbol": "BTCUSD", "size": 5, "entryPrice": 61000.0}]
+
+    def fetch_positions(self):
+        self.calls += 1
+        return self.positions
+
+    def fetch_open_orders(self, symbol=None):
+        self.calls += 1
+        return []
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def server():
+    server = StandInServer()
+    yield server
+    server.close()
+
+
+def connect(server, feed):
+    server.wait_connected()
+    auth = server.expect("auth")
+    assert auth["payload"]["api-key"] == "key"
+    assert len(auth["payload"]["signature"]) == 64  # HMAC-SHA256 hex digest
+    server.send({"type": "key-auth", "success": True})
+    subscribe = server.expect("subscribe")
+    assert [c["name"] for c in subscribe["payload"]["channels"]] == delta_ws.DeltaPrivateFeed.CHANNELS
+    server.send({"type": "positions", "action": "snapshot",
+                 "result": [{"product_symbol": "BTCUSD", "size": 2, "entry_price": "60000"}]})
+    server.send({"type": "orders", "action": "snapshot", "result": []})
+    assert wait_until(feed.snapshot.stream_live)
+
+
+def test_private_feed_updates_snapshot_and_falls_back_to_rest(server):
+    rest = RestClient()
+    snapshot = AccountSnapshot(rest)
+    events = []
+    snapshot.add_listener(lambda kind, event, key, old, new: events.append((kind, event, key)))
+    feed = delta_ws.DeltaPrivateFeed(snapshot=snapshot, url=server.url, api_key="key",
+                                     api_secret="secret", reconnect_delay=0.1)
+    threading.Thread(target=feed.run_forever, daemon=True).start()
+    try:
+        connect(server, feed)
+        assert [p["size"] for p in snapshot.get_positions("BTCUSD")] == [2.0]
+
+        # Order lifecycle: opened, then canceled.
+        server.send({"type": "orders", "action": "create", "id": 11, "client_order_id": "c11",
+                     "product_symbol": "BTCUSD", "side": "buy", "order_type": "limit_order",
+                     "size": 1, "unfilled_size": 1, "limit_price": "59000", "state": "open"})
+        assert wait_until(lambda: snapshot.get_open_orders("BTCUSD"))
+        order = snapshot.get_open_orders("BTCUSD")[0]
+        assert (order["id"], order["clientOrderId"], order["price"]) == ("11", "c11", 59000.0)
+        server.send({"type": "orders", "action": "delete", "id": 11, "product_symbol": "BTCUSD",
+                     "side": "buy", "size": 1, "unfilled_size": 1, "state": "open"})
+        assert wait_until(lambda: not snapshot.get_open_orders("BTCUSD"))
+
+        # Fill, resize and close of the position.
+        server.send({"type": "user_trades", "fill_id": "f1", "order_id": 12, "client_order_id": "c12",
+                     "symbol": "BTCUSD", "side": "buy", "size": 1, "price": "60100"})
+        server.send({"type": "positions", "action": "update", "product_symbol": "BTCUSD",
+                     "size": 3, "entry_price": "60033"})
+        assert wait_until(lambda: [p["size"] for p in snapshot.positions()] == [3.0])
+        assert snapshot.fills[-1]["clientOrderId"] == "c12"
+        server.send({"type": "positions", "action": "delete", "product_symbol": "BTCUSD", "size": 0})
+        assert wait_until(lambda: not snapshot.positions())
+        # While live, reads are served locally.
+        assert snapshot.get_positions(max_age=0) == []
+        assert rest.calls == 0
+        assert ("order", "closed", "11") in events and ("position", "resized", "BTCUSD") in events
+
+        # Dropped stream: the snapshot goes stale and reads fall back to REST.
+        server.drop()
+        assert wait_until(lambda: not snapshot.stream_live())
+        assert [p["size"] for p in snapshot.get_positions("BTCUSD", max_age=1)] == [5]
+        assert rest.calls == 1
+
+        # The feed reconnects, re-authenticates and is live again.
+        connect(server, feed)
+        assert server.connections == 2
+        assert [p["size"] for p in snapshot.get_positions("BTCUSD")] == [2.0]
+    finally:
+        feed.stop()
+
+
+def test_reconcile_does_not_undo_a_newer_push():
+    gate, fetching = threading.Event(), threading.Event()
+
+    class SlowRest(RestClient):
+        def fetch_positions(self):
+            stale = [{"symbol": "BTCUSD", "size": 2}]
+            fetching.set()
+            gate.wait(5)
+            return stale
+
+    snapshot = AccountSnapshot(SlowRest())
+    snapshot.upsert_position({"symbol": "BTCUSD", "size": 2})
+    refresh = threading.Thread(target=snapshot.refresh_positions)
+    refresh.start()
+    assert fetching.wait(5)
+    snapshot.remove_position("BTCUSD")  # pushed close lands while REST is in flight
+    gate.set()
+    refresh.join(5)
+    assert snapshot.positions() == []
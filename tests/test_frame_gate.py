@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+from frame_gate import FrameGate
+
+
+def frame(seed):
+    return np.random.default_rng(seed).integers(0, 255, (60, 200), dtype=np.uint8)
+
+
+def test_failed_ocr_leaves_region_unseen():
+    gate = FrameGate(threshold=4)
+    gray = frame(1)
+    calls = []
+
+    def failing_ocr(image):
+        calls.append("fail")
+        raise RuntimeError("OCR worker died")
+
+    changed, region_hash = gate.check(gray)
+    assert changed
+    with pytest.raises(RuntimeError):
+        gate.recognize(region_hash, gray, failing_ocr)
+
+    # The overlay did not move, but the failed region is still due for OCR.
+    changed, region_hash = gate.check(gray.copy())
+    assert changed
+    assert gate.recognize(region_hash, gray, lambda image: ["label"]) == ["label"]
+    assert gate.check(gray.copy())[0] is False
+    assert gate.check(frame(2))[0] is True
+    assert calls == ["fail"]
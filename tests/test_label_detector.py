@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("redis")
+
+import config
+import youtube_ocr
+from label_detector import merge_boxes
+
+LABEL = ([[0, 0], [40, 0], [40, 10], [0, 10]], "buy 60000", 0.9)
+
+
+class BlindDetector:
+    """A pre-detector that never finds the label on screen."""
+
+    def detect(self, bgr, gray=None):
+        return []
+
+
+class RecordingOcr:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, gray, boxes=None):
+        self.calls.append("boxes" if boxes else "full")
+        return [LABEL] if boxes is None else []
+
+
+def test_missed_label_is_read_within_full_every_frames(monkeypatch):
+    monkeypatch.setattr(config, "OCR_LABEL_DETECTOR", True)
+    monkeypatch.setattr(config, "OCR_FULL_EVERY_N", 5)
+    monkeypatch.setattr(config, "OCR_ZONE_DETECTION", False)
+    monkeypatch.setattr(youtube_ocr.LabelDetector, "from_config", classmethod(lambda cls, conf: BlindDetector()))
+    ocr = RecordingOcr()
+    extractor = youtube_ocr.SignalExtractor(ocr, roi=None)
+    frame = np.random.default_rng(0).integers(0, 255, (90, 160, 3), dtype=np.uint8)
+
+    # A still frame: the detector misses the label, and the empty result is not cached.
+    results = [extractor.recognize(frame.copy()) for _ in range(4)]
+    assert results[0][0] == [] and results[1:] == [None, None, None]
+    assert not extractor.gate.cache
+    results.append(extractor.recognize(frame.copy()))
+    # The fifth frame is a full read even though nothing changed.
+    assert results[4][0] == [LABEL]
+    assert ocr.calls == ["full"]
+    # It is cached from then on, and the next full read comes five frames later.
+    for _ in range(4):
+        assert extractor.recognize(frame.copy()) is None
+    assert extractor.recognize(frame.copy())[0] == [LABEL]
+    assert ocr.calls == ["full", "full"]
+
+
+def boxes_overlap(a, b):
+    return a[0] <= b[0] + b[2] and a[0] + a[2] >= b[0] and a[1] <= b[1] + b[3] and a[1] + a[3] >= b[1]
+
+
+def test_merge_boxes_is_transitive():
+    # A and B are apart; C arrives last in sort order and bridges them.
+    boxes = [(0, 0, 10, 10), (30, 0, 10, 10), (5, 5, 30, 2)]
+    assert merge_boxes(boxes) == [(0, 0, 40, 10)]
+    # Growing one merged box can make it reach another: merged again.
+    chain = [(0, 0, 10, 4), (0, 20, 10, 4), (8, 2, 4, 20), (50, 50, 5, 5)]
+    merged = merge_boxes(chain, pad=1, limit=(100, 100))
+    assert not any(boxes_overlap(a, b) for i, a in enumerate(merged) for b in merged[i + 1:])
+    assert sorted(merged) == [(0, 0, 13, 25), (49, 49, 7, 7)]
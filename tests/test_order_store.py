@@ -0,0 +1,74 @@
+"""OrderStore eviction (terminal TTL and max_size) and index upkeep across update()."""
+import pytest
+
+import order_store
+from order_store import OrderRecord, OrderStore
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(order_store, "time", clock)
+    return clock
+
+
+def test_terminal_orders_expire_after_ttl(clock):
+    store = OrderStore(terminal_ttl=60)
+    store.add(OrderRecord("open", "BTCUSD", "buy"))
+    store.add(OrderRecord("filled", "BTCUSD", "buy", status="filled"))
+    clock.now += 30
+    store.set_status("open", "canceled")
+    clock.now += 29
+    assert len(store) == 2
+
+    clock.now += 1  # "filled" is 60s old, "open" was canceled 30s ago
+    assert "filled" not in store
+    assert store.get("open").status == "canceled"
+    clock.now += 30
+    assert len(store) == 0
+    assert not store.by_symbol("BTCUSD") and not store.by_status("canceled")
+
+
+def test_max_size_evicts_terminal_orders_first(clock):
+    store = OrderStore(max_size=3, terminal_ttl=3600)
+    store.add(OrderRecord("o1", "BTCUSD", "buy"))
+    store.add(OrderRecord("o2", "BTCUSD", "sell"))
+    store.add(OrderRecord("done", "BTCUSD", "buy", status="filled"))
+    store.add(OrderRecord("o3", "ETHUSD", "buy"))
+    # The newest terminal order goes before any older open one...
+    assert "done" not in store and store.by_status("filled") == []
+    assert sorted(o.id for o in store.open_orders()) == ["o1", "o2", "o3"]
+    # ...and with none left, the oldest order overall.
+    store.add(OrderRecord("o4", "ETHUSD", "sell"))
+    assert "o1" not in store and len(store) == 3
+    assert not store.has_open("BTCUSD", "buy")
+    assert store.has_open("BTCUSD", "sell")
+
+
+def test_update_keeps_indexes_in_step(clock):
+    store = OrderStore()
+    store.add(OrderRecord("o1", "BTCUSD", "buy", client_order_id="c1"))
+    assert store.has_open("BTCUSD", "buy")
+
+    store.update("o1", symbol="ETHUSD", side="SELL", client_order_id="c2")
+    assert not store.has_open("BTCUSD", "buy") and store.has_open("ETHUSD", "sell")
+    assert store.by_symbol("BTCUSD") == [] and [o.id for o in store.by_symbol("ETHUSD")] == ["o1"]
+    assert store.find_by_client_id("c1") is None and store.find_by_client_id("c2").id == "o1"
+
+    store.set_status("o1", "FILLED")
+    assert store.open_orders() == [] and not store.has_open("ETHUSD", "sell")
+    assert store.by_status("open") == [] and [o.id for o in store.by_status("filled")] == ["o1"]
+
+    # Reopened: back in the open index and no longer due for TTL eviction.
+    store.set_status("o1", "open")
+    assert store.has_open("ETHUSD", "sell")
+    assert store.evict(now=clock.now + 10 ** 6) == 0
+    assert store.update("missing", status="open") is None
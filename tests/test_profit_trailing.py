@@ -0,0 +1,52 @@
+"""Take-profit stop locks reach the running tracker's engine, not just Redis."""
+import queue
+
+import pytest
+
+pytest.importorskip("ccxt")
+pytest.importorskip("redis")
+pytest.importorskip("websocket")
+
+import config
+import profit_trailing
+from trailing_engine import TrailingStopEngine, TriggerIndex
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    pt = profit_trailing.ProfitTrailing.__new__(profit_trailing.ProfitTrailing)
+    pt.engine = TrailingStopEngine(config.PROFIT_TRAILING_CONFIG)
+    pt.position_trailing_stop = {}
+    pt.engine.sync([{"id": "o1", "entryPrice": 60000.0, "size": 1.0}])
+    pt.triggers = TriggerIndex(pt.engine)
+    pt._stop_locks = queue.Queue()
+    pt._pending_brackets = {}
+    monkeypatch.setattr(profit_trailing, "_tracker", pt)
+    return pt
+
+
+def test_tp_lock_is_applied_by_the_running_tracker(tracker):
+    tracker.triggers.evaluate(60600.0)  # 1% up: dynamic rule, stop at entry + 0.6% (60360)
+    held = tracker.engine.stop[0]
+
+    assert profit_trailing.lock_trailing_stop("o1", 60450.0, 1.0)
+    assert tracker.engine.stop[0] == held  # queued until the tracker loop runs
+    tracker.apply_stop_locks()
+    assert tracker.engine.stop[0] == 60450.0
+    assert tracker.position_trailing_stop["o1"] == 60450.0
+
+    # The tracker's next ratchet keeps the lock, and a looser lock is refused.
+    tracker.triggers.evaluate(60650.0)
+    assert tracker.engine.stop[0] == 60450.0
+    assert not profit_trailing.lock_trailing_stop("o1", 60400.0, 1.0)
+    result = tracker.triggers.evaluate(60440.0)
+    assert result.index[result.close].tolist() == [0]
+
+
+def test_tp_lock_for_a_position_not_loaded_yet(tracker):
+    assert profit_trailing.lock_trailing_stop("o2", 59000.0, -1.0)
+    tracker.apply_stop_locks()
+    assert tracker.position_trailing_stop["o2"] == 59000.0
+    tracker.engine.sync(tracker.engine.positions + [{"id": "o2", "entryPrice": 60000.0, "size": -1.0}],
+                        tracker.position_trailing_stop)
+    assert tracker.engine.stop[1] == 59000.0
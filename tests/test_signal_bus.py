@@ -0,0 +1,29 @@
+"""Startup replay of pending signal stream entries, across more than one XREADGROUP page."""
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # publish_signal runs a Lua script
+
+from signal_bus import SignalStreamConsumer, publish_signal
+
+
+def test_replay_drains_every_pending_page():
+    client = fakeredis.FakeStrictRedis()
+    consumer = SignalStreamConsumer(client, stream="signals", group="bot", consumer="c1", block_ms=10)
+    consumer.ensure_group()
+    for i in range(25):
+        publish_signal(client, {"n": i}, stream="signals")
+
+    # Delivered to this consumer (read page by page, 10 at a time) but never acknowledged,
+    # and the first three were already handled before the crash.
+    while consumer._read(">", None):
+        pass
+    client.set(consumer.last_seq_key, 3)
+    assert client.xpending("signals", "bot")["pending"] == 25
+
+    seen = []
+    assert consumer.replay_pending(lambda signal, seq: seen.append((signal["n"], seq))) == 25
+    assert seen == [(i, i + 1) for i in range(3, 25)]
+    assert client.xpending("signals", "bot")["pending"] == 0
+    assert consumer.last_processed_seq() == 25
+    assert consumer.replay_pending(seen.append) == 0
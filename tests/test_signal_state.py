@@ -0,0 +1,35 @@
+"""
+Writes through signal_state drop the local ClientSideCache copy at once, without
+waiting for the keyspace notification.
+"""
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import redis_pool
+import signal_state
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    client = fakeredis.FakeStrictRedis()
+    cache = redis_pool.ClientSideCache(client, ["last_sl_closed_side"])
+    # Ready but with no listener: the notification for a write never arrives.
+    cache._ready.set()
+    monkeypatch.setattr(redis_pool, "_cache", cache)
+    monkeypatch.setattr(redis_pool, "_cache_started", True)
+    monkeypatch.setattr(signal_state, "r", client)
+    return cache
+
+
+def test_own_writes_invalidate_the_local_copy(cache):
+    signal_state.set_last_sl_closed_side("buy")
+    assert signal_state.get_last_sl_closed_side() == "buy"
+    assert signal_state.get_last_sl_closed_side() == "buy"
+    assert cache.hits == 1
+
+    signal_state.set_last_sl_closed_side("sell")
+    assert signal_state.get_last_sl_closed_side() == "sell"
+
+    signal_state.clear_last_sl_closed_side()
+    assert signal_state.get_last_sl_closed_side() is None
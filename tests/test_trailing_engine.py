@@ -0,0 +1,158 @@
+"""
+Random-walk equivalence of TriggerIndex (which re-evaluates only the positions
+whose boundary a tick crossed) against the original per-position logic of
+ProfitTrailing, which recomputed every position on every tick.
+"""
+import numpy as np
+import pytest
+
+import config
+from trailing_engine import TrailingStopEngine, TriggerIndex, RULE_NAMES
+
+
+class BaselineTrailing:
+    """ProfitTrailing.update_trailing_stop and its close test, one position at a time."""
+
+    def __init__(self, conf):
+        self.conf = conf
+        self.position_trailing_stop = {}
+        self.rules = {}
+
+    def get_trailing_config(self, profit_pct):
+        if profit_pct < self.conf["start_trailing_profit_pct"]:
+            return None
+        applicable = None
+        for level in self.conf["levels"]:
+            if profit_pct >= level["min_profit_pct"]:
+                applicable = level
+        return applicable
+
+    def update_trailing_stop(self, pos, live_price):
+        order_id, entry, size = pos["id"], pos["entryPrice"], pos["size"]
+        profit_pct = (live_price - entry) / entry if size > 0 else (entry - live_price) / entry
+        fixed_sl = self.conf["fixed_stop_loss_pct"]
+        existing_rule = self.rules.get(order_id, "fixed_stop")
+
+        rule = "fixed_stop"
+        level_conf = None
+        if profit_pct >= self.conf["start_trailing_profit_pct"]:
+            level_conf = self.get_trailing_config(profit_pct)
+            if existing_rule in ["dynamic", "partial_booking"]:
+                rule = existing_rule
+            elif level_conf and level_conf.get("trailing_stop_offset") is not None:
+                rule = "dynamic"
+            elif level_conf:
+                rule = "partial_booking"
+
+        # The original raised TypeError for a dynamic position on a level without an
+        # offset (entry * (1 + None)); the engine keeps its held stop there instead.
+        if rule == "dynamic" and level_conf and level_conf.get("trailing_stop_offset") is not None:
+            offset = level_conf["trailing_stop_offset"]
+            new_trailing = entry * (1 + offset) if size > 0 else entry * (1 - offset)
+        elif rule == "partial_booking" and level_conf:
+            book_fraction = level_conf.get("book_fraction", 1.0)
+            new_trailing = entry * (1 + profit_pct * book_fraction) if size > 0 else entry * (1 - profit_pct * book_fraction)
+        else:
+            new_trailing = entry * (1 - fixed_sl) if size > 0 else entry * (1 + fixed_sl)
+
+        stored_trailing = self.position_trailing_stop.get(order_id)
+        if stored_trailing is not None:
+            new_trailing = max(stored_trailing, new_trailing) if size > 0 else min(stored_trailing, new_trailing)
+        self.position_trailing_stop[order_id] = new_trailing
+        self.rules[order_id] = rule
+        return new_trailing, rule
+
+    def should_close(self, pos, live_price, trailing_stop, rule):
+        if rule == "partial_booking":
+            return False
+        return live_price < trailing_stop if pos["size"] > 0 else live_price > trailing_stop
+
+
+def random_positions(rng, n, around):
+    sizes = rng.choice([-1, 1], n) * rng.integers(1, 10, n)
+    entries = rng.uniform(around * 0.97, around * 1.03, n)
+    return [{"id": f"o{i}", "entryPrice": float(entry), "size": float(size)}
+            for i, (entry, size) in enumerate(zip(entries, sizes))]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_trigger_index_matches_per_position_baseline(seed):
+    rng = np.random.default_rng(seed)
+    positions = random_positions(rng, 60, 60000.0)
+    baseline = BaselineTrailing(config.PROFIT_TRAILING_CONFIG)
+    engine = TrailingStopEngine(config.PROFIT_TRAILING_CONFIG)
+    engine.sync(positions)
+    triggers = TriggerIndex(engine)
+    assert engine.ids == [pos["id"] for pos in positions]
+
+    price, seen_rules, previous = 60000.0, set(), [None] * len(positions)
+    for tick in range(2000):
+        # Trending stretches push positions through every trailing level and back.
+        if tick % 250 == 0:
+            drift = rng.choice([-1, 1]) * rng.uniform(0, 12)
+        price = max(price + drift + rng.normal(0, 25), 1000.0)
+
+        expected = [baseline.update_trailing_stop(pos, price) for pos in positions]
+        result = triggers.evaluate(price)
+
+        # Quiet positions were not touched, yet every held stop and rule matches the baseline.
+        np.testing.assert_allclose(engine.stop, [stop for stop, _ in expected], rtol=0, atol=1e-6)
+        assert [RULE_NAMES[rule] for rule in engine.rule.tolist()] == [rule for _, rule in expected]
+        seen_rules.update(rule for _, rule in expected)
+
+        closes = {i for i, (pos, (stop, rule)) in enumerate(zip(positions, expected))
+                  if baseline.should_close(pos, price, stop, rule)}
+        assert set(result.index[result.close].tolist()) == closes, tick
+        # Every raised partial-booking stop is reported, so its bracket gets sent.
+        raised = set(result.index[result.partial & result.stop_changed].tolist())
+        for i, ((stop, rule), before) in enumerate(zip(expected, previous)):
+            if rule == "partial_booking" and stop != before:
+                assert i in raised, (tick, i)
+        previous = [stop for stop, _ in expected]
+
+    assert seen_rules == set(RULE_NAMES)
+
+
+def test_trigger_index_matches_baseline_across_resync():
+    rng = np.random.default_rng(7)
+    positions = random_positions(rng, 40, 60000.0)
+    baseline = BaselineTrailing(config.PROFIT_TRAILING_CONFIG)
+    engine = TrailingStopEngine(config.PROFIT_TRAILING_CONFIG)
+    engine.sync(positions)
+    triggers = TriggerIndex(engine)
+
+    price = 60000.0
+    for tick in range(1500):
+        if tick == 700:
+            # Some positions closed, one opened: held stops and rules carry over.
+            positions = positions[::2] + [{"id": "new", "entryPrice": price, "size": 2.0}]
+            engine.sync(positions, dict(baseline.position_trailing_stop))
+            triggers.rebuild()
+        price += 4 + rng.normal(0, 25)
+        expected = [baseline.update_trailing_stop(pos, price) for pos in positions]
+        triggers.evaluate(price)
+        np.testing.assert_allclose(engine.stop, [stop for stop, _ in expected], rtol=0, atol=1e-6)
+        assert [RULE_NAMES[rule] for rule in engine.rule.tolist()] == [rule for _, rule in expected]
+
+
+def test_locked_stop_is_kept_and_watched():
+    engine = TrailingStopEngine(config.PROFIT_TRAILING_CONFIG)
+    engine.sync([{"id": "long", "entryPrice": 60000.0, "size": 1.0},
+                 {"id": "short", "entryPrice": 60000.0, "size": -1.0}])
+    triggers = TriggerIndex(engine)
+    triggers.evaluate(60200.0)
+
+    # A take-profit lock tightens the stop; a looser one is ignored.
+    assert triggers.lock_stop("long", 60100.0) == 0
+    assert triggers.lock_stop("long", 60050.0) is None
+    assert triggers.lock_stop("short", 60500.0) is None  # looser than its fixed stop
+    assert triggers.lock_stop("short", 60250.0) == 1
+    assert triggers.lock_stop("missing", 1.0) is None
+    assert engine.stop.tolist() == [60100.0, 60250.0]
+
+    # Later evaluations ratchet from the locked stop instead of overwriting it...
+    result = triggers.evaluate(60150.0)
+    assert engine.stop[0] == 60100.0 and not result.close.any()
+    # ...and a move through it closes the position.
+    result = triggers.evaluate(60090.0)
+    assert result.index[result.close].tolist() == [0]
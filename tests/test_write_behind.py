@@ -0,0 +1,63 @@
+"""WriteBehind coalescing and retry against a recording stand-in for a Redis pipeline."""
+import pytest
+
+from write_behind import WriteBehind
+
+
+class Pipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def set(self, key, value):
+        self.commands.append((key, value))
+
+    def execute(self):
+        if self.client.fail:
+            raise ConnectionError("redis down")
+        self.client.executed.append(self.commands)
+
+
+class Client:
+    def __init__(self):
+        self.fail = False
+        self.executed = []
+
+    def pipeline(self, transaction=True):
+        return Pipeline(self)
+
+
+def write(key, value):
+    return lambda pipe: pipe.set(key, value)
+
+
+def test_writes_for_a_slot_coalesce_in_latest_submission_order():
+    client = Client()
+    writer = WriteBehind(client, flush_interval=1)
+    writer.submit("a", write("a", 1))
+    writer.submit("b", write("b", 1))
+    writer.submit("a", write("a", 2))
+    assert writer.pending() == 2
+
+    assert writer.flush() == 2
+    assert client.executed == [[("b", 1), ("a", 2)]]
+    assert writer.flush() == 0 and writer.flushed == 2
+
+
+def test_failed_flush_requeues_without_overwriting_newer_writes():
+    client = Client()
+    writer = WriteBehind(client, flush_interval=1)
+    writer.submit("a", write("a", 1))
+    writer.submit("b", lambda pipe: (pipe.set("b", 1), writer.submit("a", write("a", 2))))
+    writer.submit("c", write("c", 1))
+
+    client.fail = True
+    with pytest.raises(ConnectionError):
+        writer.flush()
+    assert writer.errors == 1 and writer.pending() == 3
+
+    # The failed batch goes back in front; slot "a" keeps the write submitted during the flush.
+    client.fail = False
+    writer.submit("d", write("d", 1))
+    writer.flush()
+    assert client.executed == [[("b", 1), ("c", 1), ("a", 2), ("d", 1)]]
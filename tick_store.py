@@ -0,0 +1,146 @@
+import threading
+import time
+import numpy as np
+
+BUY = 1
+SELL = -1
+
+
+class TickBuffer:
+    """
+    Preallocated ring buffer of trades for one symbol: timestamp, price, qty, side
+    (+1 aggressive buy, -1 aggressive sell). Appends are O(1) and allocate nothing;
+    window queries binary-search the time-ordered ring and run vectorized.
+    """
+
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.price = np.zeros(capacity, dtype=np.float64)
+        self.qty = np.zeros(capacity, dtype=np.float64)
+        self.side = np.zeros(capacity, dtype=np.int8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def append(self, ts, price, qty, side):
+        with self._lock:
+            i = self.count % self.capacity
+            self.ts[i] = ts
+            self.price[i] = price
+            self.qty[i] = qty
+            self.side[i] = side
+            self.count += 1
+
+    def latest(self):
+        """Return (ts, price, qty, side) of the newest tick, or None."""
+        with self._lock:
+            if not self.count:
+                return None
+            i = (self.count - 1) % self.capacity
+            return float(self.ts[i]), float(self.price[i]), float(self.qty[i]), int(self.side[i])
+
+    def _segments(self):
+        # Index ranges of the ring in chronological order.
+        if self.count <= self.capacity:
+            return [(0, self.count)]
+        head = self.count % self.capacity
+        return [(head, self.capacity), (0, head)]
+
+    def window(self, seconds=None, last_n=None, now=None):
+        """
+        Return copies of (ts, price, qty, side) for ticks in the last `seconds`
+        or the last `last_n` ticks (whole buffer when neither is given).
+        """
+        with self._lock:
+            segments = self._segments()
+            if seconds is not None:
+                cutoff = (now or time.time()) - seconds
+                trimmed = []
+                for start, end in segments:
+                    offset = int(np.searchsorted(self.ts[start:end], cutoff, side='left'))
+                    if start + offset < end:
+                        trimmed.append((start + offset, end))
+                segments = trimmed
+            if last_n is not None:
+                trimmed = []
+                remaining = last_n
+                for start, end in reversed(segments):
+                    if remaining <= 0:
+                        break
+                    take = min(remaining, end - start)
+                    trimmed.insert(0, (end - take, end))
+                    remaining -= take
+                segments = trimmed
+            if not segments:
+                empty = np.empty(0)
+                return empty, empty, empty, np.empty(0, dtype=np.int8)
+            if len(segments) == 1:
+                start, end = segments[0]
+                return (self.ts[start:end].copy(), self.price[start:end].copy(),
+                        self.qty[start:end].copy(), self.side[start:end].copy())
+            return tuple(
+                np.concatenate([arr[start:end] for start, end in segments])
+                for arr in (self.ts, self.price, self.qty, self.side)
+            )
+
+    def vwap(self, seconds=None, last_n=None):
+        _, price, qty, _ = self.window(seconds, last_n)
+        total = qty.sum()
+        return float(np.dot(price, qty) / total) if total else None
+
+    def buy_sell_volume(self, seconds=None, last_n=None):
+        _, _, qty, side = self.window(seconds, last_n)
+        buy = float(qty[side == BUY].sum())
+        sell = float(qty[side == SELL].sum())
+        return buy, sell
+
+    def volume_imbalance(self, seconds=None, last_n=None):
+        """(buy - sell) / (buy + sell) over the window, in [-1, 1]."""
+        buy, sell = self.buy_sell_volume(seconds, last_n)
+        total = buy + sell
+        return (buy - sell) / total if total else 0.0
+
+
+class TickStore:
+    """Per-symbol TickBuffers, keyed by upper-case symbol (e.g. "BTCUSDT")."""
+
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def buffer(self, symbol):
+        symbol = symbol.upper()
+        buf = self._buffers.get(symbol)
+        if buf is None:
+            with self._lock:
+                buf = self._buffers.get(symbol)
+                if buf is None:
+                    buf = TickBuffer(self.capacity)
+                    self._buffers[symbol] = buf
+        return buf
+
+    def symbols(self):
+        return list(self._buffers)
+
+    def append(self, symbol, ts, price, qty, side):
+        self.buffer(symbol).append(ts, price, qty, side)
+
+    def latest(self, symbol):
+        return self.buffer(symbol).latest()
+
+    def latest_price(self, symbol):
+        tick = self.latest(symbol)
+        return tick[1] if tick else None
+
+    def window(self, symbol, seconds=None, last_n=None):
+        return self.buffer(symbol).window(seconds, last_n)
+
+    def vwap(self, symbol, seconds=None, last_n=None):
+        return self.buffer(symbol).vwap(seconds, last_n)
+
+    def buy_sell_volume(self, symbol, seconds=None, last_n=None):
+        return self.buffer(symbol).buy_sell_volume(seconds, last_n)
+
+    def volume_imbalance(self, symbol, seconds=None, last_n=None):
+        return self.buffer(symbol).volume_imbalance(seconds, last_n)
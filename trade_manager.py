@@ -1,19 +1,21 @@
 import time
 import logging
 import uuid
-import redis
-from exchange import DeltaExchangeClient
-from order_manager import OrderManager
+from concurrent.futures import ThreadPoolExecutor
+from exchange import get_client
+from order_manager import OrderManager, make_client_order_id
+from account_snapshot import get_account_snapshot, position_size, position_symbol
+from execution import get_execution_waiter
 import config
 
 logger = logging.getLogger(__name__)
 
-TOLERANCE = 1e-6  # Treat absolute sizes below this as zero.
-
 class TradeManager:
     def __init__(self):
-        self.client = DeltaExchangeClient()
+        self.client = get_client()
         self.order_manager = OrderManager()
+        self.snapshot = get_account_snapshot(self.client)
+        self.waiter = get_execution_waiter(self.snapshot)
         self.highest_price = None
 
     def get_current_price(self, product_symbol):
@@ -56,30 +58,29 @@ class TradeManager:
                 logger.error("Error modifying bracket order: %s", e)
             time.sleep(update_interval)
 
-    def place_market_order(self, symbol, side, amount, params=None):
+    def place_market_order(self, symbol, side, amount, params=None, client_order_id=None, prechecks=None):
         """
         Before placing a new market order, verify via the API whether any open position or pending order exists
         for the given symbol and side. We clean up stale local orders before checking the local cache.
         If a pending order of the same side is detected, we simply skip the new signal.
+
+        With prechecks=False (default: config.ORDER_PRECHECKS) the order is sent at once and
+        reconciled from the fill; a client_order_id makes it safe to retry and rejects duplicates.
         """
         side_lower = side.lower()
+        if prechecks is None:
+            prechecks = config.ORDER_PRECHECKS
+        if not prechecks:
+            # No API round trips: take the pre-order size from the snapshot as it stands.
+            size_before = sum(position_size(p) for p in self.snapshot.positions() if symbol in position_symbol(p))
+            return self._send_market_order(symbol, side, amount, params, client_order_id, size_before)
+        size_before = 0.0
 
-        # 1. Confirm open position via API (only for positions matching the symbol).
+        # 1. Confirm open position via the shared account snapshot (only for positions matching the symbol).
         try:
-            positions = self.client.fetch_positions()
-            for pos in positions:
-                # Filter by symbol: check pos's symbol or product_symbol.
-                pos_symbol = (pos.get('info', {}).get('product_symbol') or pos.get('symbol') or '')
-                if symbol not in pos_symbol:
-                    continue  # Ignore positions for other symbols.
-                size = pos.get('size') or pos.get('contracts') or 0
-                try:
-                    size = float(size)
-                except Exception:
-                    size = 0.0
-                # Apply tolerance to treat near-zero as zero.
-                if abs(size) < TOLERANCE:
-                    size = 0.0
+            for pos in self.snapshot.get_positions(symbol):
+                size = position_size(pos)
+                size_before += size
                 # For a buy signal (long), check if any positive size exists.
                 if side_lower == "buy" and size > 0:
                     logger.info("An open buy position exists (confirmed by API) for %s. Skipping new order placement.", symbol)
@@ -92,9 +93,9 @@ class TradeManager:
             logger.error("Error fetching positions from API: %s", e)
             # Optionally, decide how to proceed if this API check fails.
 
-        # 2. Confirm pending orders via API.
+        # 2. Confirm pending orders via the shared account snapshot.
         try:
-            open_orders = self.client.exchange.fetch_open_orders(symbol)
+            open_orders = self.snapshot.get_open_orders(symbol)
             if open_orders:
                 for o in open_orders:
                     if o.get('side', '').lower() == side_lower:
@@ -106,57 +107,41 @@ class TradeManager:
             logger.error("Error fetching open orders from API: %s", e)
             # If this API check fails, we fall back to the local order cache below.
 
-        # 3. Fallback: clean and check local pending orders stored in order_manager.
-        current_time = int(time.time() * 1000)
-        stale_order_ids = []
-        for oid, order in self.order_manager.orders.items():
-            order_ts = order.get('timestamp', 0)
-            if current_time - order_ts > 60000:  # 60 seconds threshold for staleness.
-                stale_order_ids.append(oid)
-        for oid in stale_order_ids:
-            del self.order_manager.orders[oid]
-        
-        for order in self.order_manager.orders.values():
-            if order.get('side', '').lower() == side_lower and order.get('status') in ['open', 'pending']:
-                logger.info("A local %s order is already pending for %s. Skipping new order placement (not canceling it).", side, symbol)
-                return None
+        # 3. Fallback: check local pending orders stored in order_manager (orders older than 60 seconds are stale).
+        if self.order_manager.has_local_open_order(symbol, side_lower, max_age=60):
+            logger.info("A local %s order is already pending for %s. Skipping new order placement (not canceling it).", side, symbol)
+            return None
 
         # 4. No open position or pending order confirmed – place new market order.
+        return self._send_market_order(symbol, side, amount, params, client_order_id, size_before)
+
+    def _send_market_order(self, symbol, side, amount, params, client_order_id, size_before):
+        side_lower = side.lower()
+        if client_order_id:
+            if not self.order_manager.claim_client_order_id(client_order_id):
+                logger.info("Market order %s was already submitted. Skipping duplicate.", client_order_id)
+                return None
+            params = dict(params or {}, client_order_id=client_order_id)
         try:
-            order = self.client.exchange.create_order(symbol, 'market', side, amount, None, params or {})
-            order_id = order.get('id', str(uuid.uuid4()))
-            order_info = {
-                'id': order_id,
-                'symbol': symbol,
-                'side': side,
-                'amount': amount,
-                'params': params or {},
-                'status': order.get('status', 'open'),
-                'timestamp': order.get('timestamp', int(time.time() * 1000))
-            }
-            self.order_manager.orders[order_id] = order_info
-            self.order_manager._store_order_in_redis(order_info)
-
-            # 5. Optionally verify with API after a brief delay.
-            time.sleep(1)
-            positions_after = self.client.fetch_positions()
-            for pos in positions_after:
-                pos_symbol = (pos.get('info', {}).get('product_symbol') or pos.get('symbol') or '')
-                if symbol not in pos_symbol:
-                    continue
-                size = pos.get('size') or pos.get('contracts') or 0
-                try:
-                    size = float(size)
-                except Exception:
-                    size = 0.0
-                if abs(size) < TOLERANCE:
-                    size = 0.0
-                if side_lower == "buy" and size > 0:
-                    logger.info("Verified open buy position after order placement for %s.", symbol)
-                    break
-                if side_lower == "sell" and size < 0:
-                    logger.info("Verified open sell position after order placement for %s.", symbol)
-                    break
+            try:
+                order = self.order_manager.submit(
+                    lambda: self.client.exchange.create_order(symbol, 'market', side, amount, None, params or {}),
+                    symbol, client_order_id
+                )
+            except Exception as e:
+                if client_order_id:
+                    self.order_manager.release_client_order_id(client_order_id, e)
+                raise
+            order = dict(order, id=order.get('id') or str(uuid.uuid4()))
+            order_info = self.order_manager.record_order(order, symbol, side, amount, params=params)
+
+            self.snapshot.invalidate()
+
+            # 5. Wait for the fill to show up in the position (WebSocket push or fast REST polling).
+            if self.waiter.wait_for_position_change(symbol, size_before, side_lower):
+                logger.info("Verified %s fill in position after order placement for %s.", side_lower, symbol)
+            else:
+                logger.warning("No %s fill seen for %s within %.1fs.", side_lower, symbol, self.waiter.timeout)
 
             logger.info("Market order placed: %s", order_info)
             return order_info
@@ -164,6 +149,30 @@ class TradeManager:
             logger.error("Error placing market order for %s: %s", symbol, e)
             raise
 
+    def close_positions(self, symbol, positions, key=None):
+        """
+        Close positions with market orders placed concurrently, each waiting for its
+        own fill. Returns the close orders (None for a position that was skipped or failed).
+        key (see order_manager.signal_key) gives every close a deterministic client order id.
+        """
+        def close(pos):
+            size = position_size(pos)
+            if size == 0:
+                return None
+            side = "sell" if size > 0 else "buy"
+            client_order_id = make_client_order_id(key, side, f"close:{position_symbol(pos)}") if key else None
+            try:
+                return self.place_market_order(symbol, side, abs(size), params={"time_in_force": "ioc"},
+                                               client_order_id=client_order_id)
+            except Exception as e:
+                logger.error("Error closing position %s: %s", pos.get('id'), e)
+                return None
+
+        if len(positions) <= 1:
+            return [close(pos) for pos in positions]
+        with ThreadPoolExecutor(max_workers=min(len(positions), config.EXECUTION_MAX_CONCURRENT_CLOSES)) as pool:
+            return list(pool.map(close, positions))
+
 if __name__ == '__main__':
     tm = TradeManager()
     print("Testing market order placement...")
@@ -0,0 +1,327 @@
+"""
+Vectorized trailing-stop evaluation for many positions at once.
+
+TrailingStopEngine keeps open positions as numpy arrays (entry, size, side,
+current stop, rule) and evaluates profit, trailing level, ratcheted stop and
+trigger masks for all of them in one pass per tick. Positions are parsed once
+when they are loaded (sync), not on every tick.
+
+The rules are those of PROFIT_TRAILING_CONFIG:
+
+    fixed_stop       below start_trailing_profit_pct; stop at fixed_stop_loss_pct
+    dynamic          level with a trailing_stop_offset; stop at entry +/- offset
+    partial_booking  level without an offset; stop at entry +/- profit * book_fraction
+
+Once a position enters dynamic or partial_booking it keeps that rule while it
+stays above the start threshold, and stops only ever move in its favour.
+
+TriggerIndex keeps, for every position, the nearest prices below and above the
+last evaluated one at which its evaluation could change (stop hit, next or
+previous trailing threshold, a new partial-booking stop). A tick then only
+re-evaluates the positions whose boundary it crossed.
+"""
+import heapq
+import numpy as np
+from account_snapshot import position_size, position_symbol
+import config
+
+RULE_FIXED = 0
+RULE_DYNAMIC = 1
+RULE_PARTIAL = 2
+RULE_NAMES = ("fixed_stop", "dynamic", "partial_booking")
+
+
+def position_entry(pos):
+    entry = pos.get('entryPrice') or pos.get('entry_price') or pos.get('info', {}).get('entry_price')
+    try:
+        return float(entry)
+    except Exception:
+        return None
+
+
+class TrailingResult:
+    """
+    Per-position output of one evaluation. index holds the evaluated positions
+    (offsets into engine.ids); every other attribute is an array aligned with it.
+    """
+
+    __slots__ = ("index", "live", "profit_pct", "raw_profit", "stop", "rule", "close", "partial", "stop_changed")
+
+    def __init__(self, index, live, profit_pct, raw_profit, stop, rule, close, partial, stop_changed):
+        self.index = index
+        self.live = live
+        self.profit_pct = profit_pct
+        self.raw_profit = raw_profit
+        self.stop = stop
+        self.rule = rule
+        self.close = close
+        self.partial = partial
+        self.stop_changed = stop_changed
+
+
+class TrailingStopEngine:
+    def __init__(self, conf=None):
+        conf = conf or config.PROFIT_TRAILING_CONFIG
+        self.start_pct = conf["start_trailing_profit_pct"]
+        self.fixed_sl = conf["fixed_stop_loss_pct"]
+        # No levels: a level that is never reached keeps every position on the fixed stop.
+        levels = sorted(conf["levels"], key=lambda level: level["min_profit_pct"]) or [{"min_profit_pct": np.inf}]
+        # Level boundaries for searchsorted; NaN offset marks a partial-booking level.
+        self.level_mins = np.array([level["min_profit_pct"] for level in levels], dtype=float)
+        self.level_offsets = np.array([np.nan if level.get("trailing_stop_offset") is None
+                                       else level["trailing_stop_offset"] for level in levels], dtype=float)
+        self.level_fractions = np.array([level.get("book_fraction", 1.0) for level in levels], dtype=float)
+        # Every profit at which a position's level or rule can change.
+        thresholds = np.unique(np.append(self.level_mins[np.isfinite(self.level_mins)], self.start_pct))
+        self._next_thresholds = np.append(thresholds, np.inf)
+        self._prev_thresholds = np.insert(thresholds, 0, -np.inf)
+        self.ids = []
+        self.positions = []
+        self.symbols = []
+        self.entry = np.empty(0)
+        self.size = np.empty(0)
+        self.side = np.empty(0)
+        self.stop = np.empty(0)
+        self.rule = np.empty(0, dtype=np.int8)
+        self.profit_pct = np.empty(0)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def sync(self, positions, stops=None):
+        """
+        Load the current open positions. Stops and rules of positions already held
+        carry over; new positions take their stop from stops (id -> price) if given.
+        Positions without a size or a usable entry price are skipped. Positions not
+        evaluated since they were loaded (or resized) have a NaN profit_pct.
+        """
+        previous = {order_id: i for i, order_id in enumerate(self.ids)}
+        stops = stops or {}
+        rows = []
+        for pos in positions:
+            size = position_size(pos)
+            entry = position_entry(pos)
+            if size == 0 or not entry:
+                continue
+            order_id = pos.get('id')
+            i = previous.get(order_id)
+            if i is None:
+                stop = stops.get(order_id)
+                rows.append((order_id, pos, entry, size, np.nan if stop is None else stop, RULE_FIXED, np.nan))
+            else:
+                unchanged = self.entry[i] == entry and self.size[i] == size
+                rows.append((order_id, pos, entry, size, self.stop[i], self.rule[i],
+                             self.profit_pct[i] if unchanged else np.nan))
+
+        self.ids = [row[0] for row in rows]
+        self.positions = [row[1] for row in rows]
+        self.symbols = [position_symbol(row[1]) for row in rows]
+        self.entry = np.array([row[2] for row in rows], dtype=float)
+        self.size = np.array([row[3] for row in rows], dtype=float)
+        self.side = np.sign(self.size)
+        self.stop = np.array([row[4] for row in rows], dtype=float)
+        self.rule = np.array([row[5] for row in rows], dtype=np.int8)
+        self.profit_pct = np.array([row[6] for row in rows], dtype=float)
+
+    def lock_stop(self, order_id, stop):
+        """
+        Tighten the held stop of order_id to stop (raise a long's, lower a short's); a
+        looser stop is ignored, and later evaluations only ratchet from it. Returns the
+        position's offset if its stop changed, else None.
+        """
+        try:
+            i = self.ids.index(order_id)
+        except ValueError:
+            return None
+        held = self.stop[i]
+        if not np.isnan(held) and (stop <= held if self.side[i] > 0 else stop >= held):
+            return None
+        self.stop[i] = stop
+        return i
+
+    def evaluate(self, live_price, index=None):
+        """
+        Evaluate the positions at offsets index (default: all) at live_price, a
+        scalar or an array aligned with ids for positions on different symbols.
+        Updates their held stops and rules and returns a TrailingResult.
+        """
+        index = np.arange(len(self.ids)) if index is None else np.asarray(index, dtype=np.intp)
+        live_price = np.asarray(live_price, dtype=float)
+        live = live_price[index] if live_price.ndim else np.broadcast_to(live_price, index.shape)
+        entry, side, held_stop, held_rule = self.entry[index], self.side[index], self.stop[index], self.rule[index]
+        profit_pct = side * (live - entry) / entry
+        raw_profit = (live - entry) * self.size[index]
+
+        # Highest level whose min_profit_pct has been reached (-1: none).
+        level = np.searchsorted(self.level_mins, profit_pct, side="right") - 1
+        has_level = level >= 0
+        level_index = np.maximum(level, 0)
+        offset = np.where(has_level, self.level_offsets[level_index], np.nan)
+        fraction = self.level_fractions[level_index]
+        has_offset = has_level & ~np.isnan(offset)
+
+        trailing = profit_pct >= self.start_pct
+        sticky = (held_rule == RULE_DYNAMIC) | (held_rule == RULE_PARTIAL)
+        rule = np.where(has_offset, RULE_DYNAMIC, np.where(has_level, RULE_PARTIAL, RULE_FIXED))
+        rule = np.where(sticky, held_rule, rule)
+        rule = np.where(trailing, rule, RULE_FIXED).astype(np.int8)
+
+        stop = entry * (1 - side * self.fixed_sl)
+        dynamic = (rule == RULE_DYNAMIC) & has_offset
+        stop = np.where(dynamic, entry * (1 + side * np.nan_to_num(offset)), stop)
+        partial_stop = (rule == RULE_PARTIAL) & has_level
+        stop = np.where(partial_stop, entry * (1 + side * profit_pct * fraction), stop)
+
+        # Ratchet: a long's stop never goes down, a short's never goes up.
+        held = ~np.isnan(held_stop)
+        ratcheted = np.where(side > 0, np.fmax(held_stop, stop), np.fmin(held_stop, stop))
+        stop = np.where(held, ratcheted, stop)
+        stop_changed = ~held | (stop != held_stop)
+
+        crossed = ((side > 0) & (live < stop)) | ((side < 0) & (live > stop))
+        close = crossed & (rule != RULE_PARTIAL)
+        partial = rule == RULE_PARTIAL
+
+        self.stop[index] = stop
+        self.rule[index] = rule
+        self.profit_pct[index] = profit_pct
+        return TrailingResult(index, live, profit_pct, raw_profit, stop, rule, close, partial, stop_changed)
+
+    def boundaries(self, index):
+        """
+        For the positions at index, the prices (low, high) between which their last
+        evaluation still holds: moving to low or below, or to high or above, may hit
+        the stop, change the trailing level or rule, or (partial_booking) raise the
+        stop. Positions never evaluated get an empty range.
+        """
+        index = np.asarray(index, dtype=np.intp)
+        entry, side, stop, rule = self.entry[index], self.side[index], self.stop[index], self.rule[index]
+        profit_pct = self.profit_pct[index]
+        evaluated = ~np.isnan(profit_pct)
+        profit_pct = np.where(evaluated, profit_pct, 0.0)
+
+        position = np.searchsorted(self._next_thresholds[:-1], profit_pct, side="right")
+        favourable = self._next_thresholds[position]
+        adverse = self._prev_thresholds[position]
+
+        # A partial-booking stop follows profit: it rises once profit passes the
+        # one at which the current level's formula reaches the held stop.
+        level = np.searchsorted(self.level_mins, profit_pct, side="right") - 1
+        fraction = self.level_fractions[np.maximum(level, 0)]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            catch_up = side * (stop / entry - 1) / fraction
+        partial = (rule == RULE_PARTIAL) & (level >= 0) & ~np.isnan(catch_up)
+        favourable = np.where(partial, np.fmin(favourable, catch_up), favourable)
+
+        favourable_price = entry * (1 + side * favourable)
+        adverse_price = entry * (1 + side * adverse)
+        # Partial-booking positions are never closed here (their bracket is), so only
+        # the other rules watch their stop.
+        stop = np.where(rule == RULE_PARTIAL, np.nan, stop)
+        low = np.where(side > 0, np.fmax(adverse_price, stop), favourable_price)
+        high = np.where(side > 0, favourable_price, np.fmin(adverse_price, stop))
+        # Widen slightly so a float rounding at a boundary re-evaluates rather than misses it.
+        low = np.where(evaluated, low * (1 + 1e-12), np.inf)
+        high = np.where(evaluated, high * (1 - 1e-12), -np.inf)
+        return low, high
+
+
+class TriggerIndex:
+    """
+    Price-crossing index over a TrailingStopEngine's positions (all on one price
+    feed). Each position's boundaries() sit in two heaps: one ordered by the low
+    boundary (crossed by falling prices), one by the high boundary (crossed by
+    rising prices). evaluate(price) pops just the crossed positions, re-evaluates
+    them and pushes their new boundaries, so a tick costs O(log n + k) for k
+    crossed positions, however many quiet ones there are.
+
+    Superseded heap entries are skipped lazily and compacted away when they
+    outnumber the live ones. Call rebuild() after engine.sync().
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.rebuild()
+
+    def rebuild(self):
+        count = len(self.engine)
+        self._version = np.zeros(count, dtype=np.int64)
+        low, high = self.engine.boundaries(np.arange(count))
+        self._falling = [(-price, 0, i) for i, price in enumerate(low.tolist())]
+        self._rising = [(price, 0, i) for i, price in enumerate(high.tolist())]
+        heapq.heapify(self._falling)
+        heapq.heapify(self._rising)
+        self._quiet = None
+
+    def update(self, index):
+        """Re-read the boundaries of the positions at index (after evaluating them)."""
+        index = np.asarray(index, dtype=np.intp)
+        if not len(index):
+            return
+        if len(self._falling) + len(self._rising) > 4 * len(self.engine) + 64:
+            self.rebuild()
+            return
+        self._version[index] += 1
+        low, high = self.engine.boundaries(index)
+        for i, version, low_price, high_price in zip(index.tolist(), self._version[index].tolist(),
+                                                     low.tolist(), high.tolist()):
+            heapq.heappush(self._falling, (-low_price, version, i))
+            heapq.heappush(self._rising, (high_price, version, i))
+
+    def lock_stop(self, order_id, stop):
+        """engine.lock_stop, then re-read the position's boundaries so the new stop is watched."""
+        i = self.engine.lock_stop(order_id, stop)
+        if i is not None:
+            self.update([i])
+        return i
+
+    def crossed(self, price):
+        """Offsets of the positions whose low or high boundary price has reached."""
+        hits = set()
+        version = self._version
+        while self._falling and -self._falling[0][0] >= price:
+            _, v, i = heapq.heappop(self._falling)
+            if v == version[i]:
+                hits.add(i)
+        while self._rising and self._rising[0][0] <= price:
+            _, v, i = heapq.heappop(self._rising)
+            if v == version[i]:
+                hits.add(i)
+        return np.array(sorted(hits), dtype=np.intp)
+
+    def evaluate(self, price):
+        """Evaluate only the positions whose boundary price crossed; returns a TrailingResult."""
+        index = self.crossed(price)
+        if not len(index):
+            # Nothing crossed: skip the evaluation and its fixed numpy overhead.
+            if self._quiet is None:
+                self._quiet = self.engine.evaluate(price, index)
+            return self._quiet
+        result = self.engine.evaluate(price, index)
+        self.update(index)
+        return result
+
+
+if __name__ == "__main__":
+    import time
+    rng = np.random.default_rng(0)
+    n = 1000
+    engine = TrailingStopEngine()
+    engine.sync([{'id': i, 'entryPrice': float(p), 'size': float(s)}
+                 for i, (p, s) in enumerate(zip(rng.uniform(64900, 65100, n), rng.choice([-1, 1], n) * rng.integers(1, 10, n)))])
+    ticks = 65000 + np.cumsum(rng.normal(0, 1, 10000))
+    full = TrailingStopEngine()
+    full.sync(engine.positions)
+    start = time.perf_counter()
+    for price in ticks:
+        result = full.evaluate(price)
+    elapsed = time.perf_counter() - start
+    print(f"{n} positions x {len(ticks)} ticks, full pass: {elapsed / len(ticks) * 1e6:.1f} us/tick")
+    triggers = TriggerIndex(engine)
+    visited = 0
+    start = time.perf_counter()
+    for price in ticks:
+        visited += len(triggers.evaluate(price).index)
+    elapsed = time.perf_counter() - start
+    print(f"{n} positions x {len(ticks)} ticks, trigger index: {elapsed / len(ticks) * 1e6:.1f} us/tick, "
+          f"{visited / len(ticks):.1f} positions/tick")
@@ -0,0 +1,173 @@
+import atexit
+import json
+import logging
+import threading
+from collections import OrderedDict
+from redis_pool import get_redis
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehind:
+    """
+    Batches Redis writes off the calling thread. submit(slot, write) queues write(pipe)
+    and returns at once; a background thread runs everything queued in one pipeline
+    every flush_interval seconds.
+
+    A slot names the state a write covers (e.g. one order). A newer write for the
+    same slot replaces an unflushed older one, so each write must carry the full
+    state for its slot. Writes run in the order of their latest submission.
+    """
+
+    def __init__(self, redis_client, flush_interval=None, retry_delay=1.0):
+        self.redis_client = redis_client
+        self.flush_interval = flush_interval or config.REDIS_WRITE_BEHIND_INTERVAL
+        self.retry_delay = retry_delay
+        self.flushed = 0
+        self.errors = 0
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def submit(self, slot, write):
+        with self._lock:
+            self._pending.pop(slot, None)
+            self._pending[slot] = write
+        self._wake.set()
+
+    def pending(self):
+        return len(self._pending)
+
+    def flush(self):
+        """Write everything queued so far; returns the number of writes flushed."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, OrderedDict()
+            if not batch:
+                return 0
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for write in batch.values():
+                    write(pipe)
+                pipe.execute()
+            except Exception:
+                # Put the batch back in front, unless a newer write for a slot arrived meanwhile.
+                with self._lock:
+                    for slot, write in reversed(batch.items()):
+                        if slot not in self._pending:
+                            self._pending[slot] = write
+                            self._pending.move_to_end(slot, last=False)
+                self.errors += 1
+                raise
+            self.flushed += len(batch)
+            return len(batch)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait()
+            # Let a burst of mutations collect into one pipeline.
+            self._stop_event.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Error flushing %d Redis write(s): %s", self.pending(), e)
+                self._stop_event.wait(self.retry_delay)
+                self._wake.set()
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return self._thread
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="RedisWriteBehind", daemon=True)
+            self._thread.start()
+            return self._thread
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error("Error flushing Redis writes on stop: %s", e)
+
+
+class RedisHash(dict):
+    """
+    A dict mirrored into one Redis hash through a WriteBehind. Keys and values are
+    stored as JSON (so None or int keys survive a round trip); only changed values
+    are written. load() reads the whole hash back in one call.
+    """
+
+    def __init__(self, writer, key, data=None):
+        super().__init__(data or {})
+        self.writer = writer
+        self.key = key
+
+    @classmethod
+    def load(cls, writer, key):
+        data = {}
+        try:
+            for field, value in writer.redis_client.hgetall(key).items():
+                data[json.loads(field)] = json.loads(value)
+        except Exception as e:
+            logger.error("Error loading Redis hash %s: %s", key, e)
+        return cls(writer, key, data)
+
+    def __setitem__(self, field, value):
+        if field in self and self[field] == value:
+            return
+        super().__setitem__(field, value)
+        key, name, payload = self.key, json.dumps(field), json.dumps(value)
+        self.writer.submit((key, name), lambda pipe: pipe.hset(key, name, payload))
+
+    def __delitem__(self, field):
+        super().__delitem__(field)
+        key, name = self.key, json.dumps(field)
+        self.writer.submit((key, name), lambda pipe: pipe.hdel(key, name))
+
+    def pop(self, field, *default):
+        if field in self:
+            value = self[field]
+            del self[field]
+            return value
+        return super().pop(field, *default)
+
+    def clear(self):
+        if not self:
+            return
+        super().clear()
+        key = self.key
+        self.writer.submit((key, None), lambda pipe: pipe.delete(key))
+
+    def update(self, *args, **kwargs):
+        for field, value in dict(*args, **kwargs).items():
+            self[field] = value
+
+    def setdefault(self, field, default=None):
+        if field not in self:
+            self[field] = default
+        return self[field]
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_write_behind():
+    """
+    Return the process-wide WriteBehind, creating and starting it on first use.
+    Queued writes are flushed at interpreter exit.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = WriteBehind(get_redis())
+            _writer.start()
+            atexit.register(_writer.stop)
+        return _writer
@@ -1,26 +1,28 @@
+import atexit
 import cv2
-import yt_dlp
-import easyocr
 import numpy as np
 import time
 import platform
-import redis
 import json
-from difflib import SequenceMatcher
+import re
 import threading
-import torch
-
-# Check for CUDA4
-use_cuda = torch.cuda.is_available()
-print("CUDA is available, using GPU acceleration for OCR." if use_cuda else "CUDA not available, using CPU.")
-
-# Redis connection
-r = redis.Redis(host='localhost', port=6379, db=0)
-
-# GUI check
-DISPLAY_GUI = True
-if platform.system().lower() in ["linux", "darwin"]:
-    DISPLAY_GUI = False
+import config
+from signal_bus import publish_signal
+from redis_pool import get_redis
+from frame_gate import FrameGate, crop_roi, parse_roi
+from frame_capture import LatestFrameCapture, RateCounter
+from ocr_worker import OcrWorker
+from label_detector import LabelDetector, PrefilteredOcr
+from keyword_matcher import KeywordMatcher, is_trading_signal
+from ocr_profiles import build_reader, resolve_profile, run_ocr
+
+# Set by init(): CUDA availability, Redis connection and GUI support. Importing this
+# module has no side effects, so the supervisor and main.py can import it cheaply.
+use_cuda = False
+r = None
+DISPLAY_GUI = False
+_initialized = False
+_init_lock = threading.Lock()
 
 def test_imshow():
     try:
@@ -31,138 +33,370 @@ def test_imshow():
     except cv2.error:
         return False
 
-if not test_imshow():
-    print("cv2.imshow not supported. Disabling GUI.")
-    DISPLAY_GUI = False
+def init():
+    """
+    Detect CUDA and GUI support and connect to Redis. Safe to call more than once.
+    """
+    global use_cuda, r, DISPLAY_GUI, _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        # torch is only needed to choose the "auto" profile; it loads in seconds, so skip it otherwise.
+        if config.OCR_PROFILE == "auto":
+            import torch
+            use_cuda = torch.cuda.is_available()
+            print("CUDA is available, using GPU acceleration for OCR." if use_cuda else "CUDA not available, using CPU.")
+
+        # Redis connection (shared pool, settings from config)
+        r = get_redis()
+
+        # GUI check
+        DISPLAY_GUI = platform.system().lower() not in ["linux", "darwin"]
+        if DISPLAY_GUI and not test_imshow():
+            print("cv2.imshow not supported. Disabling GUI.")
+            DISPLAY_GUI = False
+        _initialized = True
 
 # YouTube URL
-url = "https://www.youtube.com/live/jkP1Sw7M2iU"
-
-# OCR reader
-reader = easyocr.Reader(['en'], gpu=use_cuda)
+url = config.YOUTUBE_URL
+
+# OCR reader (built on first use; not needed at all when OCR runs in a worker process)
+reader = None
+_ocr = None
+_ocr_lock = threading.Lock()
+
+def get_reader():
+    global reader
+    if reader is None:
+        _, profile = resolve_profile(cuda=use_cuda)
+        reader = build_reader(profile)
+    return reader
+
+def make_ocr():
+    """
+    Return a callable (gray_image, boxes=None) -> readtext results for the configured OCR mode.
+    """
+    profile_name, profile = resolve_profile(cuda=use_cuda)
+    print(f"OCR profile: {profile_name} ({config.OCR_WORKER_MODE} mode)")
+    if config.OCR_WORKER_MODE == "process":
+        worker = OcrWorker(profile_name=profile_name, timeout=config.OCR_WORKER_TIMEOUT)
+        # Stop the worker and unlink its shared-memory slot when the process exits.
+        atexit.register(worker.close)
+        return worker.recognize
+    return lambda gray, boxes=None: run_ocr(get_reader(), gray, boxes, profile["batch_size"])
+
+def get_ocr():
+    """
+    Return the shared OCR callable, creating it on first use.
+    """
+    global _ocr
+    with _ocr_lock:
+        if _ocr is None:
+            init()
+            _ocr = make_ocr()
+        return _ocr
+
+def warm_up():
+    """
+    Load the OCR model now (in the worker process, if any) instead of on the first frame.
+    """
+    ocr = get_ocr()
+    ocr(np.zeros((32, 32), dtype=np.uint8))
+
+def url_expiry(direct_url):
+    """
+    Unix time at which a resolved googlevideo URL expires ("expire" query or path
+    parameter), or now + STREAM_URL_TTL when the URL does not say.
+    """
+    match = re.search(r"[?&/]expire[=/](\d+)", direct_url)
+    if match:
+        return int(match.group(1))
+    return time.time() + config.STREAM_URL_TTL
 
 class YouTubeStream:
+    """
+    Live stream reader that resolves the direct media URL once and reuses it until
+    it actually fails. A background thread re-resolves shortly before expiry, and
+    reconnects reopen the cached URL with exponential backoff.
+    """
+
     def __init__(self, url):
         self.url = url
         self.cap = None
-
-    def connect(self):
+        self.direct_url = None
+        self.expires_at = 0
+        self.backoff = 0
+        self.reconnects = 0
+        self.failed_reads = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._refresh_thread = None
+
+    def resolve(self):
+        import yt_dlp  # Loaded on first resolve, not at import time.
+        start = time.time()
         ydl_opts = {'format': 'best[ext=mp4]/bestvideo+bestaudio/best'}
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             info_dict = ydl.extract_info(self.url, download=False)
             direct_url = info_dict["url"]
-        self.cap = cv2.VideoCapture(direct_url)
+        with self._lock:
+            self.direct_url = direct_url
+            self.expires_at = url_expiry(direct_url)
+        print(f"Resolved stream URL in {time.time() - start:.2f}s "
+              f"(expires in {self.expires_at - time.time():.0f}s)")
+        return direct_url
+
+    def stream_url(self, force_resolve=False):
+        with self._lock:
+            direct_url, expires_at = self.direct_url, self.expires_at
+        if force_resolve or not direct_url or time.time() >= expires_at:
+            return self.resolve()
+        return direct_url
+
+    def connect(self, force_resolve=False):
+        start = time.time()
+        self.cap = cv2.VideoCapture(self.stream_url(force_resolve))
+        if not self.cap.isOpened() and not force_resolve:
+            # The cached URL no longer works; resolve a fresh one.
+            self.cap.release()
+            self.cap = cv2.VideoCapture(self.stream_url(force_resolve=True))
+        print(f"Stream opened in {time.time() - start:.2f}s")
+        self._start_refresher()
+        return self.cap.isOpened()
+
+    def reconnect(self):
+        if self.backoff:
+            time.sleep(self.backoff)
+        self.backoff = min(max(self.backoff * 2, config.STREAM_RECONNECT_BACKOFF_MIN),
+                           config.STREAM_RECONNECT_BACKOFF_MAX)
+        self.reconnects += 1
+        start = time.time()
+        try:
+            # Repeated failures on the cached URL suggest it is dead; resolve again.
+            self.connect(force_resolve=self.failed_reads >= config.STREAM_RESOLVE_AFTER_FAILURES)
+        except Exception as e:
+            print("Stream reconnect failed:", e)
+        print(f"Stream reconnect #{self.reconnects} took {time.time() - start:.2f}s")
 
     def read_frame(self):
         if not self.cap or not self.cap.isOpened():
-            self.connect()
+            self.reconnect()
+            if not self.cap or not self.cap.isOpened():
+                return False, None
         ret, frame = self.cap.read()
+        if ret and frame is not None:
+            self.backoff = 0
+            self.failed_reads = 0
+        else:
+            # Drop the capture so the next read reopens it.
+            self.failed_reads += 1
+            self.cap.release()
         return ret, frame
 
+    def _start_refresher(self):
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, name="StreamURLRefresh", daemon=True)
+        self._refresh_thread.start()
+
+    def _refresh_loop(self):
+        while not self._stop_event.is_set():
+            with self._lock:
+                expires_at = self.expires_at
+            wait = expires_at - config.STREAM_URL_REFRESH_MARGIN - time.time()
+            if wait > 0:
+                self._stop_event.wait(wait)
+                continue
+            try:
+                self.resolve()
+            except Exception as e:
+                print("Background stream URL refresh failed:", e)
+                self._stop_event.wait(60)
+
     def release(self):
         if self.cap:
             self.cap.release()
 
-def is_trading_signal(text):
-    txt = text.lower()
-    return any(k in txt for k in ["buy signal", "short signal", "take profit"])
-
-def fuzzy_match(text, keyword, threshold=0.7):
-    return SequenceMatcher(None, text.lower(), keyword.lower()).ratio() >= threshold
+    def close(self):
+        self._stop_event.set()
+        self.release()
 
 SUPPLY_ZONE_KEYWORDS = ["supply zone", "sup zone", "suply zone", "supply zo", "sup zo"]
 DEMAND_ZONE_KEYWORDS = ["demand zone", "dem zone", "d zone", "dem zo", "dmd zone"]
 
+def make_keyword_matcher():
+    """
+    Build the batch matcher for zone keyword families (OCR_KEYWORD_FAMILIES overrides the defaults).
+    """
+    families = json.loads(config.OCR_KEYWORD_FAMILIES) if config.OCR_KEYWORD_FAMILIES else {
+        "supply_zone": SUPPLY_ZONE_KEYWORDS,
+        "demand_zone": DEMAND_ZONE_KEYWORDS,
+    }
+    return KeywordMatcher(families, threshold=config.OCR_KEYWORD_DICE_THRESHOLD)
+
+class SignalExtractor:
+    """
+    Per-stream OCR state: region of interest and change gate, label pre-filter,
+    zone keyword matcher and the last known signal. process(frame) returns the
+    aggregated signal payload when it changed, else None.
+    """
+
+    def __init__(self, ocr, roi=None):
+        # Only the region where signal labels appear is recognized, and only when it changed.
+        self.roi = parse_roi(config.OCR_ROI) if roi is None else roi
+        self.gate = FrameGate(threshold=config.OCR_CHANGE_THRESHOLD, cache_size=config.OCR_CACHE_SIZE)
+        # Cheap OpenCV label detection decides which crops EasyOCR actually reads.
+        detector = LabelDetector.from_config(config) if config.OCR_LABEL_DETECTOR else None
+        self.ocr = PrefilteredOcr(ocr, detector)
+        # With the pre-detector on, the whole region is read every full_every frames, changed or
+        # not, so a label the detector misses is picked up within that many frames.
+        self.full_every = config.OCR_FULL_EVERY_N if detector is not None else 0
+        self.frames_since_full = 0
+        self.keyword_matcher = make_keyword_matcher() if config.OCR_ZONE_DETECTION else None
+        self.last_known_signal = {"text": "", "price": "", "coordinates": ""}
+        self.prev_aggregated = None
+        self.recognized = 0
+
+    def recognize(self, frame):
+        """
+        Return (results, x_offset, y_offset) for the ROI, or None when it has not changed
+        and no full read is due. Raises RuntimeError if OCR fails.
+        """
+        self.frames_since_full += 1
+        full = bool(self.full_every) and self.frames_since_full >= self.full_every
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        roi_gray, (x_offset, y_offset) = crop_roi(gray, self.roi)
+        changed, roi_hash = self.gate.check(roi_gray)
+        if not changed and not full:
+            return None
+        if full:
+            results = self.gate.recognize(roi_hash, roi_gray, lambda g: self.ocr(g, full=True), refresh=True)
+            self.frames_since_full = 0
+        else:
+            roi_bgr, _ = crop_roi(frame, self.roi)
+            results = self.gate.recognize(roi_hash, roi_gray, lambda g: self.ocr(g, roi_bgr))
+        self.recognized += 1
+        return results, x_offset, y_offset
+
+    def aggregate(self, results, x_offset=0, y_offset=0):
+        all_signals = []
+        other_tokens = []
+
+        for (bbox, text, prob) in results:
+            (tl, _, br, _) = bbox
+            x1, y1 = map(int, tl)
+            x1, y1 = x1 + x_offset, y1 + y_offset
+            lower_text = text.lower().strip()
+
+            if is_trading_signal(lower_text):
+                all_signals.append((x1, y1, text))
+            else:
+                other_tokens.append(lower_text)
+
+        # All remaining tokens are scored against every zone keyword family in one batch.
+        if self.keyword_matcher and other_tokens:
+            zone_matches = self.keyword_matcher.best_matches(other_tokens)
+            for family, match in zone_matches.items():
+                if match:
+                    print(f"Zone label '{other_tokens[match[0]]}' matched {family} ({match[2]:.2f})")
+
+        # Update only if new signal; the right-most label is the latest one.
+        if all_signals:
+            all_signals.sort(key=lambda s: s[0], reverse=True)
+            _, _, rtext = all_signals[0]
+            self.last_known_signal = {"text": rtext, "price": "", "coordinates": ""}
+
+        # Force all zones to be blank
+        supply_zone_data = {"min": "", "max": ""}
+        demand_zone_data = {"min": "", "max": ""}
+
+        return {
+            "last_signal": {
+                "text": self.last_known_signal.get("text", ""),
+                "price": "",
+                "coordinates": ""
+            },
+            "supply_zone": supply_zone_data,
+            "demand_zone": demand_zone_data
+        }
+
+    def process(self, frame):
+        recognized = self.recognize(frame)
+        if recognized is None:
+            return None
+        aggregated = self.aggregate(*recognized)
+        return aggregated if aggregated != self.prev_aggregated else None
+
+    def mark_published(self, aggregated):
+        self.prev_aggregated = aggregated
+
+def publish_aggregated(redis_client, aggregated, keys=("signal_MAIN", "signal"), stream=None):
+    """
+    Write the aggregated signal to its Redis keys and, if stream is given, append it
+    to that signal stream. Returns the stream sequence id (None without a stream).
+    """
+    payload = json.dumps(aggregated)
+    for key in keys:
+        redis_client.set(key, payload)
+    if not stream:
+        return None
+    return publish_signal(redis_client, aggregated, stream=stream)
+
 def yt_main_loop():
-    prev_aggregated = None
-    first_signal_set = False
+    init()
+    extractor = SignalExtractor(get_ocr())
+
+    # One stream object across restarts so its resolved URL stays cached.
+    stream = YouTubeStream(url)
 
-    last_known_signal = {"text": "", "price": "", "coordinates": ""}
-    
     while True:
         try:
-            stream = YouTubeStream(url)
             stream.connect()
             print("Connected to stream.")
-            retry_count = 0
+
+            # A capture thread drains the stream; OCR always takes the newest frame.
+            capture = LatestFrameCapture(stream, retry_delay=0)  # The stream backs off itself.
+            capture.start()
+            ocr_rate = RateCounter()
+            frame_id = 0
+            dropped_frames = 0
+            last_stats_time = time.time()
 
             while True:
-                ret, frame = stream.read_frame()
-                if not ret or frame is None:
-                    retry_count += 1
-                    if retry_count >= 5:
+                latest = capture.get_latest(frame_id, timeout=30)
+                if latest is None:
+                    if capture.failed:
                         print("Stream error encountered. Restarting stream...")
                         break
-                    time.sleep(5)
                     continue
-                else:
-                    retry_count = 0
-
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                results = reader.readtext(gray)
-
-                recognized_signals = []
-                all_signals = []
-                
-                for (bbox, text, prob) in results:
-                    (tl, _, br, _) = bbox
-                    x1, y1 = map(int, tl)
-                    _, y2 = map(int, br)
-                    lower_text = text.lower().strip()
-
-                    if is_trading_signal(lower_text):
-                        all_signals.append((x1, y1, text))
-
-                    elif any(fuzzy_match(lower_text, kw) for kw in SUPPLY_ZONE_KEYWORDS):
-                        pass  # ignored: zone detection disabled
-                    elif any(fuzzy_match(lower_text, kw) for kw in DEMAND_ZONE_KEYWORDS):
-                        pass  # ignored: zone detection disabled
-
-                last_signal_data = {"text": "", "price": "", "coordinates": ""}
-
-                if not first_signal_set and all_signals:
-                    all_signals.sort(key=lambda s: s[0], reverse=True)
-                    _, _, rtext = all_signals[0]
-                    last_signal_data = {
-                        "text": rtext,
-                        "price": "",
-                        "coordinates": ""
-                    }
-                    first_signal_set = True
-
-                elif all_signals:
-                    all_signals.sort(key=lambda s: s[0], reverse=True)
-                    _, _, rtext = all_signals[0]
-                    last_signal_data = {
-                        "text": rtext,
-                        "price": "",
-                        "coordinates": ""
-                    }
-
-                # Update only if new signal
-                if last_signal_data.get("text"):
-                    last_known_signal = last_signal_data
-
-                # Force all zones to be blank
-                supply_zone_data = {"min": "", "max": ""}
-                demand_zone_data = {"min": "", "max": ""}
-
-                aggregated = {
-                    "last_signal": {
-                        "text": last_known_signal.get("text", ""),
-                        "price": "",
-                        "coordinates": ""
-                    },
-                    "supply_zone": supply_zone_data,
-                    "demand_zone": demand_zone_data
-                }
-
-                if aggregated != prev_aggregated:
+                if frame_id:
+                    dropped_frames += latest[0] - frame_id - 1
+                frame_id, frame, captured_at = latest
+
+                frame_age = time.time() - captured_at
+                try:
+                    recognized = extractor.recognize(frame)
+                except RuntimeError as e:
+                    print("OCR error:", e)
+                    continue
+                if recognized is None:
+                    time.sleep(config.OCR_SAMPLE_INTERVAL)
+                    continue
+                ocr_rate.tick()
+
+                if time.time() - last_stats_time >= config.OCR_STATS_INTERVAL:
+                    print(f"OCR pipeline: capture {capture.capture_rate.rate():.1f} fps | "
+                          f"OCR {ocr_rate.rate():.2f} fps | frame age {frame_age:.2f}s | "
+                          f"dropped {dropped_frames} | skipped unchanged {extractor.gate.skipped}")
+                    last_stats_time = time.time()
+
+                aggregated = extractor.aggregate(*recognized)
+                if aggregated != extractor.prev_aggregated:
                     try:
-                        r.set("signal_MAIN", json.dumps(aggregated))
-                        r.set("signal", json.dumps(aggregated))
-                        print("Updated Redis:", aggregated)
-                        prev_aggregated = aggregated
+                        seq = publish_aggregated(r, aggregated, stream=config.SIGNAL_STREAM)
+                        print("Updated Redis:", aggregated, "seq:", seq)
+                        extractor.mark_published(aggregated)
                     except Exception as e:
                         print("Redis update error:", e)
 
@@ -170,12 +404,14 @@ def yt_main_loop():
                     disp_frame = cv2.resize(frame, (1366, 720))
                     cv2.imshow("YouTube Live Stream - Signal Detection", disp_frame)
                     if cv2.waitKey(1) & 0xFF == ord('q'):
-                        stream.release()
+                        capture.stop()
+                        stream.close()
                         cv2.destroyAllWindows()
                         return
 
-                time.sleep(10)
+                time.sleep(config.OCR_SAMPLE_INTERVAL)
 
+            capture.stop()
             stream.release()
             cv2.destroyAllWindows()
             time.sleep(5)
@@ -183,8 +419,9 @@ def yt_main_loop():
         except Exception as e:
             print("Exception in main loop:", e)
             time.sleep(5)
-            if 'stream' in locals():
-                stream.release()
+            if 'capture' in locals():
+                capture.stop()
+            stream.release()
             cv2.destroyAllWindows()
 
 def run_in_thread():